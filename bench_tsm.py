@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+
+# This is a benchmark suite for the TSM Python module. It generates synthetic Twitter-like data (directed, extremely sparse, long-tailed networks with planted communities, along with matching tweets containing retweets, @-mentions, replies, hashtags and links) at several sizes, then times and memory-profiles each of TSM's public functions on it. Results are saved as JSON so that scaling curves from different versions of TSM can be compared.
+
+# Usage (from the command line):
+    # python3 bench_tsm.py --sizes 10000 100000 1000000 --out results.json
+    # python3 bench_tsm.py --compare old_results.json new_results.json
+# Run python3 bench_tsm.py --help for all options. The synthetic data functions below can also be imported and used on their own.
+
+# FUNCTION LIST
+
+# synthetic_network: Generates a directed, long-tailed network with planted communities
+
+# synthetic_node_list: Converts a synthetic network's planted partition into the node list format exported by get_top_communities
+
+# synthetic_tweets: Writes a CSV file of tweets formatted for t2e whose @-mentions and retweets reproduce a synthetic network
+
+# run_benchmarks: Times and memory-profiles TSM's public functions on synthetic data of several sizes
+
+# compare_results: Compares two sets of saved benchmark results
+
+import argparse
+import contextlib
+import csv
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+import tsm
+
+# FUNCTIONS
+
+# synthetic_network: Generate a directed, long-tailed network with planted communities
+# Description: Each edge is sent by a node chosen in proportion to its activity and received by a node chosen in proportion to its popularity, both of which follow heavy-tailed (Pareto) distributions, as do community sizes. Most edges stay within the sender's community; the rest go to any node. Everything is generated with numpy, so networks of 10^7 edges take only seconds.
+# Arguments:
+    # n_edges: The number of edges to generate.
+    # n_nodes: The number of nodes. Default is None, which uses one node per four edges (Twitter networks have mean degrees in the low single digits).
+    # n_cmty: The number of planted communities. Default is None, which scales it with the square root of n_nodes.
+    # mixing: The proportion of edges that may point outside the sender's community. Default is 0.15.
+    # seed: An integer with which to seed the random number generator. Default is 0.
+# Output: A tuple containing a numpy array of the sender node ID of each edge, a numpy array of the recipient node ID of each edge, and a numpy array of the planted community of each node. Node n is named 'u' + str(n).
+
+def synthetic_network(n_edges,n_nodes=None,n_cmty=None,mixing=0.15,seed=0):
+    rng = np.random.RandomState(seed)
+    if n_nodes is None:
+        n_nodes = max(n_edges // 4,50)
+    if n_cmty is None:
+        n_cmty = max(int(n_nodes**0.5 / 4),4)
+
+    cmty_weights = 1 / np.arange(1,n_cmty+1) #Zipf-distributed community sizes
+    sizes = 1 + rng.multinomial(n_nodes - n_cmty,cmty_weights / cmty_weights.sum())
+    cmty = np.repeat(np.arange(n_cmty),sizes) #nodes are numbered community by community
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+
+    activity = np.cumsum(rng.pareto(1.5,n_nodes) + 1)
+    popularity = np.cumsum(rng.pareto(1.1,n_nodes) + 1)
+    src = np.searchsorted(activity,rng.random_sample(n_edges) * activity[-1],side='right')
+
+    internal = rng.random_sample(n_edges) >= mixing
+    lo = np.where(internal,np.r_[0,popularity][starts[cmty[src]]],0)
+    hi = np.where(internal,popularity[ends[cmty[src]] - 1],popularity[-1])
+    tgt = np.searchsorted(popularity,lo + rng.random_sample(n_edges) * (hi - lo),side='right')
+    tgt = np.minimum(tgt,n_nodes - 1)
+    loops = tgt == src #point self-loops at the next member of the same community instead
+    c = cmty[src[loops]]
+    tgt[loops] = starts[c] + (src[loops] - starts[c] + 1) % sizes[c]
+    keep = tgt != src #drops self-loops in single-node communities
+    return src[keep],tgt[keep],cmty
+
+# synthetic_node_list: Convert a planted partition to a node list
+# Arguments:
+    # src, tgt, cmty: The output of synthetic_network.
+    # top_comm: The number of communities to include, largest first. Default is 10.
+    # reassign: The proportion of nodes to move to a random one of the other included communities, e.g. to simulate a second time slice for match_communities. Default is 0.
+    # seed: An integer with which to seed the random number generator used by reassign. Default is 0.
+# Output: A node list of the type found in the node_list attribute of a louvainObject (see get_top_communities): a list of [name, community ID, in-degree] lists in descending order of in-degree.
+
+def synthetic_node_list(src,tgt,cmty,top_comm=10,reassign=0,seed=0):
+    in_degree = np.bincount(tgt,minlength=len(cmty))
+    top = np.argsort(-np.bincount(cmty),kind='stable')[:top_comm]
+    members = np.flatnonzero(np.isin(cmty,top))
+    labels = cmty[members].copy()
+    if reassign > 0:
+        rng = np.random.RandomState(seed)
+        moved = rng.random_sample(len(members)) < reassign
+        labels[moved] = rng.choice(top,int(moved.sum()))
+    order = np.argsort(-in_degree[members],kind='stable')
+    return [['u%d' % members[i],str(labels[i]),str(in_degree[members[i]])] for i in order.tolist()]
+
+# synthetic_tweets: Write synthetic tweets for a synthetic network
+# Description: One tweet is written for each edge, from the edge's sender to its recipient: about half are retweets ("RT @recipient: ..."), a third are @-mentions and the rest are replies (which begin with "@recipient"). Retweeted texts are drawn from a small, long-tailed pool of posts by each recipient, so popular posts are retweeted many times. Half the tweets contain a hashtag and a third a link, drawn from long-tailed vocabularies specific to the sender's community. Links vary in scheme, subdomain and trailing characters so that get_top_links' cleaning options have work to do. Running t2e on the resulting file reproduces the network's edges in order.
+# Arguments:
+    # path: The name of the CSV file to write.
+    # src, tgt, cmty: The output of synthetic_network.
+    # seed: An integer with which to seed the random number generator. Default is 0.
+    # chunk_size: The number of tweets to generate and write at once. Default is 100000.
+# Output: The number of tweets written.
+
+def synthetic_tweets(path,src,tgt,cmty,seed=0,chunk_size=100000):
+    rng = np.random.RandomState(seed)
+    schemes = ['http://','https://','https://www.','http://m.']
+    trailers = ['','','?ref=tw','#top']
+    with open(path,'w',encoding='utf-8',newline='') as f:
+        writer = csv.writer(f)
+        for start in range(0,len(src),chunk_size):
+            s = src[start:start+chunk_size]
+            t = tgt[start:start+chunk_size]
+            n = len(s)
+            kind = rng.random_sample(n)
+            post = np.minimum(rng.zipf(2.0,n),50)
+            has_tag = rng.random_sample(n) < 0.5
+            tag = np.minimum(rng.zipf(1.8,n),200)
+            has_link = rng.random_sample(n) < 0.33
+            domain = (cmty[s]*7 + np.minimum(rng.zipf(1.6,n),60)) % 400
+            page = np.minimum(rng.zipf(1.5,n),1000)
+            scheme = rng.randint(0,len(schemes),n)
+            trailer = rng.randint(0,len(trailers),n)
+            rt = kind < 0.5 #retweets carry the hashtag and link of the recipient's post, so identical posts have identical texts
+            poster = np.where(rt,t,s)
+            post_id = t*50 + post
+            has_tag = np.where(rt,post_id % 2 == 0,has_tag)
+            tag = np.where(rt,post_id % 40 + 1,tag)
+            has_link = np.where(rt,post_id % 3 == 0,has_link)
+            domain = np.where(rt,(cmty[t]*7 + post) % 400,domain)
+            page = np.where(rt,post,page)
+            scheme = np.where(rt,post_id % len(schemes),scheme)
+            trailer = np.where(rt,post_id % len(trailers),trailer)
+            rows = []
+            for i in range(n):
+                extras = ''
+                if has_tag[i]:
+                    extras += ' #c%d_%d' % (cmty[poster[i]],tag[i])
+                if has_link[i]:
+                    extras += ' %ssite%d.com/p/%d%s' % (schemes[scheme[i]],domain[i],page[i],trailers[trailer[i]])
+                if rt[i]:
+                    text = 'RT @u%d: post %d about things%s' % (t[i],post[i],extras)
+                elif kind[i] < 0.83:
+                    text = 'thinking about this with @u%d today%s' % (t[i],extras)
+                else:
+                    text = '@u%d I agree%s' % (t[i],extras)
+                rows.append(['u%d' % s[i],text])
+            writer.writerows(rows)
+    return len(src)
+
+# Benchmarks
+# Description: Each benchmark is a [name, setup, run] list. setup takes the dict of data prepared for each size and returns any extra input the benchmark needs, which is then passed to run along with the data. Only run is timed.
+
+def _calc_ei_setup(data):
+    with _quiet():
+        return tsm.calc_ei(data['nodes'],data['edges'])
+
+BENCHMARKS = [
+    ['t2e',None,lambda d,x: tsm.t2e(d['tweets'])],
+    ['get_top_communities',None,lambda d,x: tsm.get_top_communities(d['edges'],engine=d['engine'],seed=0)],
+    ['calc_ei',None,lambda d,x: tsm.calc_ei(d['nodes'],d['edges'])],
+    ['match_communities',None,lambda d,x: tsm.match_communities(d['nodes'],d['nodes_B'])],
+    ['get_intermediaries',None,lambda d,x: tsm.get_intermediaries(d['nodes'],d['edges'])],
+    ['get_top_rts',None,lambda d,x: tsm.get_top_rts(d['tweets'],d['nodes'])],
+    ['get_top_hashtags',None,lambda d,x: tsm.get_top_hashtags(d['tweets'],d['nodes'])],
+    ['get_top_links',None,lambda d,x: tsm.get_top_links(d['tweets'],d['nodes'])],
+    ['tweetCorpus',None,lambda d,x: tsm.tweetCorpus(d['tweets'],d['nodes'])],
+    ['tweetCorpus_queries',lambda d: tsm.tweetCorpus(d['tweets'],d['nodes']),lambda d,x: [tsm.get_top_rts(x),tsm.get_top_hashtags(x),tsm.get_top_links(x)]],
+    ['communities_as_nodes',None,lambda d,x: tsm.communities_as_nodes(d['nodes'],d['edges'])],
+    ['shared_ties_grid',_calc_ei_setup,lambda d,x: tsm.shared_ties_grid(x,calc_propor=True)],
+]
+
+@contextlib.contextmanager
+def _quiet():
+    with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+# _measure: Time one benchmark and, optionally, measure its peak memory use in a second run
+# Description: Peak memory is the largest amount of memory allocated at once by Python and numpy during the run, as reported by tracemalloc. Because tracemalloc slows allocation-heavy code down, the timed run is done without it.
+# Output: A dict containing the best wall time in seconds of repeat runs and the peak memory in MB (or None).
+
+def _measure(run,data,extra,repeat=1,memory=True):
+    times = []
+    for n in range(repeat):
+        gc.collect()
+        with _quiet():
+            start = time.perf_counter()
+            run(data,extra)
+            times.append(time.perf_counter() - start)
+    peak_mb = None
+    if memory == True:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with _quiet():
+                run(data,extra)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return {'seconds':min(times),'peak_mb':peak_mb}
+
+def _environment():
+    try:
+        commit = subprocess.run(['git','rev-parse','HEAD'],cwd=os.path.dirname(os.path.abspath(tsm.__file__)),stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp':datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_commit':commit,
+            'python':platform.python_version(),
+            'numpy':np.__version__,
+            'networkx':nx.__version__,
+            'platform':platform.platform(),
+            'cpu_count':os.cpu_count()}
+
+# run_benchmarks: Benchmark TSM's public functions on synthetic data of several sizes
+# Arguments:
+    # sizes: A list of the numbers of edges (and tweets) to generate. Default is [10000, 100000, 1000000].
+    # functions: A list of the names of the benchmarks to run (see BENCHMARKS). Default is None, which runs all of them.
+    # engine: The community detection engine to use for get_top_communities. Default is 'louvain'.
+    # repeat: The number of timed runs of each benchmark, of which the fastest is reported. Default is 1.
+    # memory: If set to True, each benchmark will be run once more under tracemalloc to measure its peak memory use. Default is True.
+    # seed: An integer with which to seed the synthetic data generators. Default is 0.
+    # workdir: A directory in which to write the synthetic tweet files. Default is None, which uses a temporary directory that is deleted afterwards.
+    # out: A path to which to save the results as JSON. Default is None, which saves nothing.
+# Output: A dict containing an "environment" dict (timestamp, git commit, library versions and hardware) and a "results" list with one dict per function per size, each with the keys function, n_edges, n_nodes, n_tweets, seconds, peak_mb and edges_per_second.
+
+def run_benchmarks(sizes=[10000,100000,1000000],functions=None,engine='louvain',repeat=1,memory=True,seed=0,workdir=None,out=None):
+    benchmarks = [i for i in BENCHMARKS if functions is None or i[0] in functions]
+    output = {'environment':_environment(),'engine':engine,'results':[]}
+    with tempfile.TemporaryDirectory() as tmp:
+        if workdir is None:
+            workdir = tmp
+        for size in sizes:
+            src,tgt,cmty = synthetic_network(size,seed=seed)
+            tweets = os.path.join(workdir,'synthetic_tweets_%d.csv' % size)
+            synthetic_tweets(tweets,src,tgt,cmty,seed=seed)
+            data = {'tweets':tweets,
+                    'edges':[['u%d' % s,'u%d' % t] for s,t in zip(src.tolist(),tgt.tolist())],
+                    'nodes':synthetic_node_list(src,tgt,cmty),
+                    'nodes_B':synthetic_node_list(src,tgt,cmty,reassign=0.1,seed=seed+1),
+                    'engine':engine}
+            for name,setup,run in benchmarks:
+                extra = setup(data) if setup is not None else None
+                result = _measure(run,data,extra,repeat,memory)
+                row = {'function':name,'n_edges':len(src),'n_nodes':len(cmty),'n_tweets':len(src)}
+                row.update(result)
+                row['edges_per_second'] = len(src) / result['seconds'] if result['seconds'] > 0 else None
+                output['results'].append(row)
+                print('%-22s %10d edges %10.3f s %s' % (name,len(src),result['seconds'],'' if result['peak_mb'] is None else '%10.1f MB' % result['peak_mb']))
+    if out is not None:
+        with open(out,'w') as f:
+            json.dump(output,f,indent=2)
+    return output
+
+# compare_results: Compare two sets of benchmark results
+# Arguments:
+    # old, new: Benchmark results of the type returned by run_benchmarks, or paths to JSON files saved by it.
+# Output: A list of [function, n_edges, old seconds, new seconds, new/old time ratio, old peak MB, new peak MB] lists for every function and size found in both, which is also printed. Ratios above 1 mean the new version is slower.
+
+def compare_results(old,new):
+    if type(old) is str:
+        with open(old) as f:
+            old = json.load(f)
+    if type(new) is str:
+        with open(new) as f:
+            new = json.load(f)
+    old_rows = {(i['function'],i['n_edges']):i for i in old['results']}
+    table = []
+    for i in new['results']:
+        j = old_rows.get((i['function'],i['n_edges']))
+        if j is None:
+            continue
+        ratio = i['seconds'] / j['seconds'] if j['seconds'] > 0 else None
+        table.append([i['function'],i['n_edges'],j['seconds'],i['seconds'],ratio,j['peak_mb'],i['peak_mb']])
+        print('%-22s %10d edges %10.3f s -> %10.3f s  x%s' % (i['function'],i['n_edges'],j['seconds'],i['seconds'],'%.2f' % ratio if ratio is not None else '?'))
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark TSM on synthetic Twitter-like data.')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[10000,100000,1000000],help='numbers of edges to generate (default: 10^4 10^5 10^6)')
+    parser.add_argument('--functions',nargs='+',choices=[i[0] for i in BENCHMARKS],help='benchmarks to run (default: all)')
+    parser.add_argument('--engine',default='louvain',help="community detection engine for get_top_communities (default: 'louvain')")
+    parser.add_argument('--repeat',type=int,default=1,help='timed runs per benchmark; the fastest is reported (default: 1)')
+    parser.add_argument('--no-memory',action='store_true',help='skip the tracemalloc peak-memory run')
+    parser.add_argument('--seed',type=int,default=0,help='seed for the synthetic data (default: 0)')
+    parser.add_argument('--workdir',help='directory for the synthetic tweet files (default: a temporary directory)')
+    parser.add_argument('--out',default='tsm_benchmarks.json',help='JSON file to save results to (default: tsm_benchmarks.json)')
+    parser.add_argument('--compare',nargs=2,metavar=('OLD','NEW'),help='compare two saved result files instead of running benchmarks')
+    args = parser.parse_args(argv)
+    if args.compare is not None:
+        compare_results(*args.compare)
+    else:
+        run_benchmarks(args.sizes,args.functions,args.engine,args.repeat,not args.no_memory,args.seed,args.workdir,args.out)
+
+if __name__ == '__main__':
+    main()
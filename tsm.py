@@ -11,68 +11,204 @@
 
 # FUNCTION LIST
 
+# set_phase_callback: Registers a function to receive timing, row count and memory records for each phase of TSM's functions (see INSTRUMENTATION)
+
 # load_data: Loads data quickly
 
 # save_csv: Quick CSV output
 
+# resultCache: An on-disk cache that lets t2e and get_top_communities skip recomputing results for unchanged inputs
+
 # t2e: Converts raw tweets into edgelist format (retweets and @-mentions, not follows)
 
-# get_top_communities: A wrapper for Thomas Aynaud's implementation of the Louvain method for community detection. Gets the top k or (k*100)% largest communities by membership in a network and then outputs a file/variable containing the community labels and in-degrees of each user.
+# t2e_iter: A generator version of t2e that yields edges one at a time
+
+# t2e_multi: Runs several of t2e's extraction modes in a single pass over the tweets
+
+# t2e_parallel: Runs t2e over several files or byte ranges of a large file in parallel processes
+
+# save_edge_store: Saves an edgelist as a compact, memory-mappable binary edge store that TSM's edge-consuming functions accept in place of a CSV
+
+# load_edge_store: Opens an edge store saved by save_edge_store
+
+# get_top_communities: A wrapper for Thomas Aynaud's implementation of the Louvain method for community detection. Gets the top k or (k*100)% largest communities by membership in a network and then outputs a file/variable containing the community labels and in-degrees of each user. Other community detection engines, including built-in array versions of Louvain and label propagation, can be swapped in. Several seeded runs can be combined into a single best or consensus partition with per-node stability scores.
+
+# build_node_index: Creates a shared mapping between node names, integer IDs and communities that can be passed to most other functions in place of a node list
 
 # calc_ei: Calculates the E-I index (a measure of insularity) of each community detected by get_top_communities
 
 # _get_shared_ties: An extension of calc_ei that shows how "close" each community is to all of the others in terms of shared ties
 
+# eiAccumulator: Keeps calc_ei's tie counts for a fixed partition up to date as batches of edges are added or removed
+
+# spaceSaving: Counts the most frequent items in a stream, such as retweets or hashtags, in a fixed amount of memory
+
+# tweetCorpus: Reads a set of tweets once and indexes their hashtags, links and retweets by community, so get_top_rts, get_top_hashtags and get_top_links can query it instead of rereading the tweets
+
 # get_top_rts: Gets the most-retweeted tweets within each community
 
 # match_communities: Compares community membership within two networks, A and B, and gives the best match found in B for each community in A
 
+# track_communities: Tracks communities across a series of sliding time windows, chaining the best matches between consecutive windows into lineages
+
 # get_intermediaries: Discovers which nodes intermediate between which communities
 
+# build_in_index: Indexes the in-edges of every node in an edgelist so get_intermediaries can be run repeatedly without rescanning it
+
 # get_top_hashtags: Gets the most-used hashtags in each community
 
 # get_top_links: Gets the most-used hyperlinks or link domains in each community
 
 # shared_ties_grid: Coaxes output of _get_shared_ties into a convenient grid format
 
+# communities_as_nodes: Collapses each community into a single node to create a weighted community-level network
+
 # REQUIRED MODULES
 
-#Below are all this module's dependencies. Everything except NetworkX and community comes standard with Python. You can get NetworkX here: http://networkx.github.io/ or through pip. You'll also need Thomas Aynaud's implementation of the Louvain method for community detection (python-louvain, which is where the community module lives), which is available here: https://bitbucket.org/taynaud/python-louvain or through pip. (Note that only the Py3-compliant version 0.4 of python-louvain will work with TSM.)
+#Below are all this module's dependencies. Everything except NetworkX, NumPy and community comes standard with Python. You can get NumPy here: http://www.numpy.org/ or through pip. You can get NetworkX here: http://networkx.github.io/ or through pip. You'll also need Thomas Aynaud's implementation of the Louvain method for community detection (python-louvain, which is where the community module lives), which is available here: https://bitbucket.org/taynaud/python-louvain or through pip. (Note that only the Py3-compliant version 0.4 of python-louvain will work with TSM.)
 
+import array
 import collections
 import community
+import concurrent.futures
+import contextlib
 import copy
 import csv
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import logging
 import networkx as nx
+import numpy as np
 import operator
+import os
 import random
 import re
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource #not available on Windows
+except ImportError:
+    resource = None
+
+# INSTRUMENTATION
+
+# TSM reports what it is doing through the standard logging module, under the logger named 'tsm', which is silent unless you configure it. Status messages (e.g. "Edge list created.") are logged at the INFO level. In addition, each function is divided into phases (loading data, building graphs, partitioning, counting, etc.), and at the DEBUG level a record of each phase is logged as a JSON object with the following keys:
+    # event: 'phase' for a completed phase, or 'progress' for a progress report from within a long loop.
+    # function: The name of the TSM function.
+    # phase: The name of the phase.
+    # seconds: The wall time taken by the phase (or elapsed so far, for progress reports).
+    # rows: The number of rows (tweets, edges, nodes, etc.) processed, or None if not applicable.
+    # peak_mb: For phases, the peak memory use in MB. If tracemalloc is tracing, this is the peak Python and numpy memory allocated during the phase; otherwise it is the peak resident memory of the whole process so far (or None where the resource module is unavailable, e.g. on Windows).
+# For example, to see status messages and phase timings on the console:
+    # import logging
+    # logging.basicConfig(level=logging.DEBUG)
+# Alternatively, set_phase_callback registers a function that receives each record as a dict. When neither is enabled, instrumentation costs almost nothing.
+
+logger = logging.getLogger('tsm')
+logger.addHandler(logging.NullHandler())
+
+_phase_callback = None
+
+# set_phase_callback: Register a function to receive TSM's phase and progress records
+# Arguments:
+    # callback: A function that accepts a single dict (see INSTRUMENTATION above), or None to unregister the current callback.
+# Output: None.
+
+def set_phase_callback(callback):
+    global _phase_callback
+    _phase_callback = callback
+
+def _instrumented():
+    return _phase_callback is not None or logger.isEnabledFor(logging.DEBUG)
+
+def _emit(record):
+    if _phase_callback is not None:
+        _phase_callback(record)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps(record))
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': #macOS reports bytes, Linux kilobytes
+        return peak / 2**20
+    return peak / 2**10
+
+# _phase: Time one phase of a TSM function
+# Description: A context manager that emits a phase record when the phase ends. It yields a dict in which the phase can set 'rows' to the number of rows it processed.
+
+@contextlib.contextmanager
+def _phase(function,phase):
+    record = {'event':'phase','function':function,'phase':phase,'seconds':None,'rows':None,'peak_mb':None}
+    if not _instrumented():
+        yield record
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        start_mem = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc,'reset_peak'):
+            tracemalloc.reset_peak()
+    start = time.perf_counter()
+    yield record
+    record['seconds'] = time.perf_counter() - start
+    if tracing:
+        record['peak_mb'] = max(tracemalloc.get_traced_memory()[1] - start_mem,0) / 2**20
+    else:
+        record['peak_mb'] = _peak_rss_mb()
+    _emit(record)
+
+# _progress: Report progress through a long loop
+# Description: Wraps an iterable and emits a progress record every `every` items. If instrumentation is disabled, the iterable is returned untouched.
+
+def _progress(iterable,function,phase,total=None,every=100000):
+    if not _instrumented():
+        return iterable
+    return _progress_iter(iterable,function,phase,total,every)
+
+def _progress_iter(iterable,function,phase,total,every):
+    start = time.perf_counter()
+    done = 0
+    for item in iterable:
+        yield item
+        done += 1
+        if done % every == 0:
+            _emit({'event':'progress','function':function,'phase':phase,'seconds':time.perf_counter() - start,'rows':done,'total':total})
 
 # FUNCTIONS
 
 # load_data: load data from a string or variable
 # Arguments:
-    # data: If load_data is fed a string, it assumes it is a path to a CSV file and attempts to load the contents into a list of lists. If it is fed a non-string variable, it creates a deep copy.
+    # data: If load_data is fed a string, it assumes it is a path to a CSV file and attempts to load the contents into a list of lists. If it is fed a non-string variable, it returns that variable as-is (or a deep copy; see deep_copy).
     # enc: the character encoding of the file you're trying to open. See https://docs.python.org/3.4/library/codecs.html#standard-encodings
+    # deep_copy: If set to True, a non-string variable will be deep-copied before being returned. If set to False, the variable itself will be returned, which avoids doubling the memory footprint of large in-memory edgelists. None of TSM's functions modify the data they load, so they all use the default. Default is False.
 # Output:
-    # A list of lists representing the contents of a CSV file, or a deep copy of a non-string variable.
+    # A list of lists representing the contents of a CSV file, or the non-string variable itself (or a deep copy of it).
 
-def load_data(data,enc='utf-8',translate_unicode=False):
+def load_data(data,enc='utf-8',translate_unicode=False,deep_copy=False):
     if type(data) is str:
         csv_data = []
-        with open(data,'r',encoding = enc,errors = 'replace') as f:
+        with _phase('load_data','load') as ph, open(data,'r',encoding = enc,errors = 'replace') as f:
             if translate_unicode == True:
                 reader = csv.reader((line.encode().decode('unicode_escape').replace('\0','') for line in f)) #remove NULL bytes
             else:
                 reader = csv.reader((line.replace('\0','') for line in f)) #remove NULL bytes
-            for row in reader:
+            for row in _progress(reader,'load_data','load'):
                 if row != []:
                     csv_data.append(row)
-        print('Data loaded from file "' + data + '".')
+            ph['rows'] = len(csv_data)
+        logger.info('Data loaded from file "%s".',data)
         return csv_data
     else:
-        print('Data loaded.')
-        return copy.deepcopy(data)
+        logger.info('Data loaded.')
+        if deep_copy == True:
+            return copy.deepcopy(data)
+        return data
 
 # save_csv: save tabular data to a CSV file
 # Arguments:
@@ -98,7 +234,187 @@ def save_csv(filename,data,use_quotes=False,double_to_single=True,file_mode='w',
                 row = ','.join([str(i) for i in line]) + "\n"
             out.write(row)
     if verbose == True:
-        print('Data saved to file "' + filename + '".')
+        logger.info('Data saved to file "%s".',filename)
+
+# resultCache: cache t2e and get_top_communities results on disk
+# Description: Re-running an analysis on unchanged data repeats the slowest steps, parsing tweets with t2e and partitioning the network with get_top_communities. A resultCache stores the results of both in a directory, keyed by a SHA-256 hash of the input data together with every parameter that affects the result, and both functions will return a stored result instead of recomputing it when passed the cache through their cache arguments. Input files are hashed by content, so editing a file invalidates its results automatically; each file's hash is remembered along with its size and modification time, so unchanged files are not rehashed, and every hash a file has had is kept so that invalidate can also delete the results for its earlier contents. Edgelists are stored as arrays of integer node codes and louvainObjects as JSON, both in uncompressed .npz files, which load quickly and never execute code. When the cache grows beyond max_bytes, the least recently used results are deleted.
+# Arguments:
+    # path: The name of the directory in which to store results. It will be created if it does not exist.
+    # max_bytes: The maximum total size of the stored results in bytes. Default is 2**30 (1 GB).
+# Methods:
+    # invalidate(data=None,function=None): Deletes the stored results computed from data (anything t2e or get_top_communities accepts, e.g. a file path, in which case results for any earlier contents of the file are deleted too), from function ('t2e' or 'get_top_communities'), or from both. With no arguments, it deletes everything, as does clear().
+    # clear(): Deletes all stored results.
+# Attributes:
+    # hits: The number of results returned from the cache since it was opened.
+    # misses: The number of results that were not found in the cache.
+
+class resultCache:
+    '''an object class for an on-disk cache of t2e and get_top_communities results'''
+    def __init__(self,path,max_bytes=2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path,exist_ok=True)
+
+    def invalidate(self,data=None,function=None):
+        if data is None:
+            data_hashes = None
+        else:
+            data_hashes = {self._data_hash(data)} | set(self._path_hashes(data)) #includes the earlier contents of an edited file
+        for entry in self._entries():
+            name = os.path.basename(entry)
+            if (function is None or name.startswith(function + '-')) and (data_hashes is None or name.split('-')[-2] in data_hashes):
+                os.remove(entry)
+
+    def clear(self):
+        self.invalidate()
+
+    def _key(self,function,data,params):
+        data_hash = self._data_hash(data)
+        if data_hash is None:
+            return None
+        params = json.dumps([_CACHE_VERSION] + params,default=_cache_param_name)
+        return function + '-' + data_hash + '-' + hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]
+
+    def _get(self,key):
+        entry = os.path.join(self.path,key + '.npz')
+        try:
+            with np.load(entry,allow_pickle=False) as f:
+                result = _cache_decode(f)
+            os.utime(entry) #marks the entry as recently used
+        except (OSError,ValueError,KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def _put(self,key,result):
+        entry = os.path.join(self.path,key + '.npz')
+        tmp = entry + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp,'wb') as f:
+            np.savez(f,**_cache_encode(result))
+        os.replace(tmp,entry) #an entry is either complete or absent, even if two processes write it at once
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in self._entries():
+            stat = os.stat(entry)
+            entries.append([stat.st_mtime,stat.st_size,entry])
+        total = sum(i[1] for i in entries)
+        for mtime,size,entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(entry)
+            total -= size
+
+    def _entries(self):
+        return [os.path.join(self.path,i) for i in os.listdir(self.path) if i.endswith('.npz')]
+
+    def _data_hash(self,data):
+        if isinstance(data,edgeStoreObject):
+            data = data.path
+        if type(data) is str:
+            return self._file_hash(data)
+        if isinstance(data,louvainObject):
+            data = data.node_list
+        elif isinstance(data,nodeIndexObject):
+            data = [[n,data.community_ids[c] if c >= 0 else ''] for n,c in zip(data.names,data.communities.tolist())]
+        if type(data) not in (list,tuple): #generators can only be read once, so they can't be hashed
+            return None
+        h = hashlib.sha256(b'rows')
+        for n in range(0,len(data),10000):
+            h.update('\x1e'.join(['\x1f'.join([str(i) for i in row]) if type(row) in (list,tuple) else str(row) for row in data[n:n+10000]]).encode('utf-8','surrogatepass') + b'\x1e')
+        return h.hexdigest()[:32]
+
+    def _file_hash(self,path): #also hashes edge store directories, which are always rehashed
+        index = self._file_index()
+        full_path = os.path.abspath(path)
+        if os.path.isdir(path): #an edge store
+            fingerprint = None
+            data_hash = _hash_files([os.path.join(path,i) for i in sorted(os.listdir(path)) if i.endswith('.npy') or i == 'names.json'])
+        else:
+            stat = os.stat(path)
+            fingerprint = [stat.st_size,stat.st_mtime_ns]
+            if full_path in index and index[full_path][0] == fingerprint:
+                return index[full_path][1]
+            data_hash = _hash_files([path])
+        history = self._path_hashes(path,index)
+        if data_hash not in history: #every hash seen for a path is kept so that invalidate can find results for its earlier contents
+            history.append(data_hash)
+        if full_path not in index or index[full_path][:2] != [fingerprint,data_hash]:
+            index[full_path] = [fingerprint,data_hash,history]
+            index_file = os.path.join(self.path,'file_hashes.json')
+            tmp = index_file + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp,'w',encoding='utf-8') as f:
+                json.dump(index,f)
+            os.replace(tmp,index_file)
+        return data_hash
+
+    def _file_index(self):
+        try:
+            with open(os.path.join(self.path,'file_hashes.json'),encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError,ValueError):
+            return {}
+
+    def _path_hashes(self,data,index=None):
+        if isinstance(data,edgeStoreObject):
+            data = data.path
+        if type(data) is not str:
+            return []
+        if index is None:
+            index = self._file_index()
+        entry = index.get(os.path.abspath(data))
+        if entry is None:
+            return []
+        return list(entry[2]) if len(entry) > 2 else [entry[1]]
+
+_CACHE_VERSION = 1 #bump this whenever a change to TSM would change cached results
+
+def _hash_files(paths):
+    h = hashlib.sha256(b'files')
+    for path in paths:
+        with open(path,'rb') as f:
+            for block in iter(lambda: f.read(2**20),b''):
+                h.update(block)
+    return h.hexdigest()[:32]
+
+def _cache_param_name(param): #functions (e.g. a prominence_metric or engine) are identified by name
+    return getattr(param,'__module__','') + '.' + getattr(param,'__qualname__',repr(param))
+
+# _cache_encode and _cache_decode: Convert results to and from the arrays stored in a cache entry. Edgelists are stored as a table of node names and arrays of node codes; louvainObjects as JSON.
+
+def _json_array(obj):
+    return np.frombuffer(json.dumps(obj).encode('utf-8'),dtype=np.uint8)
+
+def _cache_encode(result):
+    if isinstance(result,louvainObject):
+        attrs = dict(vars(result))
+        for i in ['n_nodes','stability']: #JSON would turn non-string keys into strings, so dicts are stored as [key,value] pairs
+            if attrs[i] is not None:
+                attrs[i] = list(attrs[i].items())
+        return {'kind':np.array('louvain'),'json':_json_array(attrs)}
+    node_ids = {}
+    src = np.fromiter((node_ids.setdefault(i[0],len(node_ids)) for i in result),dtype=np.int32,count=len(result))
+    tgt = np.fromiter((node_ids.setdefault(i[1],len(node_ids)) for i in result),dtype=np.int32,count=len(result))
+    arrays = {'kind':np.array('edges'),'names':_json_array(list(node_ids)),'src':src,'tgt':tgt}
+    if len(result) > 0 and len(result[0]) > 2:
+        arrays['weights'] = np.fromiter((int(i[2]) for i in result),dtype=np.int64,count=len(result))
+    return arrays
+
+def _cache_decode(f):
+    if str(f['kind']) == 'louvain':
+        attrs = json.loads(f['json'].tobytes().decode('utf-8'))
+        for i in ['n_nodes','stability']:
+            if attrs[i] is not None:
+                attrs[i] = {k:v for k,v in attrs[i]}
+        return louvainObject(**attrs)
+    names = json.loads(f['names'].tobytes().decode('utf-8'))
+    if 'weights' in f.files:
+        return [[names[s],names[t],w] for s,t,w in zip(f['src'].tolist(),f['tgt'].tolist(),f['weights'].tolist())]
+    return [[names[s],names[t]] for s,t in zip(f['src'].tolist(),f['tgt'].tolist())]
 
 # t2e: convert raw Twitter data to edgelist format
 # Description: t2e takes raw Twitter data as input and outputs an edgelist consisting of the names of the tweet authors (col 1) and the names of the nodes mentioned and/or retweeted (col 2).
@@ -109,7 +425,12 @@ def save_csv(filename,data,use_quotes=False,double_to_single=True,file_mode='w',
     # extmode: see below
     # enc: the character encoding of the file you're trying to open. See https://docs.python.org/3.4/library/codecs.html#standard-encodings
     # save_prefix: Add a string here to save your file to CSV. Your saved file will be named as follows: 'string'_edgelist.csv
-# Output: An edgelist in the form of a Python list of lists. If save_prefix is set, the edgelist will also be saved as a CSV file.
+    # stream: If set to True, t2e will not hold the edgelist in memory. If save_prefix is set, edges will be written to the CSV file in chunks as they are extracted; otherwise t2e will return a generator of edges (see t2e_iter). Default is False.
+    # chunk_size: The number of edges written to disk at a time when stream is set to True. Default is 100000.
+    # weighted: If set to True, duplicate edges will be collapsed into a single row with a third column containing the number of times the edge occurred (i.e. source,target,weight). All of TSM's edge-consuming functions accept this format. Rows appear in order of each edge's first occurrence. Note that in stream mode, the weights must be tallied before any edge is returned or written. Default is False.
+    # save_format: If set to 'CSV', the edgelist will be saved as a CSV file. If set to 'STORE', it will instead be saved as a binary edge store in a directory named 'string'_edgelist (see save_edge_store), which TSM's edge-consuming functions can memory-map rather than parse. Default is 'CSV'.
+    # cache: A resultCache in which to look up the edgelist before extracting it, and to store it afterwards. Results are keyed by the contents of tweet_data along with extmode, enc and weighted. Ignored if stream is set to True or tweet_data is a generator. Default is None.
+# Output: An edgelist in the form of a Python list of lists. If save_prefix is set, the edgelist will also be saved as a CSV file or edge store. If stream is set to True, the output will instead be the name of the saved CSV file or edge store directory or, if save_prefix is blank, a generator of edges.
 
 # t2e has four extraction modes (specified by the extmode variable). Default is ALL.
 # ALL = do not differentiate between retweets and non-retweets, include isolates (default)
@@ -118,49 +439,155 @@ def save_csv(filename,data,use_quotes=False,double_to_single=True,file_mode='w',
 # AT_MENTIONS_ONLY = non-retweets (@-mentions) only, exclude isolates
 # REPLIES_ONLY = only tweets in which the first or second character is an "@", exclude isolates
 
-def t2e(tweet_data,extmode='ALL',enc='utf-8',save_prefix=''):
-    authors = []
-    tweets = []
-    final = []
+def t2e(tweet_data,extmode='ALL',enc='utf-8',save_prefix='',stream=False,chunk_size=100000,weighted=False,save_format='CSV',cache=None):
+    if stream == True:
+        edges = t2e_iter(tweet_data,extmode,enc)
+        if weighted == True:
+            edges = iter(_collapse_edges(edges))
+        if len(save_prefix) == 0:
+            return edges
+        if save_format.upper() == 'STORE':
+            outfile = save_prefix + '_edgelist'
+            save_edge_store(edges,outfile)
+            return outfile
+        outfile = save_prefix + '_edgelist.csv'
+        file_mode = 'w'
+        while True:
+            chunk = list(itertools.islice(edges,chunk_size))
+            if len(chunk) == 0 and file_mode == 'a':
+                break
+            save_csv(outfile,chunk,file_mode=file_mode,enc=enc,verbose=False)
+            file_mode = 'a'
+        logger.info('Edge list saved to file "%s".',outfile)
+        return outfile
+
+    final = None
+    cache_key = None
+    if cache is not None:
+        cache_key = cache._key('t2e',tweet_data,[extmode.upper(),enc,weighted])
+        if cache_key is not None:
+            final = cache._get(cache_key)
+
+    if final is None:
+        with _phase('t2e','extract') as ph:
+            final = list(t2e_iter(tweet_data,extmode,enc))
+            ph['rows'] = len(final)
+        if weighted == True:
+            with _phase('t2e','weight') as ph:
+                final = _collapse_edges(final)
+                ph['rows'] = len(final)
+        if cache_key is not None:
+            cache._put(cache_key,final)
+    logger.info('Edge list created.')
+
+    if len(save_prefix) > 0 and save_format.upper() == 'STORE':
+        save_edge_store(final,save_prefix + '_edgelist')
+    elif len(save_prefix) > 0:
+        outfile = save_prefix + '_edgelist.csv'
+        save_csv(outfile,final)
 
-    if type(tweet_data) is str:
-        f = open(tweet_data,'r',encoding = enc,errors = 'replace')
-        tweet_data = csv.reader(f)
-
-    for row in tweet_data:
-        if extmode.upper() == 'ALL_NO_ISOLATES':
-            condition = '@' in row[1]
-        elif extmode.upper() == 'RTS_ONLY':
-            condition = 'rt @' in row[1].lower()
-        elif extmode.upper() == 'AT_MENTIONS_ONLY':
-            condition = '@' in row[1] and 'rt @' not in row[1].lower()
-        elif extmode.upper() == 'REPLIES_ONLY':
-            condition = row[1][0] == '@' or row[1][1] == '@'
-        else:
-            condition = True
-        if condition is True:
-            authors.append(re.sub('[^A-Za-z0-9_]','',str(row[0]).lower().strip()))
-            tweets.append(' ' + row[1].lower() + ' ')
-    if type(tweet_data) is str:
-        f.close()
-
-    if extmode == 'RTS_ONLY': #only the RTed username is pulled from each RT
-        for i,j in enumerate(tweets):
-            ts = j.split('rt @')[1]
-            try:
-                rted = ts[:re.search('[^a-z0-9_]',ts).start()]
-            except AttributeError:
-                rted = ts
-            if len(authors[i]) >= 1 and authors[i] != rted: #prevents ppl from manually RTing themselves
-                final.append([authors[i],rted])
+    return final
 
-    else: #the code below is necessary to pull multiple mentioned users from single tweets
-        tweets = [t.split('@') for t in tweets] #splits each tweet along @s
-        for n,chunk in enumerate(tweets):
-            ment_users = [t[:re.search('[^A-Za-z0-9_]',t).start()].lower().strip() for t in chunk if re.search('[^A-Za-z0-9_]',t) is not None]
-            final.extend([[authors[n],name] for name in ment_users if len(name.strip()) > 0])
+# t2e_iter: lazily convert raw Twitter data to edgelist format
+# Description: t2e_iter is a generator version of t2e. It reads one tweet at a time and yields each edge as soon as it has been extracted, so its memory use stays flat regardless of the size of the input. t2e uses it internally.
+# Arguments:
+    # tweet_data, extmode, enc: See t2e.
+# Output: A generator of edges, each of which is a list containing the name of the tweet author and the name of a node mentioned and/or retweeted.
+
+def t2e_iter(tweet_data,extmode='ALL',enc='utf-8'):
+    condition = _T2E_CONDITIONS.get(extmode.upper(),lambda text,lower: True)
+    if extmode.upper() == 'RTS_ONLY': #only the RTed username is pulled from each RT
+        get_edges = _rt_edges
+    else:
+        get_edges = _mention_edges
+
+    for row in _progress(_read_rows(tweet_data,enc),'t2e_iter','read'):
+        lower = row[1].lower()
+        if condition(row[1],lower):
+            author = _NON_HANDLE_RE.sub('',str(row[0]).lower().strip())
+            yield from get_edges(author,' ' + lower + ' ')
 
-    print('Edge list created.')
+# t2e_multi: convert raw Twitter data to several edgelists at once
+# Description: t2e_multi produces one edgelist per extraction mode from a single read of the tweets. Each tweet is lowercased and scanned for mentions at most once, however many modes are requested, so comparing network types costs about as much as running t2e once.
+# Arguments:
+    # tweet_data: See t2e.
+    # extmodes: A list of any of t2e's extraction modes. Default is ['ALL_NO_ISOLATES','RTS_ONLY','AT_MENTIONS_ONLY','REPLIES_ONLY'].
+    # enc: See t2e.
+    # save_prefix: Add a string here to save each edgelist to CSV. Your saved files will be named as follows: 'string'_'extmode'_edgelist.csv
+    # weighted: See t2e.
+# Output: A dict whose keys are the (uppercased) extraction modes and whose values are the corresponding edgelists, each identical to what t2e would return for that mode.
+
+def t2e_multi(tweet_data,extmodes=['ALL_NO_ISOLATES','RTS_ONLY','AT_MENTIONS_ONLY','REPLIES_ONLY'],enc='utf-8',save_prefix='',weighted=False):
+    final = {}
+    for extmode in extmodes:
+        final[extmode.upper()] = []
+    modes = [(extmode,_T2E_CONDITIONS.get(extmode,lambda text,lower: True),final[extmode]) for extmode in final]
+
+    for row in _progress(_read_rows(tweet_data,enc),'t2e_multi','read'):
+        lower = row[1].lower()
+        author = None
+        mentions = None
+        for extmode,condition,edges in modes:
+            if condition(row[1],lower):
+                if author is None:
+                    author = _NON_HANDLE_RE.sub('',str(row[0]).lower().strip())
+                    tweet = ' ' + lower + ' '
+                if extmode == 'RTS_ONLY':
+                    edges.extend(_rt_edges(author,tweet))
+                elif mentions is None:
+                    mentions = _mention_edges(author,tweet)
+                    edges.extend(mentions)
+                else:
+                    edges.extend([list(i) for i in mentions]) #copy so that no two edgelists share rows
+    if weighted == True:
+        for extmode in final:
+            final[extmode] = _collapse_edges(final[extmode])
+    logger.info('Edge lists created.')
+
+    if len(save_prefix) > 0:
+        for extmode in final:
+            save_csv(save_prefix + '_' + extmode + '_edgelist.csv',final[extmode])
+
+    return final
+
+# t2e_parallel: convert raw Twitter data to edgelist format using multiple processes
+# Description: t2e_parallel splits its input into shards, runs t2e's extraction on each shard in a separate process, and merges the results in shard order, so its output is identical to that of t2e run serially over the same data. The input can be a list of CSV files (one shard per file) or a single large CSV file, which is split into byte ranges that always begin and end on row boundaries.
+# Arguments:
+    # tweet_data: Either a path to a CSV file formatted for t2e or a list of such paths, which will be processed in the order given.
+    # extmode: See t2e.
+    # enc: See t2e.
+    # save_prefix: See t2e.
+    # workers: The number of processes to use. Default is None, which uses one process per CPU core. If set to 1, the files are read serially in the calling process and no process pool is started.
+    # n_shards: The number of byte ranges into which a single CSV file will be split. Ignored if tweet_data is a list of files. Default is None, which uses one shard per worker.
+    # weighted: See t2e.
+# Output: See t2e. The edges from each shard are concatenated in file and byte order.
+
+def t2e_parallel(tweet_data,extmode='ALL',enc='utf-8',save_prefix='',workers=None,n_shards=None,weighted=False):
+    if workers is None:
+        workers = os.cpu_count()
+
+    final = []
+    if workers == 1: #a single worker reads the files in this process, without a pool or shards
+        paths = [tweet_data] if type(tweet_data) is str else tweet_data
+        with _phase('t2e_parallel','extract') as ph:
+            for path in paths:
+                final.extend(t2e_iter(path,extmode,enc))
+            ph['rows'] = len(final)
+    else:
+        if type(tweet_data) is str:
+            if n_shards is None:
+                n_shards = workers
+            offsets = _csv_shard_offsets(tweet_data,n_shards)
+            shards = [(tweet_data,offsets[n],offsets[n+1],extmode,enc) for n in range(len(offsets)-1)]
+        else:
+            shards = [(path,0,None,extmode,enc) for path in tweet_data]
+        with _phase('t2e_parallel','extract') as ph, concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            for edges in pool.map(_t2e_shard,shards):
+                final.extend(edges)
+            ph['rows'] = len(final)
+    if weighted == True:
+        final = _collapse_edges(final)
+    logger.info('Edge list created.')
 
     if len(save_prefix) > 0:
         outfile = save_prefix + '_edgelist.csv'
@@ -168,46 +595,356 @@ def t2e(tweet_data,extmode='ALL',enc='utf-8',save_prefix=''):
 
     return final
 
+# _t2e_shard: Extract the edges from one shard of a CSV file
+# Description: This is the worker function for t2e_parallel. It decodes the bytes between two offsets of a CSV file exactly as open() would in text mode and passes the rows to t2e_iter.
+# Arguments:
+    # shard: A tuple containing a file path, a start byte offset, an end byte offset (or None to read to the end of the file), an extmode, and an encoding.
+# Output: An edgelist in the form of a Python list of lists.
+
+def _t2e_shard(shard):
+    path,start,end,extmode,enc = shard
+    return list(t2e_iter(csv.reader(_shard_text(path,start,end,enc)),extmode,enc))
+
+# _shard_text: Read the bytes between two offsets of a file and decode them exactly as open() would in text mode
+
+def _shard_text(path,start,end,enc):
+    with open(path,'rb') as f:
+        f.seek(start)
+        if end is None:
+            raw = f.read()
+        else:
+            raw = f.read(end-start)
+    return io.TextIOWrapper(io.BytesIO(raw),encoding = enc,errors = 'replace')
+
+# _csv_shard_offsets: Split a CSV file into byte ranges on row boundaries
+# Description: This is a helper function for t2e_parallel and other functions that process a single large CSV file in parallel. Each split point is moved forward to the first line break at which an even number of double quotes has been seen since the start of the file, so quoted fields containing line breaks are never cut in half.
+# Arguments:
+    # path: A path to a CSV file.
+    # n_shards: The desired number of byte ranges. Small files may yield fewer.
+# Output: A sorted list of byte offsets beginning with 0 and ending with the size of the file. Shard n spans offsets[n] to offsets[n+1].
+
+def _csv_shard_offsets(path,n_shards,block_size=2**24):
+    size = os.path.getsize(path)
+    offsets = [0]
+    quotes = 0
+    pos = 0
+    with open(path,'rb') as f:
+        for n in range(1,n_shards):
+            target = size*n//n_shards
+            if target <= pos:
+                continue
+            f.seek(pos)
+            while pos < target: #count the quotes before the split point in blocks
+                block = f.read(min(block_size,target-pos))
+                quotes += block.count(b'"')
+                pos += len(block)
+            while True: #move forward to the next line break that is not inside a quoted field
+                line = f.readline()
+                quotes += line.count(b'"')
+                pos += len(line)
+                if len(line) == 0 or quotes % 2 == 0:
+                    break
+            if pos < size:
+                offsets.append(pos)
+    offsets.append(size)
+    return offsets
+
+# _T2E_CONDITIONS: the test each of t2e's extraction modes applies to a tweet's text (and its lowercased version, which callers compute once per tweet) before extracting edges from it. Modes not listed here (i.e. ALL) include every tweet.
+
+_T2E_CONDITIONS = {'ALL_NO_ISOLATES': lambda text,lower: '@' in text,
+                   'RTS_ONLY': lambda text,lower: 'rt @' in lower,
+                   'AT_MENTIONS_ONLY': lambda text,lower: '@' in text and 'rt @' not in lower,
+                   'REPLIES_ONLY': lambda text,lower: '@' in text[:2]}
+
+_NON_HANDLE_RE = re.compile('[^A-Za-z0-9_]') #matches any character that cannot appear in a screen name
+
+# _read_rows: Lazily read rows from a CSV file or a list of lists
+# Description: This is a helper function for t2e_iter that yields one row at a time from a CSV file (without loading the whole file into memory) or from a list of lists. Empty rows are skipped.
+# Arguments:
+    # data: A path to a CSV file or a list of lists.
+    # enc: the character encoding of the file you're trying to open. See https://docs.python.org/3.4/library/codecs.html#standard-encodings
+# Output: A generator of rows, each of which is a list.
+
+def _read_rows(data,enc='utf-8'):
+    if type(data) is str:
+        with open(data,'r',encoding = enc,errors = 'replace') as f:
+            for row in csv.reader(f):
+                if row != []:
+                    yield row
+    else:
+        for row in data:
+            if row != []:
+                yield row
+
+# _rt_edges: Extract the retweet edge from a single tweet
+# Arguments:
+    # author: The cleaned screen name of the tweet author.
+    # tweet: The lowercased, space-padded text of the tweet.
+# Output: A list containing an edge from the author to the first retweeted user, or an empty list if the author is blank or retweeted him- or herself.
+
+def _rt_edges(author,tweet):
+    ts = tweet.split('rt @')[1]
+    end = _NON_HANDLE_RE.search(ts)
+    if end is not None:
+        rted = ts[:end.start()]
+    else:
+        rted = ts
+    if len(author) >= 1 and author != rted: #prevents ppl from manually RTing themselves
+        return [[author,rted]]
+    return []
+
+# _mention_edges: Extract all mention edges from a single tweet
+# Arguments:
+    # author: The cleaned screen name of the tweet author.
+    # tweet: The lowercased, space-padded text of the tweet.
+# Output: A list of edges from the author to each user mentioned in the tweet, in order of appearance.
+
+def _mention_edges(author,tweet):
+    edges = []
+    for chunk in tweet.split('@'): #splits each tweet along @s to pull multiple mentioned users
+        end = _NON_HANDLE_RE.search(chunk)
+        if end is not None:
+            name = chunk[:end.start()].strip()
+            if len(name) > 0:
+                edges.append([author,name])
+    return edges
+
+# _collapse_edges: Convert an edgelist to weighted format
+# Arguments:
+    # edges: An iterable of edges, each of which is a list containing a source and a target.
+# Output: A list of lists, each of which contains a unique source, target, and the number of times that edge occurred, in order of first occurrence.
+
+def _collapse_edges(edges):
+    edge_cts = collections.Counter((i[0],i[1]) for i in edges)
+    return [[i[0],i[1],ct] for i,ct in edge_cts.items()]
+
+# _edge_weights: Get the weights of a weighted edgelist
+# Description: This is a helper function for the functions that accept both plain edgelists (one row per tie) and weighted edgelists (source,target,weight rows; see t2e). An edgelist is treated as weighted if its first row has a third column.
+# Arguments:
+    # edges: An edgelist of the type exported by t2e.
+# Output: A numpy array containing the weight of each edge, or None if the edgelist is unweighted.
+
+def _edge_weights(edges):
+    if len(edges) == 0 or len(edges[0]) < 3:
+        return None
+    return np.fromiter((int(i[2]) for i in edges),dtype=np.int64,count=len(edges))
+
+# save_edge_store: Save an edgelist in a compact binary format
+# Description: Loading a large edgelist from CSV creates several Python objects per edge. An edge store instead keeps the edgelist on disk as a directory of numpy arrays: int32 source and target node IDs, optional weights, and a CSR offset index of each node's out-edges, along with a table of node names. load_edge_store memory-maps these arrays, so opening a store is nearly instantaneous, uses no memory until the data is read, and lets several processes share a single copy of the data through the operating system's page cache. calc_ei, get_top_communities, get_intermediaries, build_in_index and communities_as_nodes all accept an edge store (or the path to its directory) in place of an edgelist.
+# Arguments:
+    # edges_data: An edgelist of the type exported by t2e (weighted or not). Can be a list of lists, a generator of edges (such as the output of t2e_iter), or a path to a CSV file, which will be read one row at a time.
+    # path: The name of the directory in which to save the store. It will be created if it does not exist.
+# Output: An object of the custom class "edgeStoreObject" (see load_edge_store) for the saved store.
+
+def save_edge_store(edges_data,path):
+    node_ids = {}
+    src = array.array('i')
+    tgt = array.array('i')
+    weights = array.array('q')
+    for row in _progress(_read_rows(edges_data),'save_edge_store','read'):
+        src.append(node_ids.setdefault(row[0],len(node_ids)))
+        tgt.append(node_ids.setdefault(row[1],len(node_ids)))
+        if len(row) > 2:
+            weights.append(int(row[2]))
+
+    if len(weights) not in (0,len(src)): #weights must line up with edges one to one
+        raise ValueError('Only ' + str(len(weights)) + ' of the ' + str(len(src)) + ' edges have a weight; either every row or no row of the edgelist must have a third column.')
+
+    src = np.frombuffer(src,dtype=np.int32)
+    tgt = np.frombuffer(tgt,dtype=np.int32)
+    order = np.argsort(src,kind='stable')
+    indptr = np.zeros(len(node_ids)+1,dtype=np.int64)
+    np.cumsum(np.bincount(src,minlength=len(node_ids)),out=indptr[1:])
+
+    os.makedirs(path,exist_ok=True)
+    np.save(os.path.join(path,'src.npy'),src)
+    np.save(os.path.join(path,'tgt.npy'),tgt)
+    np.save(os.path.join(path,'indptr.npy'),indptr)
+    np.save(os.path.join(path,'order.npy'),order)
+    if len(weights) > 0:
+        np.save(os.path.join(path,'weights.npy'),np.frombuffer(weights,dtype=np.int64))
+    elif os.path.exists(os.path.join(path,'weights.npy')):
+        os.remove(os.path.join(path,'weights.npy'))
+    with open(os.path.join(path,'names.json'),'w',encoding='utf-8') as f:
+        json.dump(list(node_ids),f)
+    logger.info('Edge store saved to directory "%s".',path)
+    return load_edge_store(path)
+
+# load_edge_store: Open an edge store saved by save_edge_store
+# Arguments:
+    # path: The name of the directory containing the store.
+# Output: An object of the custom class "edgeStoreObject" with the following attributes:
+    # names: A list of all unique node names. The position of each name is its integer node ID.
+    # src: A read-only, memory-mapped numpy int32 array containing the node ID of the sender of each edge, in the original order of the edgelist.
+    # tgt: A read-only, memory-mapped numpy int32 array containing the node ID of the recipient of each edge.
+    # weights: A read-only, memory-mapped numpy int64 array containing the weight of each edge, or None if the edgelist is unweighted.
+    # indptr: A numpy array of length len(names)+1. The positions (in src, tgt and weights) of the edges sent by node ID n are found at order[indptr[n]:indptr[n+1]].
+    # order: A memory-mapped numpy array listing the position of every edge, grouped by sender.
+    # path: The name of the directory containing the store.
+
+class edgeStoreObject:
+    '''an object class with attributes for a binary, memory-mapped edgelist'''
+    def __init__(self,names,src,tgt,weights,indptr,order,path=''):
+        self.names = names
+        self.src = src
+        self.tgt = tgt
+        self.weights = weights
+        self.indptr = indptr
+        self.order = order
+        self.path = path
+
+def load_edge_store(path):
+    with open(os.path.join(path,'names.json'),'r',encoding='utf-8') as f:
+        names = [sys.intern(i) for i in json.load(f)]
+    if os.path.exists(os.path.join(path,'weights.npy')):
+        weights = np.load(os.path.join(path,'weights.npy'),mmap_mode='r')
+    else:
+        weights = None
+    return edgeStoreObject(names,
+                           np.load(os.path.join(path,'src.npy'),mmap_mode='r'),
+                           np.load(os.path.join(path,'tgt.npy'),mmap_mode='r'),
+                           weights,
+                           np.load(os.path.join(path,'indptr.npy'),mmap_mode='r'),
+                           np.load(os.path.join(path,'order.npy'),mmap_mode='r'),
+                           path)
+
+# _as_edge_store: Get an edge store from edges_data if it is one
+# Output: An object of the custom class "edgeStoreObject" if edges_data is one or is the path to a directory containing one, or None otherwise.
+
+def _as_edge_store(edges_data):
+    if isinstance(edges_data,edgeStoreObject):
+        return edges_data
+    if type(edges_data) is str and os.path.isdir(edges_data):
+        return load_edge_store(edges_data)
+    return None
+
+# _load_edges: Load an edgelist as a list of lists, whatever its format
+# Description: This is a helper function for functions that need each edge as a Python list (e.g. to build a NetworkX graph). Edge stores are converted to lists of node names; anything else is passed to load_data.
+# Output: An edgelist in the form of a Python list of lists.
+
+def _load_edges(edges_data):
+    store = _as_edge_store(edges_data)
+    if store is None:
+        return load_data(edges_data)
+    names = store.names
+    if store.weights is None:
+        return [[names[s],names[t]] for s,t in zip(store.src.tolist(),store.tgt.tolist())]
+    return [[names[s],names[t],w] for s,t,w in zip(store.src.tolist(),store.tgt.tolist(),store.weights.tolist())]
+
+# _coded_edges: Code the sender and recipient of every edge by community
+# Description: This is a helper function for functions that count ties between communities. Edge stores are coded with array lookups alone; other edgelists are loaded and their node names looked up one by one.
+# Arguments:
+    # node_index: An object of the custom class "nodeIndexObject" created by build_node_index.
+    # edges_data: An edgelist of the type exported by t2e or an edge store.
+    # unique: If set to True, duplicate edges will be removed and all weights ignored. Default is False.
+# Output: A tuple containing a numpy array of the community codes (positions in node_index.community_ids, or -1) of each edge's sender, the same for each edge's recipient, and a numpy array of edge weights or None if the edgelist is unweighted (or unique is set to True).
+
+def _coded_edges(node_index,edges_data,unique=False):
+    store = _as_edge_store(edges_data)
+    if store is None:
+        edges = load_data(edges_data)
+        if unique == True:
+            edges = list(set([(i[0],i[1]) for i in edges]))
+        return _community_codes(node_index,[i[0] for i in edges]),_community_codes(node_index,[i[1] for i in edges]),_edge_weights(edges)
+
+    src = np.asarray(store.src)
+    tgt = np.asarray(store.tgt)
+    weights = store.weights
+    if unique == True:
+        first = np.unique(src.astype(np.int64)*len(store.names) + tgt,return_index=True)[1]
+        src = src[first]
+        tgt = tgt[first]
+        weights = None
+    codes = _community_codes(node_index,store.names)
+    if weights is not None:
+        weights = np.asarray(weights)
+    return codes[src],codes[tgt],weights
+
 # get_top_communities: Get top k communities by membership
 # Description: This function runs the Louvain method for community detection on an edgelist and returns the names within each of the top k detected communities, the community to which each name belongs, and each name's in-degree. It's basically a wrapper for Thomas Aynaud's excellent Python implementation of Louvain (original version here: http://perso.crans.org/aynaud/communities/) with a few upgrades I found useful. See Blondel, V. D., Guillaume, J. L., Lambiotte, R., & Lefebvre, E. (2008). Fast unfolding of communities in large networks. Journal of Statistical Mechanics: Theory and Experiment, 2008(10), P10008.
 # Arguments:
-    # edges_data: An edgelist of the type exported by t2e. Can be a list of lists or a path to a CSV file.
+    # edges_data: An edgelist of the type exported by t2e. Can be a list of lists, a path to a CSV file, or an edge store (see save_edge_store). If the edgelist is weighted (see t2e), the Louvain method will be run on the weighted undirected network, in which the weights of A->B and B->A edges are summed.
     # top_comm: This variable can either be an integer or a decimal (float) between 0 and 1. If an integer, it represents the top k communities by node population to be analyzed. If a decimal, it represents the top (k*100)% of communities by population to be analyzed. These will be the communities which this module's functions will manipulate. For large Twitter networks, I have found it fruitful to work with the top ten largest retweet or @-mention communities. The higher this integer or decimal, the longer TSM will take to process your data. Enter 1.0 to analyze all communities. Default is 10.
-    # randomize: If this variable is set to True, the edgelist will be randomized before running the rest of the function. This will produce slightly different results on each run. If the variable is set to False, the edgelist will not be randomized and the results will always be the same. Default is True.
-    # prominence_metric: The network metric by which nodes will be ranked in descending order in the nodes_list of your louvainObject. This variable may be assigned any per-node metric available in NetworkX (see http://networkx.github.io/documentation/networkx-1.9.1/ ). NetworkX's methods need to be written as strings (e.g. 'in_degree'); functions need to be written with the appropriate module prefix(es) and without quotes (e.g. tsm.nx.eigenvector_centrality). Default is 'in_degree'.
+    # randomize: If this variable is set to True, the edgelist will be randomized before running the rest of the function. This will produce slightly different results on each run (unless seed is set). If the variable is set to False, the edgelist will not be randomized and the results will always be the same. Default is True.
+    # prominence_metric: The network metric by which nodes will be ranked in descending order in the nodes_list of your louvainObject. This variable may be assigned any per-node metric available in NetworkX (see http://networkx.github.io/documentation/networkx-1.9.1/ ). NetworkX's methods need to be written as strings (e.g. 'in_degree'); functions need to be written with the appropriate module prefix(es) and without quotes (e.g. tsm.nx.eigenvector_centrality). TSM also has built-in versions of the most common metrics, which are much faster on large networks because they skip building a NetworkX graph: 'in_degree', 'out_degree', 'weighted_in_degree', 'pagerank', 'eigenvector' and 'betweenness' (see "Prominence metrics" below for details). Default is 'in_degree'.
     # save_prefix: Add a string here to save your file to CSV. Your saved file will be named as follows: 'string'_communities.csv
+    # engine: The community detection algorithm to use: 'louvain' (python-louvain, the default), 'networkx' (NetworkX's Louvain implementation), 'array_louvain' (TSM's built-in array version of Louvain, which is much faster on large networks) or 'label_propagation' (TSM's built-in label propagation, faster still but less accurate). See "Community detection engines" below for details. You may also pass a function of your own; like prominence_metric, it should be written without quotes.
+    # seed: An integer with which to seed the random number generators used to shuffle the edgelist and partition the network, so that results with randomize=True can be reproduced. Default is None.
+    # n_runs: The number of times to partition the network, each time with a different seed. If greater than 1, the partitions are computed in parallel processes and combined as described under consensus, and the stability of each node's community assignment is reported. Default is 1.
+    # consensus: If n_runs is greater than 1 and this variable is set to True, the output will be based on a consensus partition, in which two neighboring nodes share a community if they were placed together in at least half of all runs. If set to False, the run with the highest modularity will be used. Default is False.
+    # workers: The number of processes to use when n_runs is greater than 1. Default is None, which uses one process per CPU core. Set it to 1 to do all runs in the current process.
+    # init_partition: A community partition (a louvainObject, a nodeIndexObject, or a node list or CSV file of the type exported by get_top_communities) from which to start community detection instead of placing each node in its own community, such as the partition of an overlapping network. Nodes it does not contain start out on their own. Starting from a similar partition usually takes much less time. All engines except 'networkx' support this. Default is None.
+    # betweenness_samples: The number of randomly chosen nodes from which shortest paths are followed when prominence_metric is set to 'betweenness'. More samples give a more accurate estimate but take proportionally longer. Default is 1000.
+    # cache: A resultCache in which to look up the result before computing it, and to store it afterwards. Results are keyed by the contents of edges_data and init_partition along with every other argument except save_prefix and workers. Only runs with a seed are cached, since unseeded runs give a different result each time. Default is None.
 # Output: An object of the custom class 'louvainObject' with the following attributes:
     # node_list: A list of lists containing each unique node in the largest communities as defined above by the top_comm variable, the ID of the community to which it belongs, and its in-degree.
     # n_nodes: A dict in which the keys are community IDs and the values are integers representing the number of nodes belonging to each community
     # n_communities: An integer representing the total number of communities detected by the algorithm.
     # modularity: A float representing the network's modularity.
     # node_propor: A float representing the proportion of all nodes included within the largest communities.
-    # edge_propor: A float representing the proportion of all edges included within the largest communities.
+    # edge_propor: A float representing the proportion of all edges included within the largest communities. For weighted edgelists, this is the proportion of the total edge weight.
+    # stability: If n_runs is greater than 1, a dict in which the keys are node names and the values are floats between 0 and 1 representing how consistently each node was assigned to its final community across runs (1 means every run agreed). None otherwise.
 
 class louvainObject:
     '''an object class with attributes for various Louvain-related data and metadata'''
-    def __init__(self,node_list,n_nodes,n_communities,modularity,node_propor,edge_propor):
+    def __init__(self,node_list,n_nodes,n_communities,modularity,node_propor,edge_propor,stability=None):
         self.node_list = node_list
         self.n_nodes = n_nodes
         self.n_communities = n_communities
         self.modularity = modularity
         self.node_propor = node_propor
         self.edge_propor = edge_propor
+        self.stability = stability
 
 def get_top_communities(edges_data,
                         top_comm=10,
                         randomize=True,
                         prominence_metric='in_degree',
-                        save_prefix=''):
-    edge_list = load_data(edges_data)
-    if randomize == True:
-        random.shuffle(edge_list)
-
-    non_dir = nx.Graph()
-    non_dir.add_edges_from(edge_list)
-    print("Non-directed network created.")
-    allmods = community.best_partition(non_dir)
-    print("Community partition complete.")
+                        save_prefix='',
+                        engine='louvain',
+                        seed=None,
+                        n_runs=1,
+                        consensus=False,
+                        workers=None,
+                        init_partition=None,
+                        cache=None,
+                        betweenness_samples=1000):
+    cache_key = None
+    if cache is not None and seed is not None: #unseeded runs are random, so there is no single result to store
+        cache_key = cache._key('get_top_communities',edges_data,[top_comm,randomize,prominence_metric,engine,seed,n_runs,consensus,betweenness_samples,None if init_partition is None else cache._data_hash(init_partition)])
+        if cache_key is not None:
+            cached = cache._get(cache_key)
+            if cached is not None:
+                logger.info("Community analysis loaded from cache.")
+                _save_communities(cached.node_list,prominence_metric,save_prefix)
+                return cached
+
+    rng = random.Random(seed)
+    with _phase('get_top_communities','load') as ph:
+        edge_list = _load_edges(edges_data)
+        if randomize == True:
+            edge_list = rng.sample(edge_list,len(edge_list)) #shuffle a copy so edges_data is left untouched
+        ph['rows'] = len(edge_list)
+
+    with _phase('get_top_communities','graph_build') as ph:
+        weights = _edge_weights(edge_list)
+        names,u,v,w = _undirected_edges(edge_list,weights)
+        ph['rows'] = len(u)
+    logger.info("Non-directed network created.")
+    with _phase('get_top_communities','partition') as ph:
+        init_labels = None
+        if init_partition is not None:
+            init_labels = _initial_labels(build_node_index(init_partition),names)
+        stability = None
+        if n_runs > 1:
+            run_seeds = [rng.randrange(2**31) for n in range(n_runs)]
+            labels,node_stability = _ensemble_partition(len(names),u,v,w,engine,run_seeds,consensus,workers,init_labels)
+            stability = dict(zip(names,node_stability.tolist()))
+        else:
+            labels = _run_engine(_community_engine(engine),len(names),u,v,w,seed,init_labels)
+        allmods = dict(zip(names,labels.tolist()))
+        ph['rows'] = len(names)
+    logger.info("Community partition complete.")
     uniqmods = {}
 
     for i in allmods: #creates a dict of unique communities and the n of times they occur
@@ -230,12 +967,21 @@ def get_top_communities(edges_data,
 
     top_edge_list = [i for i in edge_list if i[0] in filtered_nodes and i[1] in filtered_nodes]
 
-    di_net = nx.DiGraph()
-    di_net.add_edges_from(top_edge_list)
-    try:
-        ind = getattr(di_net,prominence_metric)()
-    except (AttributeError,TypeError):
-        ind = prominence_metric(di_net)
+    with _phase('get_top_communities','prominence') as ph:
+        if type(prominence_metric) is str and prominence_metric in _PROMINENCE_METRICS: #built-in metrics skip the DiGraph entirely
+            top_weights = None if weights is None else np.fromiter((int(i[2]) for i in top_edge_list),dtype=np.float64,count=len(top_edge_list))
+            ind = _array_prominence(prominence_metric,list(filtered_nodes),top_edge_list,top_weights,rng,betweenness_samples)
+        else:
+            di_net = nx.DiGraph()
+            if weights is None:
+                di_net.add_edges_from(top_edge_list)
+            else:
+                di_net.add_weighted_edges_from([(i[0],i[1],int(i[2])) for i in top_edge_list])
+            try:
+                ind = getattr(di_net,prominence_metric)()
+            except (AttributeError,TypeError):
+                ind = prominence_metric(di_net)
+        ph['rows'] = len(top_edge_list)
     outlist = []
 
     for i in filtered_nodes:
@@ -245,9 +991,14 @@ def get_top_communities(edges_data,
     for i in outlist:
         del i[0]
 
-    mod = round(community.modularity(allmods,non_dir),2)
+    with _phase('get_top_communities','modularity') as ph:
+        mod = round(_modularity(labels,u,v,w),2)
+        ph['rows'] = len(u)
     node_propor = round((len(filtered_nodes)/len(allmods))*100,2)
-    edge_propor = round((len(top_edge_list)/len(edge_list))*100,2)
+    if weights is None:
+        edge_propor = round((len(top_edge_list)/len(edge_list))*100,2)
+    else:
+        edge_propor = round((sum(int(i[2]) for i in top_edge_list)/int(weights.sum()))*100,2)
     n_nodes = {}
     for i in outlist:
         if i[1] in n_nodes:
@@ -255,13 +1006,21 @@ def get_top_communities(edges_data,
         else:
             n_nodes[i[1]] = 1
 
-    print("Total n of communities:",n_communities)
+    logger.info("Total n of communities: %s",n_communities)
     if n_communities < top_comm:
         top_comm = n_communities #in case there are fewer detected communities than specified in top_comm
-    print("Modularity:",mod)
-    print("Community analysis complete. The top",top_comm,"communities in this network account for",node_propor,"% of all nodes.")
-    print("And",edge_propor,"% of all edges.")
+    logger.info("Modularity: %s",mod)
+    logger.info("Community analysis complete. The top %s communities in this network account for %s %% of all nodes.",top_comm,node_propor)
+    logger.info("And %s %% of all edges.",edge_propor)
 
+    lo = louvainObject(outlist,n_nodes,n_communities,mod,node_propor,edge_propor,stability)
+    if cache_key is not None:
+        cache._put(cache_key,lo)
+    _save_communities(outlist,prominence_metric,save_prefix)
+
+    return lo
+
+def _save_communities(outlist,prominence_metric,save_prefix):
     if len(save_prefix)>0:
         if type(prominence_metric) is str:
             prominence_header = prominence_metric
@@ -271,16 +1030,480 @@ def get_top_communities(edges_data,
         outfile = save_prefix + '_communities.csv'
         save_csv(outfile,outlist)
 
-    return louvainObject(outlist,n_nodes,n_communities,mod,node_propor,edge_propor)
+# _undirected_edges: Collapse an edgelist into the undirected network on which communities are detected
+# Description: This is a helper function for get_top_communities. Each node is given an integer code in order of first appearance, and A->B and B->A edges are merged into a single undirected edge, exactly as a NetworkX Graph would merge them: unweighted edges count once no matter how often they occur, while the weights of weighted edges are summed.
+# Arguments:
+    # edge_list: An edgelist in the form of a Python list of lists.
+    # weights: A numpy array of edge weights of the type returned by _edge_weights, or None if the edgelist is unweighted.
+# Output: A tuple containing a list of node names (whose positions are their codes), a numpy array of the lower node code of each undirected edge, a numpy array of the higher node code, and a numpy array of edge weights.
+
+def _undirected_edges(edge_list,weights):
+    node_codes = {}
+    ends = np.fromiter((node_codes.setdefault(n,len(node_codes)) for i in edge_list for n in (i[0],i[1])),dtype=np.int64,count=2*len(edge_list))
+    names = list(node_codes)
+    n = max(len(names),1)
+    pairs = np.minimum(ends[0::2],ends[1::2])*n + np.maximum(ends[0::2],ends[1::2])
+    if weights is None:
+        pairs = np.unique(pairs)
+        w = np.ones(len(pairs),dtype=np.int64)
+    else:
+        pairs,inverse = np.unique(pairs,return_inverse=True)
+        w = np.bincount(inverse,weights=weights,minlength=len(pairs)).astype(np.int64)
+    return names,pairs // n,pairs % n,w
+
+# _modularity: Calculate the modularity of a partition of an undirected network
+# Description: An array version of community.modularity that gives the same result for the same partition (self-loops included) without building a NetworkX graph.
+# Arguments:
+    # labels: A numpy array containing the community label of each node.
+    # u, v, w: numpy arrays of the end codes and weights of each undirected edge, of the type returned by _undirected_edges.
+# Output: A float representing the partition's modularity.
+
+def _modularity(labels,u,v,w):
+    m = float(w.sum())
+    if m == 0:
+        return 0.0
+    k = int(labels.max()) + 1
+    cu = labels[u]
+    cv = labels[v]
+    degree = np.bincount(cu,weights=w,minlength=k) + np.bincount(cv,weights=w,minlength=k)
+    internal = np.bincount(cu[cu == cv],weights=w[cu == cv],minlength=k)
+    return float((internal/m - (degree/(2*m))**2).sum())
+
+# _renumber_labels: Renumber community labels 0, 1, 2... in order of first appearance
+# Description: This makes the community IDs returned by every engine look like those of community.best_partition.
+
+def _renumber_labels(labels):
+    labels = np.asarray(labels)
+    if len(labels) == 0:
+        return labels.astype(np.int64)
+    first,inverse = np.unique(labels,return_index=True,return_inverse=True)[1:]
+    rank = np.empty(len(first),dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    return rank[inverse.reshape(-1)]
+
+# _neighbor_community_weights: Sum the weight of each node's ties to each neighboring community
+# Description: This is a helper function for the array-based community detection engines. src, dst and ww hold both directions of every undirected edge except self-loops.
+# Output: A tuple containing a numpy array of (node, community) pairs coded as node*n + community, and a numpy array of the total weight of the ties between each pair's node and community.
+
+def _neighbor_community_weights(src,dst,ww,labels,n):
+    pairs,inverse = np.unique(src*n + labels[dst],return_inverse=True)
+    return pairs,np.bincount(inverse.reshape(-1),weights=ww,minlength=len(pairs))
+
+# _both_directions: List both directions of every undirected edge except self-loops, as the array engines' sources, destinations and weights
+
+def _both_directions(u,v,w):
+    off = u != v
+    return np.concatenate((u[off],v[off])),np.concatenate((v[off],u[off])),np.concatenate((w[off],w[off])).astype(np.float64)
+
+# _first_per_node: Keep the first of each node's (node, community) pairs in an order sorted by node
+
+def _first_per_node(order,node):
+    if len(order) == 0:
+        return order
+    sorted_nodes = node[order]
+    return order[np.concatenate(([True],sorted_nodes[1:] != sorted_nodes[:-1]))]
+
+# Community detection engines
+# Description: These are the functions get_top_communities can use to partition a network (see its engine argument). Each takes the number of nodes, the undirected edge arrays returned by _undirected_edges and a random seed (or None), and returns a sequence containing the community label of each node. Any function with the same signature may be passed to get_top_communities as an engine. Engines that can start from an existing partition also accept an init_labels argument: a numpy array containing each node's initial community label.
+    # 'louvain': Thomas Aynaud's python-louvain (community.best_partition). This is TSM's original engine.
+    # 'networkx': NetworkX's own Louvain implementation, nx.community.louvain_communities (NetworkX 2.8 or later). It cannot start from an existing partition, so it ignores init_labels.
+    # 'array_louvain': A built-in version of the Louvain method that works on numpy arrays instead of a NetworkX graph. Rather than moving one node at a time, each pass moves every node that would gain from joining a neighboring community at once, keeping the moves only if modularity rises (and trying again with a random fraction of them if it doesn't). Its results are close to, though not identical with, those of the other Louvain engines, and it is much faster on large networks.
+    # 'label_propagation': A built-in array version of label propagation (Raghavan, U. N., Albert, R., & Kumara, S. (2007). Near linear time algorithm to detect community structures in large-scale networks. Physical Review E, 76(3), 036106), in which nodes repeatedly adopt the label carrying the most weight among their neighbors. It is the fastest engine but does not optimize modularity directly.
+
+def _networkx_graph(n_nodes,u,v,w):
+    graph = nx.Graph()
+    graph.add_nodes_from(range(n_nodes))
+    graph.add_weighted_edges_from(zip(u.tolist(),v.tolist(),w.tolist()))
+    return graph
+
+def _louvain_engine(n_nodes,u,v,w,seed=None,init_labels=None):
+    graph = _networkx_graph(n_nodes,u,v,w)
+    kwargs = {}
+    if seed is not None:
+        kwargs['random_state'] = seed
+    if init_labels is not None:
+        kwargs['partition'] = dict(enumerate(init_labels.tolist()))
+    partition = community.best_partition(graph,**kwargs)
+    return [partition[i] for i in range(n_nodes)]
+
+def _networkx_engine(n_nodes,u,v,w,seed=None,init_labels=None):
+    louvain_communities = getattr(nx.algorithms.community,'louvain_communities',None)
+    if louvain_communities is None:
+        raise ValueError("The 'networkx' engine requires NetworkX 2.8 or later.")
+    labels = np.zeros(n_nodes,dtype=np.int64)
+    for i,members in enumerate(louvain_communities(_networkx_graph(n_nodes,u,v,w),seed=seed)):
+        labels[list(members)] = i
+    return labels
+
+def _array_louvain_engine(n_nodes,u,v,w,seed=None,init_labels=None):
+    rng = np.random.RandomState(seed)
+    node_cmty = np.arange(n_nodes)
+    w = w.astype(np.float64)
+    n = n_nodes
+    while n > 0:
+        labels = _renumber_labels(_array_louvain_level(n,u,v,w,rng,init_labels))
+        init_labels = None #later levels start from the communities found by the previous one
+        k = int(labels.max()) + 1
+        if k == n: #no node changed community, so the partition is final
+            break
+        node_cmty = labels[node_cmty]
+        pairs = np.minimum(labels[u],labels[v])*k + np.maximum(labels[u],labels[v]) #collapse each community into a single node for the next level
+        pairs,inverse = np.unique(pairs,return_inverse=True)
+        w = np.bincount(inverse.reshape(-1),weights=w,minlength=len(pairs))
+        u = pairs // k
+        v = pairs % k
+        n = k
+    return node_cmty
+
+def _array_louvain_level(n,u,v,w,rng,init_labels=None,min_fraction=1/64):
+    m = w.sum()
+    if init_labels is None:
+        labels = np.arange(n)
+    else:
+        labels = _renumber_labels(init_labels)
+    if m == 0:
+        return labels
+    src,dst,ww = _both_directions(u,v,w)
+    degree = np.bincount(u,weights=w,minlength=n) + np.bincount(v,weights=w,minlength=n)
+    q = _modularity(labels,u,v,w)
+    fraction = 1.0
+    while fraction >= min_fraction:
+        pairs,k_in = _neighbor_community_weights(src,dst,ww,labels,n)
+        node = pairs // n
+        cmty = pairs % n
+        own = cmty == labels[node]
+        k_own = np.zeros(n)
+        k_own[node[own]] = k_in[own]
+        sigma = np.bincount(labels,weights=degree,minlength=n)
+        size = np.bincount(labels,minlength=n)
+        gain = (k_in - k_own[node]) - degree[node]*(sigma[cmty] - sigma[labels[node]] + degree[node])/(2*m) #modularity gain (times m) of moving node into cmty
+        lone_swap = (size[labels[node]] == 1) & (size[cmty] == 1) & (cmty > labels[node]) #stops two lone nodes from swapping places with each other
+        candidates = np.flatnonzero(~own & ~lone_swap & (gain > 1e-12))
+        if len(candidates) == 0:
+            break
+        moves = _first_per_node(candidates[np.lexsort((-gain[candidates],node[candidates]))],node)
+        if fraction < 1:
+            chosen = rng.random_sample(len(moves)) < fraction
+            if not chosen.any():
+                chosen[rng.randint(len(moves))] = True
+            moves = moves[chosen]
+        new_labels = labels.copy()
+        new_labels[node[moves]] = cmty[moves]
+        new_q = _modularity(new_labels,u,v,w)
+        if new_q > q + 1e-12:
+            labels = new_labels
+            q = new_q
+        else:
+            fraction /= 2
+    return labels
+
+def _label_propagation_engine(n_nodes,u,v,w,seed=None,init_labels=None,max_iter=100):
+    rng = np.random.RandomState(seed)
+    if init_labels is None:
+        labels = np.arange(n_nodes)
+    else:
+        labels = _renumber_labels(init_labels)
+    src,dst,ww = _both_directions(u,v,w)
+    for _ in range(max_iter):
+        pairs,k_in = _neighbor_community_weights(src,dst,ww,labels,n_nodes)
+        node = pairs // n_nodes
+        cmty = pairs % n_nodes
+        other = cmty != labels[node]
+        best = _first_per_node(np.lexsort((rng.random_sample(len(pairs)),other,-k_in,node)),node) #heaviest label first, keeping the current label in case of a tie
+        moves = best[other[best]]
+        if len(moves) == 0:
+            break
+        chosen = rng.random_sample(len(moves)) < 0.5 #update about half the nodes at a time to keep labels from oscillating
+        if not chosen.any():
+            chosen[rng.randint(len(moves))] = True
+        moves = moves[chosen]
+        labels[node[moves]] = cmty[moves]
+    return labels
+
+_COMMUNITY_ENGINES = {'louvain':_louvain_engine,
+                      'networkx':_networkx_engine,
+                      'array_louvain':_array_louvain_engine,
+                      'label_propagation':_label_propagation_engine}
+
+def _community_engine(engine):
+    try:
+        return _COMMUNITY_ENGINES[engine]
+    except (KeyError,TypeError):
+        return engine
+
+# _run_engine: Partition a network with an engine, starting from init_labels if given, and renumber the resulting communities
+
+def _run_engine(partition,n_nodes,u,v,w,seed,init_labels=None):
+    if init_labels is None:
+        return _renumber_labels(partition(n_nodes,u,v,w,seed))
+    return _renumber_labels(partition(n_nodes,u,v,w,seed,init_labels))
+
+# _initial_labels: Give each node its community in an existing partition as its initial community label
+# Description: This is a helper function for get_top_communities. Nodes that have no community in node_index are each given a label of their own.
+# Output: A numpy array containing the initial community label of each node in names.
+
+def _initial_labels(node_index,names):
+    labels = _community_codes(node_index,names)
+    missing = labels < 0
+    labels[missing] = len(node_index.community_ids) + np.arange(int(missing.sum()))
+    return labels
+
+# _ensemble_partition: Partition a network several times and combine the results
+# Description: This is a helper function for get_top_communities. Each run uses its own seed; runs are spread over a process pool whose workers each receive the undirected edge arrays only once, when they start. The final partition is either the run with the highest modularity or, if consensus is set to True, the consensus partition, in which two neighboring nodes share a community if they were placed together in at least half of all runs (or are linked through a chain of such neighbors). Each node's stability is the proportion of run-by-run decisions about its edges (whether its neighbors belong to its community or not) that agree with the final partition, averaged over all its edges.
+# Arguments:
+    # n_nodes, u, v, w: The number of nodes and the undirected edge arrays returned by _undirected_edges.
+    # engine: See get_top_communities. Custom engines must be defined at the top level of a module so they can be sent to other processes.
+    # run_seeds: A list containing the seed of each run.
+    # consensus: See get_top_communities.
+    # workers: See get_top_communities.
+    # init_labels: A numpy array of each node's initial community label of the type returned by _initial_labels, or None.
+# Output: A tuple containing a numpy array of each node's community label and a numpy array of each node's stability (a float between 0 and 1).
+
+def _ensemble_partition(n_nodes,u,v,w,engine,run_seeds,consensus,workers,init_labels=None):
+    if workers == 1:
+        _ensemble_init(n_nodes,u,v,w,engine,init_labels)
+        runs = [_ensemble_run(i) for i in run_seeds]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,initializer=_ensemble_init,initargs=(n_nodes,u,v,w,engine,init_labels)) as pool:
+            runs = list(pool.map(_ensemble_run,run_seeds))
+
+    off = u != v
+    together = np.zeros(int(off.sum()))
+    for labels in runs:
+        together += labels[u[off]] == labels[v[off]]
+    together /= len(runs) #the proportion of runs in which each edge's nodes were placed in the same community
+
+    if consensus == True:
+        labels = _renumber_labels(_connected_components(n_nodes,u[off][together >= 0.5],v[off][together >= 0.5]))
+    else:
+        labels = runs[int(np.argmax([_modularity(i,u,v,w) for i in runs]))]
+
+    same = labels[u[off]] == labels[v[off]]
+    agreement = np.where(same,together,1 - together)
+    n_edges = np.bincount(u[off],minlength=n_nodes) + np.bincount(v[off],minlength=n_nodes)
+    total = np.bincount(u[off],weights=agreement,minlength=n_nodes) + np.bincount(v[off],weights=agreement,minlength=n_nodes)
+    return labels,np.where(n_edges > 0,total/np.maximum(n_edges,1),1.0)
+
+# _ensemble_init and _ensemble_run: The worker functions for _ensemble_partition. _ensemble_init stores the shared network in each worker when it starts; _ensemble_run partitions it with a given seed.
+
+_ensemble_graph = None
+
+def _ensemble_init(n_nodes,u,v,w,engine,init_labels=None):
+    global _ensemble_graph
+    _ensemble_graph = (n_nodes,u,v,w,_community_engine(engine),init_labels)
+
+def _ensemble_run(seed):
+    n_nodes,u,v,w,partition,init_labels = _ensemble_graph
+    return _run_engine(partition,n_nodes,u,v,w,seed,init_labels)
+
+# _connected_components: Label the connected components of an undirected network
+# Description: Each node repeatedly takes the lowest label among its neighbors, and labels are then pointed directly at their lowest known member, until nothing changes.
+# Output: A numpy array in which each node is labeled with the lowest node code in its component.
+
+def _connected_components(n_nodes,u,v):
+    labels = np.arange(n_nodes)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels,u,labels[v])
+        np.minimum.at(labels,v,labels[u])
+        labels = labels[labels]
+        if np.array_equal(labels,previous):
+            return labels
+
+# Prominence metrics
+# Description: These are the built-in metrics by which get_top_communities can rank nodes (see its prominence_metric argument). Rather than building a NetworkX DiGraph of the top communities, they work on a compressed sparse row (CSR) adjacency of its directed edges, in which duplicate edges are merged and their weights summed; edges in an unweighted edgelist each have a weight of 1, so an unweighted edgelist and the same edgelist collapsed with t2e's weighted argument give the same results. Each takes the number of nodes, arrays of the source and target node codes and weight of each distinct edge, a random.Random instance and a sample count, and returns a numpy array containing the value of each node.
+    # 'in_degree' and 'out_degree': The number of distinct nodes linking to (or linked to by) each node, as returned by NetworkX's DiGraph methods of the same names.
+    # 'weighted_in_degree': The total weight of the edges pointing to each node, i.e. the number of times it was mentioned or retweeted.
+    # 'pagerank': PageRank computed by power iteration with edges weighted by their weights, with the same damping factor (0.85), starting point and stopping rule as nx.pagerank.
+    # 'eigenvector': Eigenvector centrality computed by power iteration with edges weighted by their weights, with the same starting point and stopping rule as nx.eigenvector_centrality. Both this metric and 'pagerank' log a warning and return their last estimate if they have not converged after 100 iterations.
+    # 'betweenness': Approximate betweenness centrality, estimated from the shortest paths starting at a random sample of n_samples nodes (or all nodes, if there are fewer) and normalized as in nx.betweenness_centrality with its k argument. Shortest paths are counted in hops, ignoring edge weights. With every node sampled, the result is exact.
+
+def _in_degree_metric(n_nodes,src,tgt,w,rng,n_samples):
+    return np.bincount(tgt,minlength=n_nodes)
+
+def _out_degree_metric(n_nodes,src,tgt,w,rng,n_samples):
+    return np.bincount(src,minlength=n_nodes)
+
+def _weighted_in_degree_metric(n_nodes,src,tgt,w,rng,n_samples):
+    return np.bincount(tgt,weights=w,minlength=n_nodes).astype(np.int64)
+
+def _pagerank_metric(n_nodes,src,tgt,w,rng,n_samples,alpha=0.85,max_iter=100,tol=1.0e-6):
+    out_weight = np.bincount(src,weights=w,minlength=n_nodes)
+    dangling = out_weight == 0
+    share = w / out_weight[src] #the proportion of each node's rank passed along each of its edges
+    x = np.full(n_nodes,1.0 / n_nodes)
+    for n in range(max_iter):
+        last = x
+        x = alpha * (np.bincount(tgt,weights=last[src] * share,minlength=n_nodes) + last[dangling].sum() / n_nodes) + (1 - alpha) / n_nodes
+        if np.abs(x - last).sum() < n_nodes * tol:
+            return x
+    logger.warning('PageRank did not converge after %s iterations.',max_iter)
+    return x
+
+def _eigenvector_metric(n_nodes,src,tgt,w,rng,n_samples,max_iter=100,tol=1.0e-6):
+    x = np.full(n_nodes,1.0 / n_nodes)
+    for n in range(max_iter):
+        last = x
+        x = last + np.bincount(tgt,weights=last[src] * w,minlength=n_nodes) #iterates with A+I, as NetworkX does
+        x = x / (np.sqrt((x * x).sum()) or 1)
+        if np.abs(x - last).sum() < n_nodes * tol:
+            return x
+    logger.warning('Eigenvector centrality did not converge after %s iterations.',max_iter)
+    return x
+
+def _betweenness_metric(n_nodes,src,tgt,w,rng,n_samples):
+    order = np.argsort(src,kind='stable')
+    indptr = np.zeros(n_nodes + 1,dtype=np.int64)
+    np.cumsum(np.bincount(src,minlength=n_nodes),out=indptr[1:])
+    targets = tgt[order]
+    k = min(n_samples,n_nodes)
+    betweenness = np.zeros(n_nodes)
+    for s in rng.sample(range(n_nodes),k):
+        #Brandes' algorithm, one breadth-first level at a time
+        dist = np.full(n_nodes,-1,dtype=np.int64)
+        sigma = np.zeros(n_nodes) #the number of shortest paths from s to each node
+        dist[s] = 0
+        sigma[s] = 1
+        frontier = np.array([s])
+        levels = []
+        depth = 0
+        while len(frontier) > 0:
+            counts = indptr[frontier + 1] - indptr[frontier]
+            starts = np.repeat(indptr[frontier] - np.cumsum(counts) + counts,counts)
+            a = np.repeat(frontier,counts)
+            b = targets[starts + np.arange(len(a))]
+            unseen = b[dist[b] < 0]
+            dist[unseen] = depth + 1
+            on_path = dist[b] == depth + 1
+            a,b = a[on_path],b[on_path]
+            np.add.at(sigma,b,sigma[a])
+            levels.append([a,b])
+            frontier = np.unique(unseen)
+            depth += 1
+        delta = np.zeros(n_nodes)
+        for a,b in reversed(levels):
+            np.add.at(delta,a,sigma[a] / sigma[b] * (1 + delta[b]))
+        delta[s] = 0
+        betweenness += delta
+    if n_nodes > 2:
+        betweenness *= n_nodes / (k * (n_nodes - 1) * (n_nodes - 2))
+    return betweenness
+
+_PROMINENCE_METRICS = {'in_degree':_in_degree_metric,
+                       'out_degree':_out_degree_metric,
+                       'weighted_in_degree':_weighted_in_degree_metric,
+                       'pagerank':_pagerank_metric,
+                       'eigenvector':_eigenvector_metric,
+                       'betweenness':_betweenness_metric}
+
+# _array_prominence: Compute a built-in prominence metric for each node in the top communities
+# Description: This is a helper function for get_top_communities. It gives the nodes codes in order of appearance in top_names, merges duplicate edges and passes the result to the chosen metric.
+# Output: A dict in which the keys are node names and the values are their values of the metric (ints for the degree metrics, floats otherwise).
+
+def _array_prominence(metric,top_names,top_edge_list,weights,rng,n_samples):
+    node_codes = {n:i for i,n in enumerate(top_names)}
+    n_nodes = len(node_codes)
+    src = np.fromiter((node_codes[i[0]] for i in top_edge_list),dtype=np.int64,count=len(top_edge_list))
+    tgt = np.fromiter((node_codes[i[1]] for i in top_edge_list),dtype=np.int64,count=len(top_edge_list))
+    edges,inverse = np.unique(src * n_nodes + tgt,return_inverse=True)
+    w = np.bincount(inverse.ravel(),weights=weights,minlength=len(edges))
+    values = _PROMINENCE_METRICS[metric](n_nodes,edges // n_nodes,edges % n_nodes,w,rng,n_samples) if n_nodes > 0 else np.zeros(0)
+    return dict(zip(top_names,values.tolist()))
+
+# build_node_index: Create a shared mapping between node names, integer IDs and communities
+# Description: Most of TSM's functions need to look up the community of a node by its name. Rather than have each function rebuild its own dict of names from a node list, build_node_index stores each unique name once (interned) alongside a dense integer ID and a compact array of community codes. The resulting nodeIndexObject can be built once per network and passed to calc_ei, match_communities, get_intermediaries, get_top_rts, get_top_hashtags, get_top_links and communities_as_nodes in place of nodes_data.
+# Arguments:
+    # data: A community-partition dataset of the type exported by get_top_communities (a list of lists or a path to a CSV file), a louvainObject, or an edgelist of the type exported by t2e (see from_edges).
+    # from_edges: If set to True, data will be treated as an edgelist: every node appearing in it will be indexed, and none will be assigned a community. If set to False, data will be treated as a community partition. Default is False.
+    # lowercase: If set to True, all node names will be lowercased before being indexed. The Twitter-specific functions (get_top_rts, get_top_hashtags and get_top_links) look up lowercased screen names, so indexes passed to them should be built with this set to True. Default is False.
+# Output: An object of the custom class "nodeIndexObject" with the following attributes:
+    # names: A list of all unique node names, in the order in which they first appear in data (for partitions exported by get_top_communities, descending order of prominence). The position of each name is its integer node ID.
+    # node_ids: A dict in which each key is a node name and each value is its integer node ID.
+    # communities: A numpy int32 array containing the position in community_ids of each node's community, or -1 for nodes without one.
+    # community_ids: A list of all unique community IDs, in the order in which they first appear in data.
+    # scores: A list containing each node's prominence value (the third column of data) as it appears in data, or None if data has no third column or from_edges is set to True.
+
+class nodeIndexObject:
+    '''an object class with attributes for a shared mapping between node names, integer IDs and community IDs'''
+    def __init__(self,names,node_ids,communities,community_ids,scores=None):
+        self.names = names
+        self.node_ids = node_ids
+        self.communities = communities
+        self.community_ids = community_ids
+        self.scores = scores
+
+def build_node_index(data,from_edges=False,lowercase=False):
+    if isinstance(data,nodeIndexObject):
+        return data
+    if isinstance(data,louvainObject):
+        data = data.node_list
+    rows = load_data(data)
+    if len(rows) > 0 and rows[0][0] == 'name' and from_edges == False:
+        rows = rows[1:] #remove headers from CSV
+
+    names = []
+    node_ids = {}
+    codes = []
+    cmty_codes = {}
+    scores = []
+    with _phase('build_node_index','index') as ph:
+        for row in rows:
+            for name in (row[:2] if from_edges == True else row[:1]):
+                if lowercase == True:
+                    name = name.lower()
+                if name in node_ids:
+                    continue
+                name = sys.intern(name)
+                node_ids[name] = len(names)
+                names.append(name)
+                if from_edges == False:
+                    codes.append(cmty_codes.setdefault(row[1],len(cmty_codes)))
+                    scores.append(row[2] if len(row) > 2 else None)
+        ph['rows'] = len(rows)
+
+    if from_edges == True:
+        return nodeIndexObject(names,node_ids,np.full(len(names),-1,dtype=np.int32),[])
+    if len(scores) == 0 or scores[0] is None:
+        scores = None
+    return nodeIndexObject(names,node_ids,np.array(codes,dtype=np.int32),list(cmty_codes),scores)
+
+# _community_codes: Look up the community codes of many nodes at once
+# Arguments:
+    # node_index: An object of the custom class "nodeIndexObject".
+    # names: A list of node names.
+# Output: A numpy array containing the position in node_index.community_ids of the community of each name, or -1 for names that are not indexed or have no community.
+
+def _community_codes(node_index,names):
+    ids = np.fromiter((node_index.node_ids.get(i,-1) for i in names),dtype=np.int64,count=len(names))
+    codes = np.full(len(names),-1,dtype=np.int64)
+    codes[ids >= 0] = node_index.communities[ids[ids >= 0]]
+    return codes
+
+# _community_sizes: Count the members of each community in a nodeIndexObject
+# Output: A list of integers in the order of node_index.community_ids.
+
+def _community_sizes(node_index):
+    return np.bincount(node_index.communities[node_index.communities >= 0],minlength=len(node_index.community_ids)).tolist()
+
+# _node_community: Look up the community ID of a single node
+# Output: The community ID of name, or None if it is not indexed or has no community.
+
+def _node_community(node_index,name):
+    if name not in node_index.node_ids:
+        return None
+    code = node_index.communities[node_index.node_ids[name]]
+    if code < 0:
+        return None
+    return node_index.community_ids[code]
 
 # calc_ei: Calculate EI index for top k communities
 # Description: This function calculates Krackhardt & Stern's EI index for each community represented in a file or variable output by get_top_communities. The EI index ranges between 1 and -1, with 1 indicating that all the community's ties are with outsiders, -1 indicating they are all with members, and 0 indicating equal numbers of ties with members and outsiders. See Krackhardt, D., & Stern, R. N. (1988). Informal networks and organizational crises: An experimental simulation. Social psychology quarterly, 123-140.
 # Arguments:
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists) or a path to a CSV file.
-    # edges_data: An edgelist of the type exported by t2e. Can be a variable (a list of lists) or a path to a CSV file.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists), a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index.
+    # edges_data: An edgelist of the type exported by t2e. Can be a variable (a list of lists), a path to a CSV file, or an edge store (see save_edge_store).
     # all_output: If set to True, the function _get_shared_ties will execute after calc_ei has finished. If set to False, _get_shared_ties will not execute. Default is True.
     # pause: If set to True, the function will pause and wait for a key strike before displaying the results of _get_shared_ties. If set to False, it will not pause. Default is True.
-    # weight_edges: If set to True, the function will include duplicate edges in the EI calculations. If set to False, the edgelist will be unweighted--in other words all duplicate edges will be removed. For example, if the userA->userB edge has a weight of 5 (meaning A linked to B five distinct times), the function will count that as a single unweighted tie. Default is True.
+    # weight_edges: If set to True, the function will include duplicate edges in the EI calculations. If set to False, the edgelist will be unweighted--in other words all duplicate edges will be removed. For example, if the userA->userB edge has a weight of 5 (meaning A linked to B five distinct times), the function will count that as a single unweighted tie. Weighted edgelists (see t2e) are handled the same way: each edge counts as its weight if this is set to True and as 1 otherwise. Default is True.
     # verbose: If set to True, calc_ei will print some of its output to the shell prompt. If set to False, this output will be suppressed. Default is False.
     # save_prefix: Add a string here to save your file to CSV. Your saved file will be named as follows: 'string'_communities.csv
 # Output: An object of the custom class "eiObject" containing the following attributes:
@@ -314,53 +1537,49 @@ class eiObject:
 
 def calc_ei(nodes_data,edges_data,all_output=True,pause=False,weight_edges=True,verbose=False,save_prefix=''):
     if weight_edges == False:
-        print("Calculating EI indices using *UNweighted* edges.\n")
+        logger.info("Calculating EI indices using *UNweighted* edges.")
     else:
-        print("Calculating EI indices using *weighted* edges.\n")
-
-    nodes = load_data(nodes_data)
-    if nodes[0][0] == 'name':
-        del nodes[0] #remove headers from CSV
-
-    edges = load_data(edges_data)
-    modclass = [i[1] for i in nodes]
-    moduniq = {}
-
-    for i in modclass: #get and count unique community IDs
-        if i in moduniq:
-            moduniq[i] += 1
-        else:
-            moduniq[i] = 1
+        logger.info("Calculating EI indices using *weighted* edges.")
 
+    node_index = build_node_index(nodes_data)
+    moduniq = dict(zip(node_index.community_ids,_community_sizes(node_index))) #get and count unique community IDs
     mu_top = sorted(moduniq,key=moduniq.get,reverse=True) #get all communities from node file
-    top_nodes_list = [i for i in nodes if i[1] in mu_top]
-    top_nodes = {node[0]:node[1] for node in top_nodes_list} #create dict of screen names and community IDs
 
-    if weight_edges == False:
-        edges = list(set([i[0] + "," + i[1] for i in edges])) #unweight the edgelist--multiple links to B from A count as one edge
-        edges = [i.split(",") for i in edges]
+    with _phase('calc_ei','count') as ph:
+        src,tgt,weights = _coded_edges(node_index,edges_data,unique=weight_edges == False) #if unweighted, multiple links to B from A count as one edge
+        tie_matrix = _community_tie_matrix(src,tgt,len(node_index.community_ids),weights)
+        ph['rows'] = len(src)
+    top_order = [node_index.community_ids.index(i) for i in mu_top]
+    tie_matrix = tie_matrix[np.ix_(top_order,top_order)] #put the rows and columns in the order of mu_top
+    with _phase('calc_ei','summarize') as ph:
+        ei_out = _ei_from_matrix(mu_top,tie_matrix,moduniq,all_output,pause,verbose)
+        ph['rows'] = len(mu_top)
 
-    for edge in edges:
-        if edge[0] in top_nodes:
-            edge.append(top_nodes[edge[0]])
+    if len(save_prefix) > 0:
+        ei_list = []
+        for i in ei_out.ei_indices:
+            ei_list.append([str(i),str(ei_out.ei_indices[i])])
+        ei_list.insert(0,['Community IDs','EI indices'])
+        save_csv(save_prefix + '_ei_indices.csv',ei_list)
 
-    for edge in edges:
-        if edge[1] in top_nodes:
-            edge.append(top_nodes[edge[1]])
+    return ei_out
 
-    top_edges = [i for i in edges if len(i) == 4]
+# _ei_from_matrix: Build an eiObject from a community tie matrix
+# Description: This is a helper function for calc_ei and eiAccumulator. It derives each community's internal and external tie counts and EI index from a tie matrix and, if all_output is set to True, runs _get_shared_ties on the same matrix.
+# Arguments:
+    # top_community_ids: A list of community IDs in descending order of size.
+    # tie_matrix: A k x k numpy array of the type returned by _community_tie_matrix, whose rows and columns follow the order of top_community_ids.
+    # n_nodes: A dict in which each key is a community ID and each value is the number of nodes in that community.
+    # all_output, pause, verbose: See calc_ei.
+# Output: An object of the custom class "eiObject" (see calc_ei).
 
-    ei_int = {}
-    ei_ext = {}
+def _ei_from_matrix(top_community_ids,tie_matrix,n_nodes,all_output=True,pause=False,verbose=False):
+    mu_top = top_community_ids
+    diag = tie_matrix.diagonal()
+    ext_counts = tie_matrix.sum(axis=1) + tie_matrix.sum(axis=0) - 2*diag #ties sent to plus ties received from other communities
 
-    for i in mu_top:
-        ei_int[i] = 0
-        ei_ext[i] = 0
-        for j in top_edges:
-            if j[2] == i and j[3] == i:
-                ei_int[i] += 1
-            elif j[2] == i or j[3] == i:
-                ei_ext[i] += 1
+    ei_int = dict(zip(mu_top,diag.tolist()))
+    ei_ext = dict(zip(mu_top,ext_counts.tolist()))
 
     ei_indices = {}
 
@@ -380,29 +1599,14 @@ def calc_ei(nodes_data,edges_data,all_output=True,pause=False,weight_edges=True,
 
         print("Mean EI:\t",mean_ei)
 
-    n_nodes = {}
-    for i in nodes:
-        if i[1] in n_nodes:
-            n_nodes[i[1]] += 1
-        else:
-            n_nodes[i[1]] = 1
-
     if pause == True:
         input('Press any key to continue...')
 
     if all_output == True:
-        ei_out = _get_shared_ties(mu_top,top_edges,ei_int,ei_ext,n_nodes,verbose)
+        ei_out = _get_shared_ties(mu_top,tie_matrix,ei_int,ei_ext,n_nodes,verbose)
     else:
         ei_out = eiObject()
 
-    if len(save_prefix) > 0:
-        ei_list = []
-        for i in ei_ord:
-            ei_list.append([str(i),str(ei_ord[i])])
-        ei_list.insert(0,['Community IDs','EI indices'])
-        save_csv(save_prefix + '_ei_indices.csv',ei_list)
-    print("\n")
-
     ei_out.n_nodes = collections.OrderedDict(sorted(n_nodes.items()))
     ei_out.ei_indices = ei_ord
     ei_out.internal_ties = ei_int
@@ -410,35 +1614,40 @@ def calc_ei(nodes_data,edges_data,all_output=True,pause=False,weight_edges=True,
     ei_out.mean_ei = mean_ei
     return ei_out
 
+# _community_tie_matrix: Counts the ties within and between communities in a single pass
+# Description: This is a helper function for calc_ei and _get_shared_ties. It tallies all edges both of whose nodes belong to a community into a k x k matrix using numpy.bincount. This replaces rescanning the whole edgelist once per community.
+# Arguments:
+    # src: A numpy array of the community codes of each edge's sender, of the type returned by _coded_edges.
+    # tgt: A numpy array of the community codes of each edge's recipient, of the type returned by _coded_edges.
+    # k: The number of communities.
+    # weights: A numpy array containing the weight of each edge, or None to count each edge once.
+# Output: A k x k numpy array in which cell [a,b] is the number (or total weight) of edges sent from a member of community a to a member of community b. Diagonal cells therefore hold internal ties.
+
+def _community_tie_matrix(src,tgt,k,weights=None):
+    in_top = (src >= 0) & (tgt >= 0) #keep only edges both of whose nodes belong to the listed communities
+    if weights is None:
+        return np.bincount(src[in_top]*k + tgt[in_top],minlength=k*k).reshape(k,k)
+    return np.bincount(src[in_top]*k + tgt[in_top],weights=weights[in_top],minlength=k*k).astype(np.int64).reshape(k,k)
+
 # _get_shared_ties: Obtains numbers of shared ties between each community and all others
 # Description: This function reveals how a given community's "external" edges are distributed among the other communities. It is not a standalone function: it can only be run by using the "PROX" or "PROX_PAUSE" option from calc_ei. So don't try to enter the following arguments into the function yourself unless you know what you're doing.
 # Arguments:
     # top_community_ids: A list of the top k communities by membership.
-    # top_edges: A list of all edges both of whose nodes belong to one of the top k communities.
+    # tie_matrix: A k x k numpy array of the type returned by _community_tie_matrix, whose rows and columns follow the order of top_community_ids.
     # ei_int: A dict in which each key is one of the top k community IDs and each value is the number of edges in which both nodes are members of that community.
     # ei_ext: A dict in which each key is one of the top k community IDs and each value is the number of edges in which one node is a member of that community and the other is a member of any other community.
     # n_nodes: A dict in which each key is one of the top k community IDs and each value is the total number of nodes in that community.
     # verbose: If set to True, _get_shared_ties will print some of its output to the shell prompt. If set to False, this output will be suppressed. The value of this variable is inherited from calc_ei, where its default value is False.
 # Output: The optional output attributes for the "eiObject" class (see above).
 
-def _get_shared_ties(top_community_ids,top_edges,ei_int,ei_ext,n_nodes,verbose):
+def _get_shared_ties(top_community_ids,tie_matrix,ei_int,ei_ext,n_nodes,verbose):
     adj_out = {} #sent ties point away from the focal community
     adj_in = {} #received ties point toward the focal community
+    counts = tie_matrix.tolist()
 
-    for i in top_community_ids:
-        adj_out[i] = {}
-        adj_in[i] = {}
-        for j in top_edges:
-            if j[2] == i and j[3] != i:
-                if j[3] in adj_out[i]:
-                    adj_out[i][j[3]] += 1
-                else:
-                    adj_out[i][j[3]] = 1
-            if j[2] != i and j[3] == i:
-                if j[2] in adj_in[i]:
-                    adj_in[i][j[2]] += 1
-                else:
-                    adj_in[i][j[2]] = 1
+    for a,i in enumerate(top_community_ids):
+        adj_out[i] = {j:counts[a][b] for b,j in enumerate(top_community_ids) if a != b and counts[a][b] > 0}
+        adj_in[i] = {j:counts[b][a] for b,j in enumerate(top_community_ids) if a != b and counts[b][a] > 0}
 
     total_dict = {}
     received_dict = {}
@@ -475,49 +1684,403 @@ def _get_shared_ties(top_community_ids,top_edges,ei_int,ei_ext,n_nodes,verbose):
 
     return prox_out
 
+# eiAccumulator: Keep EI-index tie counts up to date as edges arrive
+# Description: Recalculating EI indices with calc_ei means rescanning the full edgelist. An eiAccumulator instead holds the tie counts between the communities of a fixed partition and updates them as batches of edges are added or removed, in time proportional to the size of each batch. A snapshot of the current counts in the same form as the output of calc_ei can be taken at any time.
+# Arguments:
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists), a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index.
+    # weight_edges: See calc_ei. If set to False, each distinct edge counts once for as long as at least one copy of it has been added and not removed. Default is True.
+# Methods:
+    # add_edges(edges_data): Counts a batch of new edges. edges_data can be anything calc_ei accepts, or a generator of edges such as the output of t2e_iter.
+    # remove_edges(edges_data): Uncounts a batch of edges that were added earlier (e.g. edges that have aged out of a time window).
+    # snapshot(all_output=True,verbose=False): Returns an object of the custom class "eiObject" for the current counts, identical to the output of calc_ei for the same nodes and all edges added but not removed. See calc_ei for all_output and verbose.
+# Attributes:
+    # node_index: The nodeIndexObject of the partition.
+    # tie_matrix: A k x k numpy array in which cell [a,b] is the current number (or total weight) of edges sent from a member of community a to a member of community b, in the order of node_index.community_ids.
+    # n_edges: The number of edges added minus the number removed, including edges that involve nodes outside the partition.
+
+class eiAccumulator:
+    '''an object class with running EI-index tie counts for a fixed community partition'''
+    def __init__(self,nodes_data,weight_edges=True):
+        self.node_index = build_node_index(nodes_data)
+        self.weight_edges = weight_edges
+        k = len(self.node_index.community_ids)
+        self.tie_matrix = np.zeros((k,k),dtype=np.int64)
+        self.n_edges = 0
+        self._edge_copies = collections.Counter() #copies of each edge currently counted, for unweighted counts
+
+    def add_edges(self,edges_data):
+        self._update(edges_data,1)
+
+    def remove_edges(self,edges_data):
+        self._update(edges_data,-1)
+
+    def snapshot(self,all_output=True,verbose=False):
+        moduniq = dict(zip(self.node_index.community_ids,_community_sizes(self.node_index)))
+        mu_top = sorted(moduniq,key=moduniq.get,reverse=True)
+        top_order = [self.node_index.community_ids.index(i) for i in mu_top]
+        return _ei_from_matrix(mu_top,self.tie_matrix[np.ix_(top_order,top_order)],moduniq,all_output,False,verbose)
+
+    def _update(self,edges_data,sign):
+        edges = _load_edges(edges_data)
+        if type(edges) is not list:
+            edges = list(edges)
+        self.n_edges += sign*len(edges)
+        src = _community_codes(self.node_index,[i[0] for i in edges])
+        tgt = _community_codes(self.node_index,[i[1] for i in edges])
+        in_top = (src >= 0) & (tgt >= 0)
+        weights = _edge_weights(edges)
+        if self.weight_edges == False: #only the first copy of an edge to be added and the last to be removed change the counts
+            weights = np.zeros(len(edges),dtype=np.int64)
+            for n in np.flatnonzero(in_top).tolist():
+                edge = (edges[n][0],edges[n][1])
+                self._edge_copies[edge] += sign
+                if self._edge_copies[edge] == (1 if sign > 0 else 0):
+                    weights[n] = 1
+                if self._edge_copies[edge] <= 0:
+                    del self._edge_copies[edge]
+        elif weights is None:
+            weights = np.ones(len(edges),dtype=np.int64)
+        np.add.at(self.tie_matrix,(src[in_top],tgt[in_top]),sign*weights[in_top])
+
+# spaceSaving: Count the most frequent items in a stream in a fixed amount of memory
+# Description: Counting every distinct item in a very large stream, such as the full text of every retweet in a billion-tweet archive, can take more memory than is available. A spaceSaving summary instead keeps at most capacity counters, using the Space-Saving algorithm (Metwally, A., Agrawal, D., & El Abbadi, A. (2005). Efficient computation of frequent and top-k elements in data streams. In International Conference on Database Theory (pp. 398-412)). When a new item arrives and every counter is taken, the item with the lowest count is evicted and the new item inherits its count, which is recorded as the new item's error. Each count is therefore an overestimate of the item's true count by at most its error (and never by more than n/capacity), and every item occurring more than n/capacity times is guaranteed to be counted. Summaries of separate streams (such as shards of a dataset) can be merged into a summary of the combined stream with the same guarantees (Agarwal, P. K., Cormode, G., Huang, Z., Phillips, J. M., Wei, Z., & Yi, K. (2013). Mergeable summaries. ACM Transactions on Database Systems, 38(4), 26).
+# Arguments:
+    # capacity: The maximum number of items to count. Larger capacities use more memory but give smaller errors. Default is 10000.
+# Methods:
+    # add(item,count=1,error=0): Counts count occurrences of item.
+    # update(items): Counts one occurrence of each item in an iterable, like Counter.update.
+    # merge(other): Adds the counts of another spaceSaving summary to this one.
+    # items() and most_common(): Return the counted items and their counts, like the Counter methods of the same names.
+# Attributes:
+    # counts: A dict in which the keys are the counted items and the values are their (over)estimated counts.
+    # errors: A dict in which the keys are the counted items and the values are the maximum amounts by which their counts may exceed their true counts.
+    # n: The total number of occurrences counted.
+
+class spaceSaving:
+    '''an object class for a bounded-memory summary of the most frequent items in a stream'''
+    def __init__(self,capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.n = 0
+        self._heap = [] #a [count,item] entry for each item, in which count may lag behind the item's current count
+
+    def add(self,item,count=1,error=0):
+        self.n += count
+        if item in self.counts:
+            self.counts[item] += count
+            self.errors[item] += error
+            return
+        if len(self.counts) < self.capacity:
+            floor = 0
+        else:
+            floor = self._floor()
+            evicted = heapq.heappop(self._heap)[1]
+            del self.counts[evicted]
+            del self.errors[evicted]
+        self.counts[item] = floor + count
+        self.errors[item] = floor + error
+        heapq.heappush(self._heap,(floor + count,item))
+
+    def update(self,items):
+        for item in items:
+            self.add(item)
+
+    def merge(self,other):
+        floor,other_floor = self._floor(),other._floor() #the most an item missing from a full summary can have occurred
+        counts = {}
+        errors = {}
+        for item in self.counts:
+            counts[item] = self.counts[item] + other.counts.get(item,other_floor)
+            errors[item] = self.errors[item] + other.errors.get(item,other_floor)
+        for item in other.counts:
+            if item not in self.counts:
+                counts[item] = other.counts[item] + floor
+                errors[item] = other.errors[item] + floor
+        if len(counts) > self.capacity:
+            kept = set(sorted(counts,key=counts.get,reverse=True)[:self.capacity])
+            counts = {i:counts[i] for i in counts if i in kept}
+        self.counts = counts
+        self.errors = {i:errors[i] for i in self.counts}
+        self._heap = [(c,i) for i,c in self.counts.items()]
+        heapq.heapify(self._heap)
+        self.n += other.n
+        return self
+
+    def items(self):
+        return self.counts.items()
+
+    def most_common(self):
+        return sorted(self.counts.items(),key=operator.itemgetter(1),reverse=True)
+
+    def _floor(self):
+        if len(self.counts) < self.capacity:
+            return 0
+        while self._heap[0][0] != self.counts[self._heap[0][1]]: #brings stale entries up to date until the smallest is current
+            item = self._heap[0][1]
+            heapq.heapreplace(self._heap,(self.counts[item],item))
+        return self._heap[0][0]
+
+# tweetCorpus: Index the hashtags, links and retweets in a set of tweets in a single pass
+# Description: get_top_hashtags, get_top_links and get_top_rts all need to read every tweet in a dataset and look up its author's community. A tweetCorpus does this once: it reads the tweets a row at a time without holding them in memory, tags each with its author's community, and counts the hashtags, links, link domains and retweets it contains in per-community Counters. Each of the three functions then becomes a quick query on the index, and all three accept a tweetCorpus in place of their tweet data, so a dataset can be indexed once and queried repeatedly with different settings. As in get_top_hashtags and get_top_links, each distinct hashtag or link is counted at most once per tweet. Hashtags and links are only counted for tweets by authors with a community in nodes_data (if it is set); retweets are counted for all tweets and assigned to the community of the retweeted user, as in get_top_rts.
+# Arguments:
+    # tweets_data: A path to a CSV file or a list of lists of the type accepted by get_top_hashtags, get_top_links and get_top_rts, with tweet authors in col 1 and tweet text in the column given by tweet_index. Rows with only one column are treated as tweet text without an author. A list of strings, each a tweet's text, is also accepted if nodes_data is blank.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities, a louvainObject, or a nodeIndexObject created by build_node_index with lowercase=True. Can be left blank, in which case all tweets are treated as belonging to a single community.
+    # tweet_index: The index of the column containing tweet text. Default is 1.
+    # enc: the character encoding of the file you're trying to open. See https://docs.python.org/3.4/library/codecs.html#standard-encodings
+    # analyses: A list of the analyses to index the tweets for: 'hashtags' (for get_top_hashtags), 'links' (for get_top_links), 'domains' (for get_top_links with domains_only=True) and/or 'rts' (for get_top_rts). Leaving out analyses you don't need speeds indexing. Default is all four.
+    # capacity: If set to an integer, each community's hashtags, links and domains, and all retweets, will be counted approximately in a spaceSaving summary that holds at most capacity items, rather than exactly in a Counter that holds every distinct item. This bounds memory use on very large datasets. Default is None, which counts exactly.
+    # workers: The number of processes to index the tweets with. If greater than 1, a CSV file is split into byte ranges on row boundaries (as in t2e_parallel), or a list into slices, and each process indexes one shard; the partial indexes are then merged in shard order, so exact counts are identical to those of serial indexing. (Approximate counts from merged spaceSaving summaries may differ slightly from serial ones, within the same error bounds.) Set it to None to use one process per CPU core. Default is 1, which indexes the tweets in the current process.
+# Methods:
+    # top_hashtags(min_ct=10), top_links(min_ct=10,domains_only=False,remove_3ld=False,remove_trailing_chars=['#','?'],exclude_domains=[]) and top_rts(min_rts=5,lc=False): Return the same output as get_top_hashtags, get_top_links and get_top_rts (see below) with the same arguments. Each raises a ValueError if the corpus was built without the analysis it needs.
+    # merge(other): Adds the counts of another tweetCorpus, such as one built from another shard of the same dataset, to this one. Both must have been built with the same nodes_data, analyses and capacity. Merging exact corpora in the order of their shards gives exactly the same results as indexing the whole dataset at once.
+# Output: An object of the custom class "tweetCorpus" with the following attributes:
+    # node_index: The nodeIndexObject for nodes_data, or None if nodes_data is blank.
+    # hashtags: A dict in which the keys are community IDs (or '1' if nodes_data is blank) and the values are Counters (or spaceSaving summaries, if capacity is set) of the lowercased hashtags used in each community.
+    # links: A dict of Counters of the links used in each community, in the same format as hashtags. Links are counted as written, except that 'https' is replaced with 'http'.
+    # domains: A dict of Counters of the link domains used in each community, in the same format as hashtags.
+    # rts: A Counter (or spaceSaving summary) of the full texts of all retweets.
+    # n_tweets: The number of tweets read, not counting empty rows.
+
+_HASHTAG_PATTERN = re.compile(r'#\w+')
+_LINK_PATTERN = re.compile(r'(?:http)(?:s?)(?:://)(.+?)(?:\s|$)')
+_DOMAIN_PATTERN = re.compile(r'(?:http)(?:s?)(?:://)(.+?)(?:/|\s|$)')
+
+class tweetCorpus:
+    '''an object class for a single-pass index of the hashtags, links and retweets in a set of tweets'''
+    def __init__(self,tweets_data,nodes_data='',tweet_index=1,enc='utf-8',analyses=['hashtags','links','domains','rts'],capacity=None,workers=1):
+        self.analyses = [i.lower() for i in analyses]
+        self.capacity = capacity
+        self.node_index = None if nodes_data == '' else build_node_index(nodes_data,lowercase=True)
+        self.hashtags = {}
+        self.links = {}
+        self.domains = {}
+        self.rts = self._counter()
+        self.n_tweets = 0
+        with _phase('tweetCorpus','index') as ph:
+            if workers != 1 and type(tweets_data) in (str,list):
+                self._index_parallel(tweets_data,tweet_index,enc,workers)
+            else:
+                self._index(_progress(self._rows(tweets_data,enc),'tweetCorpus','index'),tweet_index)
+            ph['rows'] = self.n_tweets
+        logger.info('Tweet corpus indexed.')
+
+    def _rows(self,tweets_data,enc):
+        if type(tweets_data) is not str:
+            yield from tweets_data
+            return
+        with open(tweets_data,'r',encoding=enc,errors='replace') as f:
+            yield from _corpus_rows(f)
+
+    def _index_parallel(self,tweets_data,tweet_index,enc,workers):
+        if workers is None:
+            workers = os.cpu_count()
+        if type(tweets_data) is str:
+            offsets = _csv_shard_offsets(tweets_data,workers)
+            shards = [(tweets_data,offsets[n],offsets[n+1]) for n in range(len(offsets)-1)]
+        else:
+            size = max(-(-len(tweets_data)//workers),1)
+            shards = [tweets_data[n:n+size] for n in range(0,len(tweets_data),size)]
+        settings = (self.node_index,tweet_index,enc,self.analyses,self.capacity)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,initializer=_corpus_init,initargs=settings) as pool:
+            for part in pool.map(_corpus_shard,shards): #merging in shard order keeps exact counts identical to serial indexing
+                self.merge(part)
+
+    def _index(self,rows,tweet_index):
+        index_rts = 'rts' in self.analyses
+        index_hashtags = 'hashtags' in self.analyses
+        index_links = 'links' in self.analyses
+        index_domains = 'domains' in self.analyses
+        node_index = self.node_index
+        if node_index is not None: #plain lists are much faster to index one item at a time than numpy arrays
+            node_ids = node_index.node_ids
+            codes = node_index.communities.tolist()
+            community_ids = node_index.community_ids
+        for row in rows:
+            if len(row) == 0: #empty rows are skipped, as they are when reading a file
+                continue
+            self.n_tweets += 1
+            if type(row) is str:
+                author,text = None,row
+            elif len(row) > tweet_index:
+                author,text = row[0],row[tweet_index]
+            else:
+                author,text = None,row[0]
+
+            if index_rts and text.startswith('RT @') and text.find(':')>-1:
+                self.rts.update((text,))
+            if not index_hashtags and not index_links and not index_domains:
+                continue
+
+            if node_index is None:
+                if author is not None and author.strip() == '':
+                    continue
+                cid = '1'
+            else:
+                if author is None or author.strip() == '':
+                    continue
+                n = node_ids.get(author.lower())
+                if n is None or codes[n] < 0:
+                    continue
+                cid = community_ids[codes[n]]
+
+            if index_hashtags and '#' in text:
+                if cid not in self.hashtags:
+                    self.hashtags[cid] = self._counter()
+                self.hashtags[cid].update(dict.fromkeys(_HASHTAG_PATTERN.findall(text.lower().replace(u'\u200F',''))).keys())
+
+            if (index_links or index_domains) and 'http' in text:
+                text = text.replace('https','http')
+                if 'http://' in text and (node_index is not None or '.' in text):
+                    text = text.replace(u'\u200F','')
+                    if index_links:
+                        if cid not in self.links:
+                            self.links[cid] = self._counter()
+                        self.links[cid].update(dict.fromkeys(_LINK_PATTERN.findall(text)).keys())
+                    if index_domains:
+                        if cid not in self.domains:
+                            self.domains[cid] = self._counter()
+                        self.domains[cid].update(dict.fromkeys(_DOMAIN_PATTERN.findall(text)).keys())
+
+    def _counter(self):
+        if self.capacity is None:
+            return collections.Counter()
+        return spaceSaving(self.capacity)
+
+    def merge(self,other):
+        for counts,other_counts in [[self.hashtags,other.hashtags],[self.links,other.links],[self.domains,other.domains],[{'':self.rts},{'':other.rts}]]:
+            for cid in other_counts:
+                if cid not in counts:
+                    counts[cid] = self._counter()
+                if self.capacity is None:
+                    counts[cid].update(other_counts[cid])
+                else:
+                    counts[cid].merge(other_counts[cid])
+        self.n_tweets += other.n_tweets
+        return self
+
+    def _regroup(self,counts,key): #merges the counts (and errors) of items that key maps to the same value, and drops items it maps to None
+        if self.capacity is None:
+            grouped = collections.Counter()
+            for item,ct in counts.items():
+                k = key(item)
+                if k is not None:
+                    grouped[k] += ct
+        else:
+            grouped = spaceSaving(max(len(counts.counts),1))
+            for item,ct in counts.items():
+                k = key(item)
+                if k is not None:
+                    grouped.add(k,ct,counts.errors[item])
+        return grouped
+
+    def _communities(self):
+        if self.node_index is None:
+            return ['1']
+        return self.node_index.community_ids
+
+    def _top(self,counts,min_ct):
+        out = []
+        for i in counts.most_common():
+            if i[1] < min_ct:
+                break
+            if self.capacity is None:
+                out.append(i)
+            else:
+                out.append((i[0],i[1],counts.errors[i[0]]))
+        return tuple(out)
+
+    def _output(self,top):
+        if self.node_index is None:
+            return list(top['1'])
+        return {i:top[i] for i in top if len(top[i]) > 0}
+
+    def _check(self,analysis):
+        if analysis not in self.analyses:
+            raise ValueError('This tweetCorpus was built without ' + repr(analysis) + ' in its analyses.')
+
+    def top_hashtags(self,min_ct=10):
+        self._check('hashtags')
+        return self._output({cid:self._top(self.hashtags.get(cid,self._counter()),min_ct) for cid in self._communities()})
+
+    def top_links(self,min_ct=10,domains_only=False,remove_3ld=False,remove_trailing_chars=['#','?'],exclude_domains=[]):
+        if domains_only == True:
+            self._check('domains')
+            source = self.domains
+        else:
+            self._check('links')
+            source = self.links
+        def clean(hl): #cleaning is applied to distinct links, and their counts merged
+            if len(exclude_domains) > 0 and any(d in hl for d in exclude_domains):
+                return None
+            if len(remove_trailing_chars) > 0 and any(t in hl for t in remove_trailing_chars):
+                hl = hl[:min([hl.find(c) for c in remove_trailing_chars if c in hl])]
+            if remove_3ld == True and hl.count('.') >= 2:
+                hl = hl[hl.find('.')+1:]
+            return hl
+        return self._output({cid:self._top(self._regroup(source.get(cid,self._counter()),clean),min_ct) for cid in self._communities()})
+
+    def top_rts(self,min_rts=5,lc=False):
+        self._check('rts')
+        counts = self.rts
+        if lc == True:
+            counts = self._regroup(self.rts,str.lower)
+        rts_ct_out = []
+        for i in self._top(counts,min_rts):
+            rted = i[0][i[0].find('@')+1:i[0].find(':')].lower()
+            if self.node_index is None:
+                rts_ct_out.append([rted,i[0],''] + list(i[1:]))
+            elif rted in self.node_index.node_ids:
+                rts_ct_out.append([rted,i[0],_node_community(self.node_index,rted)] + list(i[1:]))
+        return rts_ct_out
+
+# _corpus_rows: Read the rows of a tweet file, removing NULL bytes and skipping empty rows as load_data does
+
+def _corpus_rows(f):
+    for row in csv.reader((line.replace('\0','') for line in f)): #remove NULL bytes
+        if row != []:
+            yield row
+
+# _corpus_init and _corpus_shard: The worker functions for tweetCorpus's workers mode. _corpus_init stores the node index and settings in each worker when it starts; _corpus_shard indexes one shard (a byte range of a file or a slice of a list) and returns it without its node index, which the parent already has.
+
+_corpus_settings = None
+
+def _corpus_init(node_index,tweet_index,enc,analyses,capacity):
+    global _corpus_settings
+    _corpus_settings = (node_index,tweet_index,enc,analyses,capacity)
+
+def _corpus_shard(shard):
+    node_index,tweet_index,enc,analyses,capacity = _corpus_settings
+    if type(shard) is tuple:
+        shard = _corpus_rows(_shard_text(shard[0],shard[1],shard[2],enc))
+    part = tweetCorpus(shard,'' if node_index is None else node_index,tweet_index,enc,analyses,capacity)
+    part.node_index = None
+    return part
+
 # get_top_rts: Gets the most-retweeted tweets in a Twitter dataset with community IDs
 # Description: This function returns a list of the most-retweeted tweets along with the community IDs of the tweet authors and retweet counts. This allows researchers to easily view the most-retweeted tweets within each community.
 # Arguments:
-    # tweets_file: A CSV file containing tweets formatted for t2e as specified above.
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists) or a path to a CSV file.
+    # tweets_file: A CSV file containing tweets formatted for t2e as specified above, or an equivalent list of lists. Can also be a tweetCorpus, in which case nodes_data, tweet_index and enc are ignored in favor of those the corpus was built with.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists), a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index with lowercase=True.
     # min_rts: An integer indicating the minimum number of retweets to be included in the output. Default is 5. Increasing this number will reduce your filesize and processing time; decreasing it will do the opposite.
     # lc: A boolean value determining whether the retweets will be converted to lowercase before counting duplicates. Lowercasing retweets may increase retweet counts but it will break case-sensitive hyperlinks such as those generated by Twitter. Default is False.
     # enc: the character encoding of the file you're trying to open and/or save. See https://docs.python.org/3.4/library/codecs.html#standard-encodings
     # save_prefix: Add a string here to save your file to CSV. Your saved file will be named as follows: 'string'_top_RTs.csv
-# Output: A list of lists, each of which contains the name of the retweeted user, the full text of the retweet, the user's community ID, and the number of times the tweet was retweeted. This list is ranked in descending order of retweet count.
+    # capacity: If set to an integer, retweets will be counted approximately in a fixed amount of memory by a spaceSaving summary that tracks at most capacity distinct retweets (see spaceSaving). Use this for datasets with too many distinct retweets to count exactly. Retweet counts may then be overestimated, by at most the error reported alongside each; since min_rts is applied to the estimated counts, no retweet that truly meets it is left out as long as it occurs more than (total retweets / capacity) times. Ignored if tweets_file is a tweetCorpus, whose own capacity is used. Default is None, which counts exactly.
+    # workers: The number of processes to count retweets with. Each process reads one shard of the tweets, and the partial counts are merged in order, so the output is identical to that of a single process. Set it to None to use one process per CPU core. Ignored if tweets_file is a tweetCorpus. Default is 1.
+# Output: A list of lists, each of which contains the name of the retweeted user, the full text of the retweet, the user's community ID, and the number of times the tweet was retweeted. This list is ranked in descending order of retweet count. If retweets were counted approximately, each list also contains the count's maximum error.
 
-def get_top_rts(tweets_file,nodes_data='',tweet_index=1,min_rts=5,lc=False,enc='utf-8',save_prefix=''):
-    rts = []
-    if nodes_data != '':
-        node_dict = {i[0]:i[1] for i in load_data(nodes_data)}
+def get_top_rts(tweets_file,nodes_data='',tweet_index=1,min_rts=5,lc=False,enc='utf-8',save_prefix='',capacity=None,workers=1):
+    if isinstance(tweets_file,tweetCorpus):
+        corpus = tweets_file
     else:
-        node_dict = {i[0].lower():'' for i in load_data(tweets_file)}
-
-    with open(tweets_file,'r',encoding=enc,errors='replace') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if row[tweet_index].startswith('RT @') and row[tweet_index].find(':')>-1:
-                if lc == False:
-                    rts.append(row[tweet_index])
-                else:
-                    rts.append(row[tweet_index].lower())
-
-    rts_ct = collections.Counter(rts).most_common()
-    rts_ct_out = []
-
-    for n,i in enumerate(rts_ct):
-        rted = i[0][i[0].find('@')+1:i[0].find(':')].lower()
-        if nodes_data == '' and rted not in node_dict:
-            node_dict[rted] = ''
-        try:
-            rts_ct_out.append([rted,rts_ct[n][0],node_dict[rted],rts_ct[n][1]])
-        except KeyError:
-            pass
-
-    rts_ct_out = [i for i in rts_ct_out if i[3] >= min_rts]
+        corpus = tweetCorpus(tweets_file,nodes_data,tweet_index,enc,['rts'],capacity,workers)
+    with _phase('get_top_rts','count') as ph:
+        rts_ct_out = corpus.top_rts(min_rts,lc)
+        ph['rows'] = corpus.n_tweets
 
     if len(save_prefix) > 0:
-        rts_ct_out.insert(0,['rted_user','rt_text','community','n_rts'])
+        rts_ct_out.insert(0,['rted_user','rt_text','community','n_rts'] + (['error'] if corpus.capacity is not None else []))
         out_fn = save_prefix + '_top_RTs.csv'
         save_csv(out_fn,rts_ct_out,True)
         return rts_ct_out[1:]
@@ -528,8 +2091,8 @@ def get_top_rts(tweets_file,nodes_data='',tweet_index=1,min_rts=5,lc=False,enc='
 # match_communities: Find the best community matches between two networks using the weighted Jaccard coefficient
 # Description: This function takes two partitioned networks, A and B, and finds the best match for each community in A among the communities in B. Matches are determined by measuring membership overlap with either the weighted or the unweighted Jaccard coefficient, depending on how the weight_nodes parameter is set. To reduce processing time, only the top (propor * 100)% of nodes by in-degree in each community are compared. The weighted Jaccard comparisons are weighted by in-degree, meaning that higher in-degree nodes count more toward community similarity. This is based on the assumption that nodes of higher in-degree play a proportionately larger role in terms of maintaining community coherence.
 # Arguments:
-    # nodes_data_A: A community-partition dataset of the type exported by get_top_communities (network A). Can be a variable or a path to a CSV file.
-    # nodes_data_B: A community-partition dataset of the type exported by get_top_communities (network B). Can be a variable or a path to a CSV file.
+    # nodes_data_A: A community-partition dataset of the type exported by get_top_communities (network A). Can be a variable, a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index.
+    # nodes_data_B: A community-partition dataset of the type exported by get_top_communities (network B). Can be a variable, a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index.
     # nodes_propor: A float variable greater than 0 and less than 1 representing the per-community proportion of top in-degree nodes to compare between A and B. Default is 0.01 (1%). Increasing this number will increase processing time.
     # jacc_threshold: A float variable greater than 0 and less than 1 representing the Jaccard value above which community pairs will be considered valid matches. Default is 0.3. I would caution against using this blindly--try a few different values and see what seems to make sense for your data.
     # dc_threshold: A float variable representing the Jaccard value above which convergences and divergences (as defined below) will be considered valid. I suggest setting this somewhat lower than jacc_threshold.
@@ -552,24 +2115,22 @@ class cMatchObject:
         self.convergences = convergences
 
 def match_communities(nodes_data_A,nodes_data_B,nodes_filter=0.01,jacc_threshold=0.3,dc_threshold=0.2,weight_edges=True,verbose=False):
-    filtered_nodes_1 = {}
-    filtered_nodes_2 = {}
     # If data already filtered, assign the vars
     if (type(nodes_data_A) is dict) and (type(nodes_data_B) is dict):
         filtered_nodes_1 = nodes_data_A
         filtered_nodes_2 = nodes_data_B
+        index_A = None #no in-degrees available, so weighted comparisons fall back to unweighted ones
+        index_B = None
     # Else assume it is a CSV file and load, then assign via _filter_nodes()
     else:
-        nodesA = load_data(nodes_data_A)
-        if nodesA[0][0] == 'name':
-            del nodesA[0]
-
-        nodesB = load_data(nodes_data_B)
-        if nodesB[0][0] == 'name':
-            del nodesB[0]
+        index_A = build_node_index(nodes_data_A)
+        index_B = build_node_index(nodes_data_B)
+        filtered_nodes_1 = _filter_nodes(index_A,nodes_filter)
+        filtered_nodes_2 = _filter_nodes(index_B,nodes_filter)
 
-    filtered_nodes_1 = _filter_nodes(nodesA,nodes_filter)
-    filtered_nodes_2 = _filter_nodes(nodesB,nodes_filter)
+    with _phase('match_communities','overlap') as ph:
+        overlap,sizes_1,sizes_2 = _community_overlap(filtered_nodes_1,filtered_nodes_2,index_A,index_B,weight_edges == True and index_A is not None)
+        ph['rows'] = sum(len(i) for i in filtered_nodes_1.values()) + sum(len(i) for i in filtered_nodes_2.values())
 
     hijacc = 0
     best_match = {}
@@ -579,22 +2140,14 @@ def match_communities(nodes_data_A,nodes_data_B,nodes_filter=0.01,jacc_threshold
         nonzero_jacc[i] = {}
         hix = i+'x'
         for j in filtered_nodes_2:
-            intersect = set(filtered_nodes_1[i]).intersection(set(filtered_nodes_2[j])) #get intersection of names for month 1 + 2
-            union_both = set(filtered_nodes_1[i]).union(set(filtered_nodes_2[j]))
-            if weight_edges == True:
-                inter_weights = [int(k[2]) for k in nodesA if k[0] in intersect] + [int(k[2]) for k in nodesB if k[0] in intersect] #pull intersection in-degrees from both months and combine into a single list
-                union_weights = [int(k[2]) for k in nodesA if k[0] in union_both] + [int(k[2]) for k in nodesB if k[0] in union_both] #pull union in-degrees from both months and combine into a single list
-                try:
-                    jacc = sum(inter_weights)/sum(union_weights)
-                except ZeroDivisionError:
-                    jacc = 0
-            else: #if weight_edges is set to anything other than 'WEIGHT_JACCARD', set all weights to 1 for each node
-                inter_weights = len(intersect)
-                union_weights = len(union_both)
-                try:
-                    jacc = inter_weights/union_weights
-                except ZeroDivisionError:
-                    jacc = 0
+            if j not in overlap[i]: #communities that share no nodes have a Jaccard of 0
+                continue
+            inter_weights = overlap[i][j]
+            union_weights = sizes_1[i] + sizes_2[j] - inter_weights
+            try:
+                jacc = inter_weights/union_weights
+            except ZeroDivisionError:
+                jacc = 0
             if jacc > 0:
                 if verbose == True:
                     print(i+'x'+j+"\t"+str(round(jacc,4)))
@@ -630,42 +2183,17 @@ def match_communities(nodes_data_A,nodes_data_B,nodes_filter=0.01,jacc_threshold
                         print('Divergence of month-A community',i,'into month-B communities',highest_key,'and',j)
                     diverge[i] = [highest_key,j]
 
-    thres_jacc = {} #convergence test
-    for i in nonzero_jacc: #get all jaccs above dc_threshold
-        thres_jacc[i] = {}
+    conv = {} #convergence test: invert the nonzero Jaccards to list the month-A IDs above dc_threshold for each month-B ID
+    for i in nonzero_jacc:
         for j in nonzero_jacc[i]:
             if nonzero_jacc[i][j] >= dc_threshold:
-                thres_jacc[i][j] = nonzero_jacc[i][j]
-
-    thres_dict_list = {} #get a dict of lists of the month-B IDs above jacc_threshold
-    for i in thres_jacc:
-        thres_dict_list[i] = list(thres_jacc[i].keys())
-
-    conv = {} #create a dict of empty lists corresponding to all unique month-B IDs
-    for i in thres_dict_list:
-        for j in thres_dict_list[i]:
-            conv[j] = []
-
-    for i in thres_dict_list: #figure out which month-B IDs appear as multiple matches for month-A IDs
-        for j in thres_dict_list:
-            if i != j:
-                c_intersect = set(thres_dict_list[i]).intersection(set(thres_dict_list[j]))
-                if len(c_intersect) > 0:
-                    conv_msg = 0
-                    for k in c_intersect:
-                        if i not in conv[k]:
-                            conv_msg += 1
-                            conv[k].append(i)
-                        if j not in conv[k]:
-                            conv_msg += 1
-                            conv[k].append(j)
-                        if conv_msg == 2:
-                            if verbose == True:
-                                print('Convergence of month-A communities',i,'and',j,'into month-B community',k)
+                conv.setdefault(j,[]).append(i)
 
     converge = {}
-    for i in conv:
-        if len(conv[i]) > 0:
+    for i in conv: #month-B IDs that appear as matches for multiple month-A IDs
+        if len(conv[i]) > 1:
+            if verbose == True:
+                print('Convergence of month-A communities',', '.join(conv[i]),'into month-B community',i)
             converge[i] = conv[i]
 
     match_out = cMatchObject()
@@ -677,88 +2205,270 @@ def match_communities(nodes_data_A,nodes_data_B,nodes_filter=0.01,jacc_threshold
 
     return match_out
 
+# _community_overlap: Computes the membership overlap between every pair of communities in two networks in a single sweep
+# Description: This is a helper function for match_communities. Rather than intersecting the node sets of every (A, B) community pair, it builds an inverted index from each network-B node to its community once and then walks each network-A community's nodes through it, accumulating the overlap of every pair that shares at least one node. In weighted mode each node counts as its combined in-degree across both networks (looked up in a single name-to-weight dict); otherwise each node counts as 1.
+# Arguments:
+    # filtered_nodes_1: A dict of the type returned by _filter_nodes for network A.
+    # filtered_nodes_2: A dict of the type returned by _filter_nodes for network B.
+    # index_A: An object of the custom class "nodeIndexObject" for network A, used only for its in-degrees.
+    # index_B: An object of the custom class "nodeIndexObject" for network B, used only for its in-degrees.
+    # weighted: If set to True, overlaps and sizes will be sums of in-degrees. If set to False, they will be node counts.
+# Output: A tuple of three items:
+    # A sparse overlap matrix in the form of a dict of dicts in which each first-order key is a network-A community ID, each second-order key is a network-B community ID, and each second-order value is the (weighted) size of the intersection between the two. Pairs that share no nodes are omitted.
+    # A dict of the (weighted) sizes of each network-A community.
+    # A dict of the (weighted) sizes of each network-B community.
+    # The (weighted) size of the union of any pair can be obtained by adding its two sizes and subtracting its intersection.
+
+def _community_overlap(filtered_nodes_1,filtered_nodes_2,index_A,index_B,weighted):
+    sets_1 = {i:set(filtered_nodes_1[i]) for i in filtered_nodes_1}
+    sets_2 = {j:set(filtered_nodes_2[j]) for j in filtered_nodes_2}
+
+    if weighted == True:
+        compared = set().union(*sets_1.values(),*sets_2.values())
+        weights = {} #combined in-degree of each compared node across both networks
+        for name in compared:
+            weights[name] = 0
+            if name in index_A.node_ids:
+                weights[name] += int(index_A.scores[index_A.node_ids[name]])
+            if name in index_B.node_ids:
+                weights[name] += int(index_B.scores[index_B.node_ids[name]])
+        weigh = weights.__getitem__
+    else:
+        weigh = lambda name: 1
+
+    index_2 = {} #inverted index of network-B node names and the communities they belong to
+    for j in sets_2:
+        for name in sets_2[j]:
+            index_2.setdefault(name,[]).append(j)
+
+    overlap = {}
+    for i in sets_1:
+        overlap[i] = {}
+        for name in sets_1[i]:
+            for j in index_2.get(name,()):
+                overlap[i][j] = overlap[i].get(j,0) + weigh(name)
+
+    sizes_1 = {i:sum(weigh(name) for name in sets_1[i]) for i in sets_1}
+    sizes_2 = {j:sum(weigh(name) for name in sets_2[j]) for j in sets_2}
+
+    return overlap,sizes_1,sizes_2
+
 # _filter_nodes: Get the nodes of highest in-degree in a network OR the nodes in a fixed list that appear in a network
 # Desciption: This is a helper function for match_communities and get_intermediaries that simply loads the top (propor * 100)% of nodes by in-degree OR a preset list of nodes in each community in a partitioned network into a list.
 # Arguments:
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities.
+    # node_index: An object of the custom class "nodeIndexObject" created by build_node_index from a community-partition dataset of the type exported by get_top_communities.
     # propor: This variable can either be a float greater than 0 and less than 1 OR a list of node names. If a float, the variable represents the proportion of top in-degree nodes to extract from each community. If a list of nodes, it represents the specific set of nodes to extract from nodes_data when present. Default is 0.01 (1%). Increasing the float will increase processing time.
-#Output: A dict whose keys are community IDs and whose values are filtered lists of node names.
+#Output: A dict whose keys are community IDs (in the order of node_index.community_ids) and whose values are filtered lists of node names.
+
+def _filter_nodes(node_index,nodes_filter=0.01):
+    members = {i:[] for i in node_index.community_ids} #creates a dict of lists. Each list contains the nodes of one community in descending order of in-degree
+    if type(nodes_filter) is not float:
+        nodes_filter = set(nodes_filter)
+    for name,cmty in zip(node_index.names,node_index.communities.tolist()):
+        if cmty >= 0 and (type(nodes_filter) is float or name in nodes_filter):
+            members[node_index.community_ids[cmty]].append(name)
+
+    if type(nodes_filter) is float: #keeps only the top [propor*100]% most-connected nodes within each community
+        return {i:members[i][0:int(len(members[i]) * nodes_filter)] for i in members}
+    return members
+
+# track_communities: Track communities across a series of sliding time windows
+# Description: This function partitions a network in each of a series of overlapping time windows and chains the best community matches between consecutive windows (see match_communities) into lineages, each of which follows a single community over time. Edges are supplied in batches (e.g. one batch per day), each of which is loaded only once: the edges of the current window are kept as a running count that is updated as each new batch enters the window and the oldest leaves it, so consecutive windows never have to be rebuilt from scratch. Because consecutive windows share most of their edges, community detection in each window starts by default from the previous window's partition, which is usually much faster than starting over.
+# Arguments:
+    # batches: An iterable (such as a list or a generator) of edgelists in chronological order, one per time period. Each can be anything get_top_communities accepts, weighted or not.
+    # window_size: The number of consecutive batches in each window. The first window ends with batch number window_size, and each later batch starts a new window. If there are fewer batches than window_size, a single window containing all of them is used. Default is 7.
+    # top_comm: See get_top_communities. Default is 10.
+    # engine: See get_top_communities. Default is 'louvain'.
+    # seed: See get_top_communities. Default is None.
+    # warm_start: If set to True, community detection in each window will start from the partition of the previous window (see init_partition in get_top_communities). If set to False, each window will be partitioned from scratch. Default is True.
+    # nodes_filter: See match_communities. Default is 0.01.
+    # jacc_threshold: See match_communities. A community continues the lineage of the community it best matches in the previous window if their Jaccard value is at least this high; if two or more communities converge into one, it continues the lineage of its closest match. Default is 0.3.
+    # dc_threshold: See match_communities. Default is 0.2.
+    # save_prefix: Add a string here to save the lineages to CSV. Your saved file will be named as follows: 'string'_lineages.csv
+# Output: An object of the custom class "trackObject" with the following attributes:
+    # windows: A list containing the louvainObject of each window (see get_top_communities). Within each window, edges are weighted by the number of times they occur.
+    # matches: A list of cMatchObjects (see match_communities) in which matches[n] compares windows[n] with windows[n+1].
+    # lineages: A dict in which each key is an integer lineage ID and each value is a list of [window number, community ID] pairs, one for each window in which the lineage's community is among the top communities.
+    # window_lineages: A list containing a dict for each window in which the keys are the IDs of its top communities and the values are their lineage IDs.
+
+class trackObject:
+    '''an object class with attributes for community lineages across time windows'''
+    def __init__(self,windows,matches,lineages,window_lineages):
+        self.windows = windows
+        self.matches = matches
+        self.lineages = lineages
+        self.window_lineages = window_lineages
+
+def track_communities(batches,window_size=7,top_comm=10,engine='louvain',seed=None,warm_start=True,nodes_filter=0.01,jacc_threshold=0.3,dc_threshold=0.2,save_prefix=''):
+    batch_counts = collections.deque()
+    window_counts = collections.Counter()
+    windows = []
+    matches = []
+    lineages = {}
+    window_lineages = []
+
+    def close_window():
+        with _phase('track_communities','window') as ph:
+            update_lineages()
+            ph['rows'] = len(window_counts)
+
+    def update_lineages():
+        previous = windows[-1] if len(windows) > 0 else None
+        edges = [[i[0],i[1],ct] for i,ct in window_counts.items()]
+        lo = get_top_communities(edges,top_comm,randomize=False,seed=seed,engine=engine,init_partition=previous if warm_start == True else None) #the engine's own seeded randomness makes shuffling the edges unnecessary
+        cmty_lineages = {}
+        if previous is not None:
+            cm = match_communities(previous,lo,nodes_filter,jacc_threshold,dc_threshold)
+            matches.append(cm)
+            for i in sorted(cm.best_matches,key=cm.best_matches.get,reverse=True): #closest matches claim their lineages first
+                cmty_A = i[:i.find('x')]
+                cmty_B = i[i.find('x')+1:]
+                if len(cmty_B) > 0 and cm.best_matches[i] >= jacc_threshold and cmty_B not in cmty_lineages:
+                    cmty_lineages[cmty_B] = window_lineages[-1][cmty_A]
+        for i in lo.n_nodes:
+            if i not in cmty_lineages: #communities with no match in the previous window begin new lineages
+                cmty_lineages[i] = len(lineages)
+                lineages[len(lineages)] = []
+            lineages[cmty_lineages[i]].append([len(windows),i])
+        windows.append(lo)
+        window_lineages.append(cmty_lineages)
+
+    for batch in batches:
+        edges = _load_edges(batch)
+        weights = _edge_weights(edges)
+        counts = collections.Counter()
+        if weights is None:
+            counts.update((i[0],i[1]) for i in edges)
+        else:
+            for i,w in zip(edges,weights.tolist()):
+                counts[(i[0],i[1])] += w
+        batch_counts.append(counts)
+        window_counts.update(counts)
+        if len(batch_counts) > window_size: #the oldest batch leaves the window
+            for i,ct in batch_counts.popleft().items():
+                window_counts[i] -= ct
+                if window_counts[i] <= 0:
+                    del window_counts[i]
+        if len(batch_counts) == window_size:
+            close_window()
+    if len(windows) == 0 and len(batch_counts) > 0:
+        close_window()
 
-def _filter_nodes(nodes_data,nodes_filter=0.01):
-    uniq_cl = set([i[1] for i in nodes_data]) #creates a unique list of the top 10 communities from each community file
+    if len(save_prefix) > 0:
+        outlist = [['lineage','window','community']]
+        for i in lineages:
+            for j in lineages[i]:
+                outlist.append([i] + j)
+        save_csv(save_prefix + '_lineages.csv',outlist)
 
-    filtered_nodes = {} #creates a dict of lists. Each list contains the top [propor*100]% most-connected nodes within each community
+    return trackObject(windows,matches,lineages,window_lineages)
 
-    if type(nodes_filter) is float:
-        for i in uniq_cl:
-            cltemp = [j[0] for j in nodes_data if j[1] == i]
-            pct = int(len(cltemp) * nodes_filter)
-            filtered_nodes[i] = [j for j in cltemp][0:pct]
+# build_in_index: Index the in-edges of every node in an edgelist
+# Description: This function builds a reverse adjacency index in compressed sparse row (CSR) format, so that all the nodes that sent edges to a given node can be looked up without scanning the full edgelist. It is used by get_intermediaries, and its output can be passed to get_intermediaries in place of an edgelist to reuse the index across calls.
+# Arguments:
+    # edges_data: An edgelist of the type exported by t2e. Can be a list of lists, a path to a CSV file, or an edge store (see save_edge_store), whose arrays are indexed without creating any per-edge Python objects.
+# Output: An object of the custom class "inIndexObject" with the following attributes:
+    # names: A list of all unique node names in the edgelist. The position of each name is its integer node ID.
+    # node_ids: A dict in which each key is a node name and each value is its integer node ID.
+    # indptr: A numpy array of length len(names)+1. The IDs of the nodes that sent edges to node ID n are found at senders[indptr[n]:indptr[n+1]].
+    # senders: A numpy array containing the sender node ID of every edge, grouped by recipient. Duplicate edges are kept.
+    # weights: A numpy array containing the weight of every edge in the same order as senders, or None if the edgelist is unweighted (see t2e).
+
+class inIndexObject:
+    '''an object class with attributes for a CSR index of each node's in-edges'''
+    def __init__(self,names,node_ids,indptr,senders,weights=None):
+        self.names = names
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.senders = senders
+        self.weights = weights
+
+def build_in_index(edges_data):
+    store = _as_edge_store(edges_data)
+    if store is not None:
+        node_ids = {name:n for n,name in enumerate(store.names)}
+        src = np.asarray(store.src)
+        tgt = np.asarray(store.tgt)
+        weights = store.weights
     else:
-        nf2 = [[j[0],j[1]] for j in nodes_data if j[0] in nodes_filter]
-        for i in uniq_cl:
-            filtered_nodes[i] = [j[0] for j in nf2 if j[1] == i]
-
-    return filtered_nodes
+        edges = load_data(edges_data)
+        node_ids = {}
+        src = np.fromiter((node_ids.setdefault(i[0],len(node_ids)) for i in edges),dtype=np.int64,count=len(edges))
+        tgt = np.fromiter((node_ids.setdefault(i[1],len(node_ids)) for i in edges),dtype=np.int64,count=len(edges))
+        weights = _edge_weights(edges)
+    by_recipient = np.argsort(tgt,kind='stable')
+    indptr = np.zeros(len(node_ids)+1,dtype=np.int64)
+    np.cumsum(np.bincount(tgt,minlength=len(node_ids)),out=indptr[1:])
+    if weights is not None:
+        weights = weights[by_recipient]
+    return inIndexObject(list(node_ids),node_ids,indptr,src[by_recipient],weights)
 
 # get_intermediaries: Identifies nodes who are heavily connected to by multiple network communities
 # Description: When analyzing partitioned networks, it is sometimes helpful to know not only which nodes are high in betweenness centrality, but also which communities are bridged by such nodes. This function identifies high in-degree nodes whose ties are relatively evenly distributed across at least two communities.
 # Arguments:
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities.
-    # edges_data: An edgelist of the type exported by t2e.
-    # threshold: A float variable greater than 0 and less than 1 representing the minimum proportion of internal ties a given top node needs to receive from an external community to count as a bridge. For example, for node DF where the community most connected to DF is A, setting the threshold to 0.5 means that for DF to count as a bridge, the number of ties DF receives from second most-connected community B must equal at least 50% of the ties it receives from A.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities, a louvainObject, or a nodeIndexObject created by build_node_index.
+    # edges_data: An edgelist of the type exported by t2e (weighted or not), an edge store (see save_edge_store), or an object of the custom class "inIndexObject" created by build_in_index. Passing the same inIndexObject to several calls (e.g. with different bridge_threshold or nodes_filter values) avoids re-indexing the edgelist each time.
+    # bridge_threshold: A float variable greater than 0 and less than 1 representing the minimum proportion of internal ties a given top node needs to receive from an external community to count as a bridge. For example, for node DF where the community most connected to DF is A, setting the threshold to 0.5 means that for DF to count as a bridge, the number of ties DF receives from second most-connected community B must equal at least 50% of the ties it receives from A.
     # nodes_filter: This variable can be either a float greater than 0 and less than 1 or a list of node names. If the former, it represents the proportion of top in-degree nodes to extract from each community. If the latter, it represents the collection of nodes to search for in each community. Default is 0.01 (1%). Increasing the float or list size will increase processing time.
     # verbose: If set to True, the shell will print a message every time a new node is added to the bridge list. Default is False.
     # zeropad: If zeropad is set to False, if a node from Community A receives no edges from Community B, get_intermediaries will omit community B from that node's dict of received ties. If zeropad is set to True, for each community like B, get_intermediaries will create a new dict item whose value is 0 (whereas otherwise that dict item would simply not exist).
-# Output: A list of lists, each of which contains a bridge node's in-degree (at index 0), its name (at index 1), and a dict in which each key is a community ID and each value is the N of ties the node received from that community (at index 2). Note: the community ID of the bridge node is not explicitly indicated in this dict, but it is almost always the ID with the highest N of received ties.
-
-def get_intermediaries(nodes_data,edges_data,bridge_threshold=0.5,nodes_filter=0.01,verbose=False,zeropad=True):
-    nodes = load_data(nodes_data)
-    if nodes_data[0][0] == 'name':
-        del nodes[0]
-    edges = load_data(edges_data)
-    filtered_nodes = _filter_nodes(nodes,nodes_filter)
+    # all_nodes: If set to True, get_intermediaries will ignore nodes_filter and score every node in nodes_data at once using a sparse node x community matrix of received ties (see _rank_all_bridges). This produces the same results as a nodes_filter of 1.0, but fast enough for networks with millions of nodes. Default is False.
+# Output: A list of lists, each of which contains a bridge node's in-degree (or weighted in-degree, for weighted edgelists) (at index 0), its name (at index 1), and a dict in which each key is a community ID and each value is the N of ties the node received from that community (at index 2). Note: the community ID of the bridge node is not explicitly indicated in this dict, but it is almost always the ID with the highest N of received ties.
+
+def get_intermediaries(nodes_data,edges_data,bridge_threshold=0.5,nodes_filter=0.01,verbose=False,zeropad=True,all_nodes=False):
+    node_index = build_node_index(nodes_data)
+    if isinstance(edges_data,inIndexObject):
+        in_index = edges_data
+    else:
+        with _phase('get_intermediaries','index') as ph:
+            in_index = build_in_index(edges_data)
+            ph['rows'] = len(in_index.senders)
+    filtered_nodes = _filter_nodes(node_index,nodes_filter)
     total_nodes = sum([len(filtered_nodes[i]) for i in filtered_nodes])
     name_ct = 0
 
     cmty_list = list(filtered_nodes.keys())
-    node_dict = {i[0]:i[1] for i in nodes} #create dict of node names and community IDs
+    sender_cmty = _community_codes(node_index,in_index.names) #community code of every node in the edgelist, -1 for nodes not in the top k communities
     bridge_cands = {}
 
-    for n,cmty in enumerate(filtered_nodes):
-        for name in filtered_nodes[cmty]:
+    with _phase('get_intermediaries','bridges') as ph:
+        if all_nodes == True:
+            bridge_cands = _rank_all_bridges(in_index,sender_cmty,cmty_list,bridge_threshold)
             if verbose == True:
-                name_ct += 1
-                print('Analyzing node "' + name + '" (' + str(name_ct) + ' of ' + str(total_nodes) + ' total).')
-            user_edges = []
-
-            for i in edges: #pull all edges of which node is the recipient
-                if name == i[1]:
-                    user_edges.append(i)
-
-            ue_minus = [i for i in user_edges if i[0] in node_dict] #remove all nodes not in the top k communities
-            cmty_rts = {}
-
-            for i in cmty_list:
-                for j in ue_minus:
-                    if node_dict[j[0]] == i:
-                        if i in cmty_rts:
-                            cmty_rts[i] += 1
+                print(str(len(bridge_cands)) + ' of ' + str(int((sender_cmty >= 0).sum())) + ' nodes added to the list.')
+        else:
+            for n,cmty in enumerate(filtered_nodes):
+                for name in filtered_nodes[cmty]:
+                    if verbose == True:
+                        name_ct += 1
+                        print('Analyzing node "' + name + '" (' + str(name_ct) + ' of ' + str(total_nodes) + ' total).')
+
+                    cmty_rts = {}
+                    if name in in_index.node_ids: #pull the communities of all nodes that sent the node an edge
+                        node_id = in_index.node_ids[name]
+                        in_edges = slice(in_index.indptr[node_id],in_index.indptr[node_id+1])
+                        sent_from = sender_cmty[in_index.senders[in_edges]]
+                        if in_index.weights is None:
+                            cmty_cts = np.bincount(sent_from[sent_from >= 0],minlength=len(cmty_list)).tolist() #remove all nodes not in the top k communities
                         else:
-                            cmty_rts[i] = 1
-
-            list_rts_ct = sorted(list(cmty_rts.values()),reverse=True)
-            if bridge_threshold > 0:
-                add_bool = len(cmty_rts) >= 2 and list_rts_ct[1] >= list_rts_ct[0]*bridge_threshold #the N of ties to the 2nd-highest community must equal or exceed a minimum proportion of the N of ties to the highest community
-            elif len(list_rts_ct) > 0:
-                add_bool = True
-            else:
-                add_bool = False
-            if add_bool is True:
-                if verbose == True:
-                    print('Node "' + name + '" added to the list.')
-                cmty_rts = collections.OrderedDict(sorted(cmty_rts.items(),key=operator.itemgetter(1),reverse=True))
-                bridge_cands[name] = cmty_rts
+                            cmty_cts = np.bincount(sent_from[sent_from >= 0],weights=in_index.weights[in_edges][sent_from >= 0],minlength=len(cmty_list)).astype(np.int64).tolist()
+                        for c,ct in enumerate(cmty_cts):
+                            if ct > 0:
+                                cmty_rts[cmty_list[c]] = ct
+
+                    list_rts_ct = sorted(list(cmty_rts.values()),reverse=True)
+                    if bridge_threshold > 0:
+                        add_bool = len(cmty_rts) >= 2 and list_rts_ct[1] >= list_rts_ct[0]*bridge_threshold #the N of ties to the 2nd-highest community must equal or exceed a minimum proportion of the N of ties to the highest community
+                    elif len(list_rts_ct) > 0:
+                        add_bool = True
+                    else:
+                        add_bool = False
+                    if add_bool is True:
+                        if verbose == True:
+                            print('Node "' + name + '" added to the list.')
+                        cmty_rts = collections.OrderedDict(sorted(cmty_rts.items(),key=operator.itemgetter(1),reverse=True))
+                        bridge_cands[name] = cmty_rts
+        ph['rows'] = total_nodes if all_nodes == False else int((sender_cmty >= 0).sum())
 
     bridge_list = []
     for i in bridge_cands:
@@ -775,59 +2485,78 @@ def get_intermediaries(nodes_data,edges_data,bridge_threshold=0.5,nodes_filter=0
 
     return bridge_list
 
+# _rank_all_bridges: Score every node in a partitioned network as a potential bridge in one shot
+# Description: This is a helper function for get_intermediaries. It builds a sparse (node x community) matrix of received ties from an inIndexObject by coding every edge by its recipient and its sender's community and counting the unique codes. The highest and second-highest counts in each row then determine which nodes count as bridges, exactly as in get_intermediaries' per-node loop.
+# Arguments:
+    # in_index: An object of the custom class "inIndexObject" created by build_in_index.
+    # sender_cmty: A numpy array holding the position in cmty_list of the community of each node in in_index, or -1 for nodes outside the partition.
+    # cmty_list: A list of community IDs.
+    # bridge_threshold: See get_intermediaries.
+# Output: A dict whose keys are the names of bridge nodes and whose values are OrderedDicts of the type stored in get_intermediaries' output (community IDs and N of ties received, in descending order).
+
+def _rank_all_bridges(in_index,sender_cmty,cmty_list,bridge_threshold):
+    k = len(cmty_list)
+    recipients = np.repeat(np.arange(len(in_index.names)),np.diff(in_index.indptr))
+    senders = sender_cmty[in_index.senders]
+    in_top = (senders >= 0) & (sender_cmty[recipients] >= 0) #only ties among nodes in the partition count
+    if in_index.weights is None:
+        cells,cts = np.unique(recipients[in_top]*k + senders[in_top],return_counts=True)
+    else:
+        cells,cell_ids = np.unique(recipients[in_top]*k + senders[in_top],return_inverse=True)
+        cts = np.bincount(cell_ids,weights=in_index.weights[in_top],minlength=len(cells)).astype(np.int64)
+    rows = cells // k
+    cols = cells % k
+    order = np.lexsort((cols,-cts,rows)) #within each row, sort by descending count, then by community order
+    rows,cols,cts = rows[order],cols[order],cts[order]
+
+    row_start = np.searchsorted(rows,rows) #index of the first (i.e. highest) cell in each cell's row
+    rank = np.arange(len(rows)) - row_start
+    n_cmty = np.bincount(rows,minlength=len(in_index.names))
+    top_1 = np.zeros(len(in_index.names),dtype=np.int64)
+    top_2 = np.zeros(len(in_index.names),dtype=np.int64)
+    top_1[rows[rank == 0]] = cts[rank == 0]
+    top_2[rows[rank == 1]] = cts[rank == 1]
+
+    if bridge_threshold > 0:
+        is_bridge = (n_cmty >= 2) & (top_2 >= top_1*bridge_threshold) #the N of ties to the 2nd-highest community must equal or exceed a minimum proportion of the N of ties to the highest community
+    else:
+        is_bridge = n_cmty > 0
+
+    selected = is_bridge[rows]
+    bridge_cands = {}
+    for row,col,ct in zip(rows[selected].tolist(),cols[selected].tolist(),cts[selected].tolist()):
+        name = in_index.names[row]
+        if name not in bridge_cands:
+            bridge_cands[name] = collections.OrderedDict()
+        bridge_cands[name][cmty_list[col]] = ct
+
+    return bridge_cands
+
 # get_top_hashtags: Collects the most-used hashtags in each community in descending order of popularity
 # Description: This function collects the most-used hashtags in a set of tweets that's been partitioned into communities and organizes them first by community and then in descending order of popularity.
 # Arguments:
     # tweets_data:
         # IF nodes_data IS NONBLANK: a path to a CSV file (the only delimiter currently allowed is commas) with tweet authors listed in col 1 and corresponding tweet text in col 2, or an equivalent k x 2 list of lists. . If col 1 contains any text, col 2 must as well, and vice versa.
         # IF nodes_data IS BLANK: a path to a CSV file (the only delimiter currently allowed is commas) with tweet text in col 1, which should be the sole column.
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be left blank per the explanation above.
+        # OR a tweetCorpus, in which case nodes_data is ignored in favor of the partition the corpus was built with. Querying one corpus is much faster than rereading the tweets each time.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities, a louvainObject, or a nodeIndexObject created by build_node_index with lowercase=True. Can be left blank per the explanation above.
     # min_ct: The minimum number of times a hashtag must appear in a given community to be included in that community's list. Increasing this number speeds processing. Default is 10.
+    # capacity: If set to an integer, each community's hashtags will be counted approximately in a fixed amount of memory by a spaceSaving summary that tracks at most capacity distinct hashtags, and each tuple in the output will contain a third value: the maximum amount by which its count may exceed the true count. See get_top_rts for details. Ignored if tweets_data is a tweetCorpus. Default is None, which counts exactly.
+    # workers: The number of processes to count with. See get_top_rts for details. Default is 1.
     # rtl_ht: If set to True, the function will search for hashtags written with the hashmark on the right, such as those in right-to-left languages like Arabic and Hebrew. If set to False, it will not include such hashtags. Default is False.
 # Output:
     # IF nodes_data IS NONBLANK: A dict whose keys are community IDs and whose values are lists, the values of which are tuples in which the first value is a hashtag and the second is the number of times it appears within the given community. Each list is arranged in descending order of hashtag prevalence.
     # IF nodes_data IS BLANK: a list whose values are tuples in which the first value is a hashtag and the second is the number of times it appears within the given community. This list is arranged in descending order of hashtag prevalence.
 
-def get_top_hashtags(tweets_data,nodes_data='',min_ct=10):
-    tweets = [i for i in load_data(tweets_data) if len(i) > 0 and i[0].strip() != '']
-    if nodes_data != '':
-        nodes = [i for i in load_data(nodes_data) if i[0].strip() != '']
-        if nodes_data[0][0] == 'name':
-            del nodes[0]
-
-        clust_uniq = set([i[1] for i in nodes])
-        node_dict = {i[0].lower():i[1] for i in nodes}
-        tweets = tuple([[i[0].lower(),i[1].lower()] for i in tweets if i[0].lower() in node_dict])
-    else:
-        if type(tweets_data[0]) is list and len(tweets_data[0]) >= 2:
-            tweets = [i[1] for i in tweets if len(i[1]) > 0]
-        elif type(tweets_data[0]) is list:
-            tweets = [i[0] for i in tweets if len(i[0]) > 0]
-        else: 
-            tweets = tweets_data
-        clust_uniq = set('1')
-        tweets = tuple([i.lower() for i in tweets])
-    ht_dict = {}
-
-    for cid in clust_uniq:
-        if nodes_data != '':
-            splitprep = [t[1].replace(u'\u200F','') for t in tweets if '#' in t[1] and node_dict[t[0]] == cid] #fills in the list tweets with hashtags, lowercased, space-padded, cleaned and only if a hashmark exists in the tweet
-        else:
-            splitprep = tuple([t.replace(u'\u200F','') for t in tweets if '#' in t])
-        final = []
-        hts = [re.findall('#\w+',t) for t in splitprep]
-        for h in hts:
-            final.extend(set(h))
-        
-        ht_dict[cid] = tuple(final)
-
-    for i in ht_dict:
-        ht_dict[i] = tuple([j for j in collections.Counter(ht_dict[i]).most_common() if j[1] >= min_ct])
-
-    if nodes_data != '':
-        return {i:ht_dict[i] for i in ht_dict if len(ht_dict[i]) > 0}
+def get_top_hashtags(tweets_data,nodes_data='',min_ct=10,capacity=None,workers=1):
+    if isinstance(tweets_data,tweetCorpus):
+        corpus = tweets_data
     else:
-        return [i for i in ht_dict['1'] if len(ht_dict['1']) > 0 and i[1] >= min_ct]
+        corpus = tweetCorpus(tweets_data,nodes_data,analyses=['hashtags'],capacity=capacity,workers=workers)
+    with _phase('get_top_hashtags','count') as ph:
+        top = corpus.top_hashtags(min_ct)
+        ph['rows'] = corpus.n_tweets
+    return top
 
 # get_top_links: Collects the most-used hyperlinks or web domains in each community in descending order of popularity
 # Description: This function collects the most-used hyperlinks or web domains in a set of tweets that's been partitioned into communities and organizes them first by community and then in descending order of popularity.
@@ -835,83 +2564,37 @@ def get_top_hashtags(tweets_data,nodes_data='',min_ct=10):
     # tweets_data:
         # IF nodes_data IS NONBLANK: a path to a CSV file (the only delimiter currently allowed is commas) with tweet authors listed in col 1 and corresponding tweet text in col 2, or an equivalent k x 2 list of lists. If col 1 contains any text, col 2 must as well, and vice versa.
         # IF nodes_data IS BLANK: a path to a CSV file (the only delimiter currently allowed is commas) with tweet text in col 1, which should be the sole column.
-    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be left blank per the explanation above.
+        # OR a tweetCorpus, in which case nodes_data is ignored in favor of the partition the corpus was built with. Querying one corpus is much faster than rereading the tweets each time.
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities, a louvainObject, or a nodeIndexObject created by build_node_index with lowercase=True. Can be left blank per the explanation above.
     # min_ct: The minimum number of times a hyperlink or domain must appear in a given community to be included in that community's list. Increasing this number speeds processing. Default is 10.
     # domains_only: If set to True, get_top_links will extract only web domains (e.g. all articles from the New York Times will be counted under the nytimes.com domain). If set to False, it will extract full links and count distinct links with the same domain separately. Default is False.
     # remove_3ld: If set to True, the function will remove all third-level domains from the links (e.g. "www."). If set to False, it will leave all third-level domains intact. Default is False.
     # remove_domains: If a list of web domains is entered, these domains will be removed from the data prior to processing. Default is an empty list, which leaves all domains intact. Entering anything other than a list of strings may result in an error.
+    # capacity: If set to an integer, each community's links will be counted approximately in a fixed amount of memory by a spaceSaving summary that tracks at most capacity distinct links, and each tuple in the output will contain a third value: the maximum amount by which its count may exceed the true count. Links merged by the cleaning options have their errors summed. See get_top_rts for details. Ignored if tweets_data is a tweetCorpus. Default is None, which counts exactly.
+    # workers: The number of processes to count with. See get_top_rts for details. Default is 1.
 # Output:
     # IF nodes_data IS NONBLANK: A dict whose keys are community IDs and whose values are lists, the values of which are tuples in which the first value is a link or domain and the second is the number of times it appears within the given community. Each list is arranged in descending order of hashtag prevalence.
     # IF nodes_data IS BLANK: a list whose values are tuples in which the first value is a link or domain and the second is the number of times it appears within the given community. This list is arranged in descending order of link/domain prevalence.
 
-def get_top_links(tweets_data,nodes_data='',min_ct=10,domains_only=False,remove_3ld=False,remove_trailing_chars=['#','?'],exclude_domains=[]):
-    tweets = [i for i in load_data(tweets_data) if len(i) > 0 and i[0].strip() != '']
-    if nodes_data != '':
-        nodes = [i for i in load_data(nodes_data) if i[0].strip() != '']
-        if nodes_data[0][0] == 'name':
-            del nodes[0]
-
-        clust_uniq = set([i[1] for i in nodes])
-        node_dict = {i[0].lower():i[1] for i in nodes}
-        tweets = tuple([[i[0].lower(),i[1].replace('https','http')] for i in tweets if i[0].lower() in node_dict])
-    else:
-        if type(tweets_data[0]) is list and len(tweets_data[0]) >= 2:
-            tweets = [i[1] for i in tweets if len(i[1]) > 0]
-        elif type(tweets_data[0]) is list:
-            tweets = [i[0] for i in tweets if len(i[0]) > 0]
-        else: 
-            tweets = tweets_data
-        clust_uniq = set('1')
-        tweets = tuple([i.replace('https','http') for i in tweets])
-    links_dict = {}
-    
-    domains_only_regex = r'(?:http)(?:s?)(?:://)(.+?)(?:/|\s|$)'
-    standard_regex = r'(?:http)(?:s?)(?:://)(.+?)(?:\s|$)'
-
-    for cid in clust_uniq:
-        if nodes_data != '':
-            splitprep = [t[1].replace(u'\u200F','') for t in tweets if 'http://' in t[1] and node_dict[t[0]] == cid] #fills in the list tweets with hyperlinks, lowercased, space-padded, cleaned and only if 'http://' exists in the tweet
-        else:
-            splitprep = [t.replace(u'\u200F','') for t in tweets if 'http://' in t and '.' in t]
-        final = []
-        if domains_only == True:
-            links = [re.findall(domains_only_regex,t) for t in splitprep]
-        else:
-            links = [re.findall(standard_regex,t) for t in splitprep]
-        for u in links:
-            final.extend(set(u))
-            
-        if len(exclude_domains) > 0:
-            final = [hl for hl in final if not any(d in hl for d in exclude_domains)]
-
-        if len(remove_trailing_chars) > 0:
-            for n,hl in enumerate(final):
-                if any(t in hl for t in remove_trailing_chars):
-                    t0 = sorted([hl.find(c) for c in remove_trailing_chars if c in hl])[0]
-                    final[n] = hl[:t0]
-
-        if remove_3ld == True:
-            for n,hl in enumerate(final):
-                if hl.count('.') >= 2:
-                    final[n] = hl[hl.find('.')+1:]
-
-        links_dict[cid] = tuple(final)
-
-    for i in links_dict:
-        links_dict[i] = tuple([j for j in collections.Counter(links_dict[i]).most_common() if j[1] >= min_ct])
-    if nodes_data != '':
-        return {i:links_dict[i] for i in links_dict if len(links_dict[i]) > 0}
+def get_top_links(tweets_data,nodes_data='',min_ct=10,domains_only=False,remove_3ld=False,remove_trailing_chars=['#','?'],exclude_domains=[],capacity=None,workers=1):
+    if isinstance(tweets_data,tweetCorpus):
+        corpus = tweets_data
     else:
-        return [i for i in links_dict['1'] if i[1] >= min_ct]
+        corpus = tweetCorpus(tweets_data,nodes_data,analyses=['domains' if domains_only == True else 'links'],capacity=capacity,workers=workers)
+    with _phase('get_top_links','count') as ph:
+        top = corpus.top_links(min_ct,domains_only,remove_3ld,remove_trailing_chars,exclude_domains)
+        ph['rows'] = corpus.n_tweets
+    return top
 
 # shared_ties_grid: arranges counts or proportions of ties shared within and between top communities in a network into a grid
-# Description: shared_ties_grid arranges the output of _get_shared_ties into a list of lists which is printable as a grid.
+# Description: shared_ties_grid arranges the output of _get_shared_ties into a list of lists which is printable as a grid, or into a numpy array. The grid is built as a k x k array in a single pass over the eiObject's adjacency dicts, and proportions and reciprocals are computed on the whole array at once.
 # Arguments:
     # ei_obj: a variable of type eiObject containing all the optional attributes.
     # rec_sent: a flag determining whether the off-diagonal grid cells will represent received edges ('REC'), sent edges ('SENT'), or sent and received edges summed ('ALL'). Default is 'ALL'.
     # calc_propor: If set to True, each cell value will represent a proportion of the total edges in the community indicated by index 0 of the given row. If set to False, shared_ties_grid will output edge counts. Default is False.
     # invert: If set to True, the function will output the reciprocals of all the off-diagonal cell values and zeroes for all diagonal values. Cells whose reciprocals would result in division by zero will be assigned a value of 1. The contents of the top row and leftmost column will remain unaltered. If set to False, non-reciprocal values (i.e., shared-tie counts or proportions) will be output. Default is False.
-# Output: shared_ties_grid outputs a list of lists in the following format:
+    # as_array: If set to True, shared_ties_grid will output a tuple containing a k x k numpy array of the grid's cells (without the top row and leftmost column) and a numpy array of the community IDs (as integers) labeling its rows and columns. Unlike those in the list output, proportions are not rounded and reciprocals are floats rather than strings. Default is False.
+# Output: Unless as_array is set to True, shared_ties_grid outputs a list of lists in the following format:
     # Indices 1 through k of the first row contain all k communities represented in the eiObject. Index 0 is left blank.
     # The 0 indices of all remaining rows also contain all k communities represented in the eiObject. Thus the grid always has a size of k+1 x k+1.
     # Each off-diagonal grid "cell" represents either the count, inverted count, or proportion (depending on how the flags are set) of edges received or sent (or both) by the community indicated by index 0 of the kth row from or to the community indicated on the kth index of the first row (the "column"). Diagonal grid cells represent the proportions or counts of internal edges of the community indicated by index 0 of the given row.
@@ -920,114 +2603,118 @@ def get_top_links(tweets_data,nodes_data='',min_ct=10,domains_only=False,remove_
     # for i in testgrid:
     #     print(i)
 
-def shared_ties_grid(ei_obj,rec_sent='ALL',calc_propor=False,invert=False):
+def shared_ties_grid(ei_obj,rec_sent='ALL',calc_propor=False,invert=False,as_array=False):
     if ei_obj.adj_in is None or ei_obj.adj_out is None:
         return 'One or both adjacency matrices empty, cannot create grid :/'
-    if rec_sent.upper() == 'REC':
-        raw = ei_obj.adj_in
-    elif rec_sent.upper() == 'SENT':
-        raw = ei_obj.adj_out
-    else:
-        raw = {}
-        for i in ei_obj.adj_in:
-            raw[i] = {}
-            for j in ei_obj.adj_in:
-                if j in ei_obj.adj_in[i]:
-                    in_add = ei_obj.adj_in[i][j]
-                else:
-                    in_add = 0
-                if j in ei_obj.adj_out[i]:
-                    out_add = ei_obj.adj_out[i][j]
-                else:
-                    out_add = 0
-                raw[i][j] = in_add + out_add
-
-    raw2 = {}
-
-    for i in raw: #converts all subdict keys to ints
-        raw2[int(i)] = {}
-        for j in raw[i]:
-            raw2[int(i)][int(j)] = raw[i][j]
-
-    clist = sorted(list(raw2.keys()))
+    community_ids = list(ei_obj.adj_in)
+    labels = np.array([int(i) for i in community_ids],dtype=np.int64)
+    order = np.argsort(labels,kind='stable') #puts the communities in numerical order
+    position = {i:n for n,i in enumerate(community_ids)}
+
+    grid = np.zeros((len(community_ids),len(community_ids)),dtype=np.int64)
+    if rec_sent.upper() != 'SENT':
+        _fill_ties(grid,ei_obj.adj_in,position)
+    if rec_sent.upper() != 'REC':
+        _fill_ties(grid,ei_obj.adj_out,position)
+    np.fill_diagonal(grid,[ei_obj.internal_ties[i] for i in community_ids]) #add internal ties
+    grid = grid[order][:,order]
+    labels = labels[order]
+
+    if calc_propor == True: #divide each row by its community's total N of ties
+        grid = grid / np.array([ei_obj.total_ties[community_ids[n]] for n in order.tolist()])[:,None]
+        if as_array == False:
+            grid = np.array([[round(j,3) for j in i] for i in grid.tolist()])
+    logger.info('Grid created.')
 
-    for i in raw2:
-        raw2[i][i] = ei_obj.internal_ties[str(i)] #add internal ties
-        for j in clist:
-            if j not in raw2[i]: #add zeroes for disconnected communities
-                raw2[i][j] = 0
+    if invert == True:
+        zero = grid == 0
+        with np.errstate(divide='ignore'):
+            inverted = 1 / grid
+        inverted[zero] = 1
+        np.fill_diagonal(inverted,0)
+        if as_array == True:
+            return inverted,labels
+        rows = []
+        for n,(i,z) in enumerate(zip(inverted.tolist(),zero.tolist())): #reciprocals are formatted as strings, as they always have been
+            rows.append([0 if n == x else (1 if z[x] else format(j,'f')) for x,j in enumerate(i)])
+    else:
+        if as_array == True:
+            return grid,labels
+        rows = grid.tolist()
 
-    raw3 = {}
+    clist = labels.tolist()
+    return [['']+clist] + [[clist[n]]+i for n,i in enumerate(rows)]
 
-    for i in raw2: #put the subdict keys in numerical order
-        raw3[i] = collections.OrderedDict(sorted(raw2[i].items()))
+# _fill_ties: Add the tie counts in a dict of dicts (an eiObject's adj_in or adj_out) to the cells of a grid whose rows and columns are ordered as in position
 
-    raw3 = collections.OrderedDict(sorted(raw3.items())) #put the main dict keys in order
-    outlist = []
+def _fill_ties(grid,adj,position):
+    for i in adj:
+        if len(adj[i]) > 0:
+            grid[position[i],[position[j] for j in adj[i]]] += list(adj[i].values())
 
-    for n,i in enumerate(raw3):
-        if calc_propor == True: #if PROPOR flag is set, divide each value by total N of ties
-            outlist.append([round(j/ei_obj.total_ties[str(i)],3) for j in list(raw3[i].values())])
-        else:
-            outlist.append(list(raw3[i].values()))
-        outlist[n].insert(0,i)
-
-    outlist.insert(0,['']+clist)
-    print('Grid created.')
-
-    if invert == True:
-        recip = []
-        for n,i in enumerate(outlist):
-            recip.append([])
-            for x,j in enumerate(outlist[n]):
-                if n != x and n != 0 and x != 0:
-                    try:
-                        recip[n].append(format(1/outlist[n][x],'f'))
-                    except ZeroDivisionError:
-                        recip[n].append(1)
-                elif n == x and n != 0 and x != 0:
-                    recip[n].append(0)
-                else:
-                    recip[n].append(outlist[n][x])
-        return recip
-    else:
-        return outlist
+# communities_as_nodes: Collapses each community into a single node
+# Description: This function creates a community-level network in which each node is a community and each edge is weighted by the number of edges between members of the two communities it connects. The weights are computed by coding each edge as a (source community, target community) pair and counting the pairs in a single pass.
+# Arguments:
+    # nodes_data: A community-partition dataset of the type exported by get_top_communities. Can be a variable (a list of lists), a path to a CSV file, a louvainObject, or a nodeIndexObject created by build_node_index.
+    # edges_data: An edgelist of the type exported by t2e. Can be a variable (a list of lists), a path to a CSV file, or an edge store (see save_edge_store). Edges involving nodes outside nodes_data are ignored. If the edgelist is weighted (see t2e), each edge counts as its weight.
+    # directed: If set to True, A->B and B->A ties will be weighted separately. If set to False, each community pair's weight will be the sum of its ties in both directions. Default is False.
+    # remove_selfloops: If set to True, ties within a community will be omitted. If set to False, they will be included. Default is True.
+    # output_format: If set to 'GEPHI', the output will be a list of lists for import into Gephi (see below). If set to 'MATRIX', the output will be a weighted adjacency matrix. Default is 'GEPHI'.
+# Output:
+    # IF output_format IS 'GEPHI': A list of lists whose first row is ["Source","Target","Weight","Type"] and whose remaining rows each contain two community IDs, the weight of the tie between them, and either "Directed" or "Undirected".
+    # IF output_format IS 'MATRIX': A tuple containing a list of the k community IDs and a k x k numpy array in which cell [a,b] is the weight of the tie from community a to community b. If directed is set to False, the array is symmetric.
 
 def communities_as_nodes(nodes_data,
                          edges_data,
                          directed=False,
-                         remove_selfloops=True):
-    nodes = load_data(nodes_data)
-    edges = load_data(edges_data)
-    nodes_dict = {i[0]:i[1] for i in nodes}
-    cmty_edges = []
-    gephi_in = [["Source","Target","Weight","Type"]]
-
-    for i in edges:
+                         remove_selfloops=True,
+                         output_format='GEPHI'):
+    node_index = build_node_index(nodes_data)
+    k = len(node_index.community_ids)
+    with _phase('communities_as_nodes','count') as ph:
+        src,tgt,weights = _coded_edges(node_index,edges_data)
+        in_top = (src >= 0) & (tgt >= 0)
+        pairs,first_seen,pair_ids = np.unique(src[in_top]*k + tgt[in_top],return_index=True,return_inverse=True)
+        if weights is None:
+            pair_cts = np.bincount(pair_ids,minlength=len(pairs))
+        else:
+            pair_cts = np.bincount(pair_ids,weights=weights[in_top],minlength=len(pairs)).astype(np.int64)
+        cmty_cts = collections.Counter() #N of edges between each ordered pair of communities, in order of first occurrence
+        for n in np.argsort(first_seen,kind='stable').tolist():
+            cmty_cts[(node_index.community_ids[pairs[n] // k],node_index.community_ids[pairs[n] % k])] = int(pair_cts[n])
+        ph['rows'] = len(src)
+    logger.info('Community network created.')
+
+    if output_format.upper() == 'MATRIX':
         try:
-            cmty_edges.append([nodes_dict[i[0]],nodes_dict[i[1]]])
-        except KeyError:
-            pass
-            
+            cmty_ids = sorted(node_index.community_ids,key=int)
+        except ValueError:
+            cmty_ids = sorted(node_index.community_ids)
+        adj = np.bincount(pairs,weights=pair_cts,minlength=k*k).astype(np.int64).reshape(k,k)
+        order = [node_index.community_ids.index(i) for i in cmty_ids]
+        adj = adj[np.ix_(order,order)]
+        if directed == False:
+            adj = adj + adj.T
+        if remove_selfloops == True:
+            np.fill_diagonal(adj,0)
+        return cmty_ids,adj
+
+    gephi_in = [["Source","Target","Weight","Type"]]
     if directed == True:
         direction = "Directed"
         cmty_net = nx.DiGraph()
     else:
         direction = "Undirected"
         cmty_net = nx.Graph()
-    cmty_net.add_edges_from(cmty_edges)
-    
+    cmty_net.add_edges_from(cmty_cts)
+
     for i in cmty_net.edges():
-        if remove_selfloops == True:
-            sl_condition = i[0] != i[1]
+        if remove_selfloops == True and i[0] == i[1]:
+            continue
+        if directed == True:
+            cmty_net[i[0]][i[1]]['weight'] = cmty_cts[i]
         else:
-            sl_condition = True
-        if sl_condition == True:
-            if directed == True:
-                cmty_net[i[0]][i[1]]['weight'] = len([n for n in cmty_edges if i[0] == n[0] and i[1] == n[1]])
-            else:
-                cmty_net[i[0]][i[1]]['weight'] = len([n for n in cmty_edges if i[0] == n[0] and i[1] == n[1]]) + len([v for v in cmty_edges if i[1] == v[0] and i[0] == v[1]])
-            gephi_in.append([i[0],i[1],cmty_net[i[0]][i[1]]['weight'],direction])
-            print('Completed edge',i,'.')
-    
+            cmty_net[i[0]][i[1]]['weight'] = cmty_cts[i] + cmty_cts[(i[1],i[0])]
+        gephi_in.append([i[0],i[1],cmty_net[i[0]][i[1]]['weight'],direction])
+
     return gephi_in
@@ -1,19 +1,35 @@
 import tsm
 import unittest
 import unittest.mock as mock
+import collections
+import copy
+import functools
 import io
+import json
+import os
+import random
+import tempfile
+
+try:
+    import bench_tsm
+except ImportError:
+    bench_tsm = None
 
 
 class TestLoadData(unittest.TestCase):
     """
     Test the tsm.load_data function, which has two behaviors:
-     * given anything but a string, return a deep copy of it
+     * given anything but a string, return it as-is (or a deep copy of it)
      * given a string, return a list of lists from CV
     """
 
+    def test_no_copy_by_default(self):
+        original = [1, 2, [3, 4]]
+        self.assertIs(tsm.load_data(original), original)
+
     def test_deep_copy_happens(self):
         original = [1, 2, [3, 4]]
-        loaded = tsm.load_data(original)
+        loaded = tsm.load_data(original, deep_copy=True)
         # Test copy is effective:
         self.assertEqual(original, loaded)
         # Test copy is not by reference:
@@ -52,5 +68,1108 @@ class TestLoadData(unittest.TestCase):
         self.assertEqual(result, [['one', 'two', 'three'], ['1', '2', '3']])
 
 
+def make_partitioned_network(n_nodes=60, n_edges=400, n_cmty=4, seed=1):
+    """
+    Build a small node_list/edgelist pair in the formats exported by
+    get_top_communities and t2e. A few edges point to nodes that are not
+    in the node_list, as happens with real top-k partitions.
+    """
+    rng = random.Random(seed)
+    names = ['user%d' % i for i in range(n_nodes)]
+    node_list = [[name, str(i % n_cmty), '1'] for i, name in enumerate(names)]
+    outsiders = ['outsider%d' % i for i in range(5)]
+    edges = []
+    for _ in range(n_edges):
+        src = rng.choice(names)
+        if rng.random() < 0.6:  # mostly internal ties
+            pool = [n[0] for n in node_list if n[1] == node_list[names.index(src)][1]]
+        else:
+            pool = names + outsiders
+        edges.append([src, rng.choice(pool)])
+    return node_list, edges
+
+
+def reference_ei_counts(node_list, edges, weight_edges=True):
+    """The per-community rescans calc_ei and _get_shared_ties used to do."""
+    top_nodes = {n[0]: n[1] for n in node_list}
+    cmty_ids = set(top_nodes.values())
+    if not weight_edges:
+        edges = [i.split(',') for i in set(e[0] + ',' + e[1] for e in edges)]
+    top_edges = [[e[0], e[1], top_nodes[e[0]], top_nodes[e[1]]]
+                 for e in edges if e[0] in top_nodes and e[1] in top_nodes]
+    ei_int, ei_ext, adj_in, adj_out = {}, {}, {}, {}
+    for i in cmty_ids:
+        ei_int[i] = sum(1 for j in top_edges if j[2] == i and j[3] == i)
+        ei_ext[i] = sum(1 for j in top_edges if (j[2] == i) != (j[3] == i))
+        adj_out[i] = {}
+        adj_in[i] = {}
+        for j in top_edges:
+            if j[2] == i and j[3] != i:
+                adj_out[i][j[3]] = adj_out[i].get(j[3], 0) + 1
+            if j[2] != i and j[3] == i:
+                adj_in[i][j[2]] = adj_in[i].get(j[2], 0) + 1
+    return ei_int, ei_ext, adj_in, adj_out
+
+
+class TestCalcEI(unittest.TestCase):
+    """
+    Test that tsm.calc_ei's single-pass tie matrix reproduces the counts of
+    the per-community edge scans it replaced.
+    """
+
+    def assert_parity(self, weight_edges):
+        node_list, edges = make_partitioned_network()
+        ei = tsm.calc_ei(node_list, edges, weight_edges=weight_edges)
+        ei_int, ei_ext, adj_in, adj_out = reference_ei_counts(
+            node_list, edges, weight_edges)
+        self.assertEqual(dict(ei.internal_ties), ei_int)
+        self.assertEqual(dict(ei.external_ties), ei_ext)
+        self.assertEqual(dict(ei.adj_in), adj_in)
+        self.assertEqual(dict(ei.adj_out), adj_out)
+        for i in ei_int:
+            self.assertEqual(ei.total_ties[i], ei_int[i] + ei_ext[i])
+            self.assertEqual(ei.received_ties[i], sum(adj_in[i].values()))
+            self.assertEqual(ei.sent_ties[i], sum(adj_out[i].values()))
+            self.assertEqual(ei.ei_indices[i], round(
+                (ei_ext[i] - ei_int[i]) / (ei_ext[i] + ei_int[i]), 3))
+
+    def test_weighted_parity(self):
+        self.assert_parity(weight_edges=True)
+
+    def test_unweighted_parity(self):
+        self.assert_parity(weight_edges=False)
+
+    def test_counts_are_plain_ints(self):
+        node_list, edges = make_partitioned_network()
+        ei = tsm.calc_ei(node_list, edges)
+        for i in ei.internal_ties:
+            self.assertIs(type(ei.internal_ties[i]), int)
+            self.assertIs(type(ei.external_ties[i]), int)
+
+
+def reference_shared_ties_grid(ei, rec_sent, calc_propor, invert):
+    """The cell-by-cell loops shared_ties_grid used to run."""
+    ids = sorted(ei.adj_in, key=int)
+    rows = [['']+[int(i) for i in ids]]
+    for i in ids:
+        row = [int(i)]
+        for j in ids:
+            if i == j:
+                value = ei.internal_ties[i]
+            else:
+                value = ((ei.adj_in[i].get(j, 0) if rec_sent != 'SENT' else 0) +
+                         (ei.adj_out[i].get(j, 0) if rec_sent != 'REC' else 0))
+            if calc_propor:
+                value = round(value / ei.total_ties[i], 3)
+            if invert:
+                value = 0 if i == j else (format(1 / value, 'f') if value else 1)
+            row.append(value)
+        rows.append(row)
+    return rows
+
+
+class TestSharedTiesGrid(unittest.TestCase):
+    """
+    Test that tsm.shared_ties_grid's array version gives the same grids as
+    the cell-by-cell loops it replaced.
+    """
+
+    def setUp(self):
+        node_list, edges = make_partitioned_network(n_cmty=12)
+        self.ei = tsm.calc_ei(node_list, edges)
+
+    def test_list_output_unchanged(self):
+        for rec_sent in ('REC', 'SENT', 'ALL'):
+            for calc_propor in (False, True):
+                for invert in (False, True):
+                    self.assertEqual(
+                        tsm.shared_ties_grid(self.ei, rec_sent.lower(),
+                                             calc_propor, invert),
+                        reference_shared_ties_grid(self.ei, rec_sent,
+                                                   calc_propor, invert))
+
+    def test_array_output(self):
+        grid = tsm.shared_ties_grid(self.ei, calc_propor=True)
+        cells, labels = tsm.shared_ties_grid(self.ei, calc_propor=True,
+                                             as_array=True)
+        self.assertEqual(labels.tolist(), grid[0][1:])
+        self.assertEqual(cells.round(3).tolist(), [i[1:] for i in grid[1:]])
+        inverted, labels = tsm.shared_ties_grid(self.ei, 'REC', invert=True,
+                                                as_array=True)
+        counts = tsm.shared_ties_grid(self.ei, 'REC', as_array=True)[0]
+        off_diagonal = ~tsm.np.eye(len(labels), dtype=bool)
+        self.assertTrue(tsm.np.allclose(
+            (inverted * counts)[off_diagonal & (counts > 0)], 1))
+        self.assertTrue((inverted.diagonal() == 0).all())
+
+
+class TestEIAccumulator(unittest.TestCase):
+    """
+    Test that tsm.eiAccumulator snapshots match tsm.calc_ei run on all
+    edges added and not yet removed.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=900)
+
+    def test_batches_match_calc_ei(self):
+        for weight_edges in (True, False):
+            acc = tsm.eiAccumulator(self.node_list, weight_edges)
+            for n in range(0, 900, 200):
+                acc.add_edges(iter(self.edges[n:n + 200]))
+            self.assertEqual(
+                vars(acc.snapshot()),
+                vars(tsm.calc_ei(self.node_list, self.edges,
+                                 weight_edges=weight_edges)))
+            self.assertEqual(acc.n_edges, 900)
+
+    def test_removal_matches_calc_ei(self):
+        for weight_edges in (True, False):
+            acc = tsm.eiAccumulator(self.node_list, weight_edges)
+            acc.add_edges(self.edges[:600])
+            acc.add_edges(self.edges[600:])
+            acc.remove_edges(self.edges[:300])
+            self.assertEqual(
+                vars(acc.snapshot(all_output=False)),
+                vars(tsm.calc_ei(self.node_list, self.edges[300:],
+                                 all_output=False,
+                                 weight_edges=weight_edges)))
+
+    def test_weighted_edgelist(self):
+        weighted = [[s, t, str(ct)] for s, t, ct
+                    in tsm._collapse_edges(self.edges)]
+        acc = tsm.eiAccumulator(self.node_list)
+        acc.add_edges(weighted)
+        self.assertEqual(vars(acc.snapshot()),
+                         vars(tsm.calc_ei(self.node_list, self.edges)))
+
+
+class TestMatchCommunities(unittest.TestCase):
+    """
+    Test tsm.match_communities' Jaccard values and convergence detection,
+    which are computed from a sparse overlap matrix.
+    """
+
+    nodesA = [['a', '1', '4'], ['b', '1', '2'], ['c', '1', '1'],
+              ['d', '2', '3'], ['e', '2', '1']]
+    nodesB = [['a', '7', '2'], ['b', '7', '1'], ['d', '7', '1'],
+              ['e', '8', '5'], ['f', '8', '1']]
+
+    def test_weighted_jaccard(self):
+        match = tsm.match_communities(self.nodesA, self.nodesB, 1.0, 0.3,
+                                      0.2, weight_edges=True)
+        # A1 x B7 shares a and b: (4+2+2+1) / (4+2+1+2+1+3+1)
+        self.assertEqual(match.nonzero_jaccs['1'], {'7': round(9 / 14, 4)})
+        self.assertEqual(match.best_matches['1x7'], round(9 / 14, 4))
+        self.assertEqual(match.shared_nodes['1x7'], {'a', 'b'})
+
+    def test_unweighted_jaccard(self):
+        match = tsm.match_communities(self.nodesA, self.nodesB, 1.0, 0.3,
+                                      0.2, weight_edges=False)
+        self.assertEqual(match.nonzero_jaccs['2'], {'7': 0.25, '8': 0.3333})
+        self.assertEqual(match.divergences['2'], ['8', '7'])
+
+    def test_convergence(self):
+        match = tsm.match_communities(self.nodesA, self.nodesB, 1.0, 0.3,
+                                      0.2, weight_edges=False)
+        self.assertEqual(list(match.convergences), ['7'])
+        self.assertEqual(sorted(match.convergences['7']), ['1', '2'])
+
+
+class TestGetIntermediaries(unittest.TestCase):
+    """
+    Test tsm.get_intermediaries, which looks up each node's in-edges in a
+    reverse adjacency index built by tsm.build_in_index.
+    """
+
+    nodes = [['hub', '1', '5'], ['a', '1', '0'], ['b', '1', '0'],
+             ['c', '2', '0'], ['d', '2', '0']]
+    edges = [['a', 'hub'], ['b', 'hub'], ['c', 'hub'], ['d', 'hub'],
+             ['outsider', 'hub'], ['a', 'b'], ['c', 'd'], ['a', 'hub']]
+
+    def test_finds_bridge(self):
+        bridges = tsm.get_intermediaries(self.nodes, self.edges, 0.5, 1.0)
+        self.assertEqual(len(bridges), 1)
+        total, name, cmty_rts = bridges[0]
+        self.assertEqual((total, name), (5, 'hub'))
+        self.assertEqual(list(cmty_rts.items()), [('1', 3), ('2', 2)])
+
+    def test_index_reused_across_calls(self):
+        in_index = tsm.build_in_index(self.edges)
+        for threshold in (0, 0.5, 0.9):
+            self.assertEqual(
+                tsm.get_intermediaries(self.nodes, in_index, threshold, 1.0),
+                tsm.get_intermediaries(self.nodes, self.edges, threshold, 1.0))
+
+    def test_all_nodes_matches_full_filter(self):
+        node_list, edges = make_partitioned_network(n_edges=1500)
+        in_index = tsm.build_in_index(edges)
+        for threshold in (0, 0.3, 0.5):
+            self.assertEqual(
+                tsm.get_intermediaries(node_list, in_index, threshold, 0.01,
+                                       all_nodes=True),
+                tsm.get_intermediaries(node_list, in_index, threshold, 1.0))
+
+    def test_in_index_groups_senders_by_recipient(self):
+        in_index = tsm.build_in_index(self.edges)
+        hub = in_index.node_ids['hub']
+        senders = in_index.senders[in_index.indptr[hub]:in_index.indptr[hub + 1]]
+        self.assertEqual([in_index.names[i] for i in senders],
+                         ['a', 'b', 'c', 'd', 'outsider', 'a'])
+
+
+class TestTweetCorpus(unittest.TestCase):
+    """
+    Test that tsm.tweetCorpus indexes tweets in one pass and that
+    get_top_hashtags, get_top_links and get_top_rts give the same results
+    when querying it as when reading the tweets themselves.
+    """
+
+    def setUp(self):
+        self.nodes = [['a', '1', '3'], ['b', '1', '2'], ['c', '2', '1']]
+        self.tweets = [
+            ['A', 'RT @b: see http://www.x.com/p?s=1 #Go #go'],
+            ['b', 'RT @b: see http://www.x.com/p?s=1 #Go #go'],
+            ['b', 'rt @B: see https://www.x.com/p?s=2 #go'],
+            ['c', 'RT @c: #other http://y.org/'],
+            ['d', 'RT @a: #go http://y.org'],
+            ['', '#go']]
+
+    def test_counts(self):
+        corpus = tsm.tweetCorpus(self.tweets, self.nodes)
+        self.assertEqual(corpus.n_tweets, 6)
+        self.assertEqual(corpus.hashtags,
+                         {'1': {'#go': 3}, '2': {'#other': 1}})
+        self.assertEqual(tsm.get_top_hashtags(corpus, min_ct=1),
+                         {'1': (('#go', 3),), '2': (('#other', 1),)})
+        self.assertEqual(
+            tsm.get_top_links(corpus, min_ct=1, remove_3ld=True),
+            {'1': (('x.com/p', 3),), '2': (('y.org/', 1),)})
+        self.assertEqual(
+            tsm.get_top_links(corpus, min_ct=1, domains_only=True),
+            {'1': (('www.x.com', 3),), '2': (('y.org', 1),)})
+        self.assertEqual(tsm.get_top_rts(corpus, min_rts=1), [
+            ['b', 'RT @b: see http://www.x.com/p?s=1 #Go #go', '1', 2],
+            ['c', 'RT @c: #other http://y.org/', '2', 1],
+            ['a', 'RT @a: #go http://y.org', '1', 1]])
+        self.assertEqual(tsm.get_top_rts(corpus, min_rts=2, lc=True),
+                         [['b', 'rt @b: see http://www.x.com/p?s=1 #go #go',
+                           '1', 2]])
+
+    def test_empty_rows_skipped(self):
+        tweets = self.tweets[:2] + [[]] + self.tweets[2:]
+        for kwargs in ({}, {'workers': 2}):
+            corpus = tsm.tweetCorpus(tweets, self.nodes, **kwargs)
+            self.assertEqual(corpus.n_tweets, 6)
+            self.assertEqual(corpus.hashtags,
+                             tsm.tweetCorpus(self.tweets, self.nodes).hashtags)
+        self.assertEqual(tsm.get_top_hashtags(tweets, self.nodes, 1),
+                         tsm.get_top_hashtags(self.tweets, self.nodes, 1))
+        self.assertEqual(tsm.get_top_links(tweets, self.nodes, 1),
+                         tsm.get_top_links(self.tweets, self.nodes, 1))
+
+    def test_analyses(self):
+        corpus = tsm.tweetCorpus(self.tweets, self.nodes, analyses=['links'])
+        self.assertEqual((corpus.hashtags, corpus.domains, corpus.rts),
+                         ({}, {}, {}))
+        self.assertEqual(tsm.get_top_links(corpus, min_ct=3),
+                         {'1': (('www.x.com/p', 3),)})
+        for query in (corpus.top_hashtags, corpus.top_rts,
+                      functools.partial(corpus.top_links, domains_only=True)):
+            self.assertRaises(ValueError, query)
+
+    @unittest.skipIf(bench_tsm is None, 'bench_tsm could not be imported')
+    def test_matches_file_queries(self):
+        src, tgt, cmty = bench_tsm.synthetic_network(3000)
+        nodes = bench_tsm.synthetic_node_list(src, tgt, cmty)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tweets.csv')
+            bench_tsm.synthetic_tweets(path, src, tgt, cmty)
+            expected = [tsm.get_top_hashtags(path, nodes, 2),
+                        tsm.get_top_links(path, nodes, 2, True, True),
+                        tsm.get_top_rts(path, nodes, min_rts=2),
+                        tsm.get_top_rts(path, min_rts=2, lc=True)]
+            corpus = tsm.tweetCorpus(path, nodes)
+            unpartitioned = tsm.tweetCorpus(path)
+        self.assertEqual([tsm.get_top_hashtags(corpus, min_ct=2),
+                          tsm.get_top_links(corpus, '', 2, True, True),
+                          tsm.get_top_rts(corpus, min_rts=2),
+                          tsm.get_top_rts(unpartitioned, min_rts=2, lc=True)],
+                         expected)
+        self.assertGreater(len(expected[2]), 0)
+
+    @unittest.skipIf(bench_tsm is None, 'bench_tsm could not be imported')
+    def test_workers_match_serial(self):
+        src, tgt, cmty = bench_tsm.synthetic_network(3000)
+        nodes = bench_tsm.synthetic_node_list(src, tgt, cmty)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tweets.csv')
+            bench_tsm.synthetic_tweets(path, src, tgt, cmty)
+            rows = tsm.load_data(path)
+            for data in (path, rows):
+                serial = tsm.tweetCorpus(data, nodes)
+                pooled = tsm.tweetCorpus(data, nodes, workers=3)
+                self.assertEqual(pooled.n_tweets, serial.n_tweets)
+                self.assertEqual(pooled.top_hashtags(1), serial.top_hashtags(1))
+                self.assertEqual(pooled.top_links(1, True),
+                                 serial.top_links(1, True))
+                self.assertEqual(pooled.top_links(1), serial.top_links(1))
+                self.assertEqual(pooled.top_rts(1), serial.top_rts(1))
+            self.assertEqual(tsm.get_top_rts(path, nodes, min_rts=2, workers=2),
+                             tsm.get_top_rts(path, nodes, min_rts=2))
+
+
+class TestSpaceSaving(unittest.TestCase):
+    """
+    Test the error guarantees of tsm.spaceSaving summaries, alone and
+    merged, and the approximate counting mode of tsm.tweetCorpus.
+    """
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.stream = [int(rng.paretovariate(0.8)) for _ in range(20000)]
+        self.true = collections.Counter(self.stream)
+
+    def assertGuarantees(self, summary):
+        self.assertEqual(summary.n, len(self.stream))
+        self.assertLessEqual(len(summary.counts), summary.capacity)
+        for item, count in summary.items():
+            self.assertLessEqual(count - summary.errors[item], self.true[item])
+            self.assertGreaterEqual(count, self.true[item])
+        for item in self.true:
+            if self.true[item] > summary.n / summary.capacity:
+                self.assertIn(item, summary.counts)
+
+    def test_guarantees(self):
+        summary = tsm.spaceSaving(50)
+        summary.update(self.stream)
+        self.assertGuarantees(summary)
+        self.assertEqual([i for i, c in summary.most_common()[:5]],
+                         [i for i, c in self.true.most_common(5)])
+
+    def test_merge(self):
+        shards = [tsm.spaceSaving(50) for _ in range(3)]
+        for n, item in enumerate(self.stream):
+            shards[n % 3].add(item)
+        merged = shards[0]
+        for shard in shards[1:]:
+            merged.merge(shard)
+        self.assertGuarantees(merged)
+
+    def test_capacity_in_top_functions(self):
+        tweets = [['a', 'RT @b: hi #x'], ['b', 'RT @b: hi #x'],
+                  ['a', 'RT @a: yo #y'], ['b', 'RT @a: ok']]
+        nodes = [['a', '1', '1'], ['b', '1', '1']]
+        # 'RT @a: ok' evicts 'RT @a: yo #y' and inherits its count as error
+        self.assertEqual(tsm.get_top_rts(tweets, nodes, min_rts=2,
+                                         capacity=2),
+                         [['b', 'RT @b: hi #x', '1', 2, 0],
+                          ['a', 'RT @a: ok', '1', 2, 1]])
+        self.assertEqual(tsm.get_top_hashtags(tweets, nodes, 1, capacity=5),
+                         {'1': (('#x', 2, 0), ('#y', 1, 0))})
+
+    def test_merge_corpora(self):
+        tweets = [['u%d' % (i % 7), 'RT @u%d: %s #t%d http://x.com/%d'
+                   % (i % 3, 'ab'[i % 2], i % 4, i % 5)] for i in range(60)]
+        nodes = [['u%d' % i, str(i % 2), '1'] for i in range(7)]
+        whole = tsm.tweetCorpus(tweets, nodes)
+        merged = tsm.tweetCorpus(tweets[:25], nodes)
+        merged.merge(tsm.tweetCorpus(tweets[25:], nodes))
+        self.assertEqual(merged.n_tweets, whole.n_tweets)
+        self.assertEqual(merged.top_rts(1), whole.top_rts(1))
+        self.assertEqual(merged.top_hashtags(1), whole.top_hashtags(1))
+        self.assertEqual(merged.top_links(1, True), whole.top_links(1, True))
+
+
+class TestCommunitiesAsNodes(unittest.TestCase):
+    """
+    Test tsm.communities_as_nodes' community-pair weights in both output
+    formats.
+    """
+
+    nodes = [['a', '1', '0'], ['b', '1', '0'], ['c', '2', '0'],
+             ['d', '3', '0']]
+    edges = [['a', 'c'], ['b', 'c'], ['c', 'a'], ['a', 'b'], ['d', 'a'],
+             ['x', 'a']]
+
+    def test_undirected_gephi_rows(self):
+        rows = tsm.communities_as_nodes(self.nodes, self.edges)
+        self.assertEqual(rows, [['Source', 'Target', 'Weight', 'Type'],
+                                ['1', '2', 3, 'Undirected'],
+                                ['1', '3', 1, 'Undirected']])
+
+    def test_directed_gephi_rows(self):
+        rows = tsm.communities_as_nodes(self.nodes, self.edges, directed=True,
+                                        remove_selfloops=False)
+        self.assertEqual(rows[1:], [['1', '2', 2, 'Directed'],
+                                    ['1', '1', 1, 'Directed'],
+                                    ['2', '1', 1, 'Directed'],
+                                    ['3', '1', 1, 'Directed']])
+
+    def test_matrix_output(self):
+        cmty_ids, adj = tsm.communities_as_nodes(self.nodes, self.edges,
+                                                 directed=True,
+                                                 output_format='MATRIX')
+        self.assertEqual(cmty_ids, ['1', '2', '3'])
+        self.assertEqual(adj.tolist(), [[0, 2, 0], [1, 0, 0], [1, 0, 0]])
+
+
+class TestT2E(unittest.TestCase):
+    """
+    Test tsm.t2e's extraction modes and its streaming variants.
+    """
+
+    tweets = [['Alice', 'RT @bob: hi @carol'],
+              ['bob', '@alice thanks! cc @dave_1'],
+              ['carol', 'no mentions here'],
+              ['dave_1', 'email me at x@example.com'],
+              ['alice', 'RT @alice: self-retweet'],
+              ['eve', 'x']]
+
+    def test_all(self):
+        self.assertEqual(tsm.t2e(self.tweets),
+                         [['alice', 'bob'], ['alice', 'carol'],
+                          ['bob', 'alice'], ['bob', 'dave_1'],
+                          ['dave_1', 'example'], ['alice', 'alice']])
+
+    def test_rts_only(self):
+        self.assertEqual(tsm.t2e(self.tweets, 'RTS_ONLY'), [['alice', 'bob']])
+        self.assertEqual(tsm.t2e(self.tweets, 'rts_only'), [['alice', 'bob']])
+
+    def test_at_mentions_only(self):
+        self.assertEqual(tsm.t2e(self.tweets, 'AT_MENTIONS_ONLY'),
+                         [['bob', 'alice'], ['bob', 'dave_1'],
+                          ['dave_1', 'example']])
+
+    def test_replies_only(self):
+        self.assertEqual(tsm.t2e(self.tweets, 'REPLIES_ONLY'),
+                         [['bob', 'alice'], ['bob', 'dave_1']])
+
+    def test_stream_returns_generator(self):
+        edges = tsm.t2e(self.tweets, stream=True)
+        self.assertNotIsInstance(edges, list)
+        self.assertEqual(list(edges), tsm.t2e(self.tweets))
+
+    def test_stream_writes_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, 'out')
+            outfile = tsm.t2e(self.tweets, save_prefix=prefix, stream=True,
+                              chunk_size=2)
+            self.assertEqual(outfile, prefix + '_edgelist.csv')
+            self.assertEqual(tsm.load_data(outfile), tsm.t2e(self.tweets))
+
+    def test_multi_matches_single_modes(self):
+        modes = ['ALL', 'rts_only', 'AT_MENTIONS_ONLY', 'REPLIES_ONLY']
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, 'out')
+            edgelists = tsm.t2e_multi(self.tweets, modes, save_prefix=prefix)
+            for mode in modes:
+                expected = tsm.t2e(self.tweets, mode)
+                self.assertEqual(edgelists[mode.upper()], expected)
+                saved = '%s_%s_edgelist.csv' % (prefix, mode.upper())
+                self.assertEqual(tsm.load_data(saved), expected)
+        self.assertIsNot(edgelists['ALL'][2], edgelists['AT_MENTIONS_ONLY'][0])
+
+    def test_parallel_matches_serial(self):
+        tweets = self.tweets[:-1] * 20 + [['zed', '"quoted\n@multi, line"']]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tweets.csv')
+            tsm.save_csv(path, tweets, use_quotes=True, verbose=False)
+            for extmode in ('ALL', 'RTS_ONLY', 'AT_MENTIONS_ONLY'):
+                serial = tsm.t2e(path, extmode)
+                self.assertEqual(tsm.t2e_parallel(path, extmode, workers=2,
+                                                  n_shards=7), serial)
+                self.assertEqual(tsm.t2e_parallel([path, path], extmode,
+                                                  workers=2), serial * 2)
+            with mock.patch.object(tsm.concurrent.futures,
+                                   'ProcessPoolExecutor') as pool:
+                self.assertEqual(tsm.t2e_parallel([path, path], workers=1),
+                                 tsm.t2e(path) * 2)
+            pool.assert_not_called()
+
+    def test_shard_offsets_respect_quoted_line_breaks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tweets.csv')
+            with open(path, 'w', newline='') as f:
+                f.write('a,"one\ntwo\nthree"\nb,four\n')
+            self.assertEqual(tsm._csv_shard_offsets(path, 4), [0, 18, 25])
+
+
+class TestWeightedEdgelists(unittest.TestCase):
+    """
+    Test that the source,target,weight edgelists produced by
+    tsm.t2e(weighted=True) give the same results as the plain edgelists
+    they were collapsed from.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=800)
+        # weights are strings when an edgelist is loaded from CSV
+        self.weighted = [[src, tgt, str(ct)] for src, tgt, ct
+                         in tsm._collapse_edges(self.edges)]
+
+    def test_t2e_collapses_duplicates(self):
+        tweets = [['a', '@b @c'], ['b', '@a'], ['a', 'hi @b']]
+        self.assertEqual(tsm.t2e(tweets, weighted=True),
+                         [['a', 'b', 2], ['a', 'c', 1], ['b', 'a', 1]])
+
+    def test_calc_ei(self):
+        for weight_edges in (True, False):
+            plain = tsm.calc_ei(self.node_list, self.edges,
+                                weight_edges=weight_edges)
+            weighted = tsm.calc_ei(self.node_list, self.weighted,
+                                   weight_edges=weight_edges)
+            self.assertEqual(vars(plain), vars(weighted))
+
+    def test_communities_as_nodes(self):
+        for directed in (True, False):
+            self.assertEqual(
+                tsm.communities_as_nodes(self.node_list, self.edges, directed),
+                tsm.communities_as_nodes(self.node_list, self.weighted,
+                                         directed))
+
+    def test_get_intermediaries(self):
+        for all_nodes in (True, False):
+            self.assertEqual(
+                tsm.get_intermediaries(self.node_list, self.edges, 0.3, 1.0,
+                                       all_nodes=all_nodes),
+                tsm.get_intermediaries(self.node_list, self.weighted, 0.3,
+                                       1.0, all_nodes=all_nodes))
+
+    def test_get_top_communities(self):
+        lo = tsm.get_top_communities(self.weighted, 1.0)
+        self.assertEqual(sum(lo.n_nodes.values()), len(lo.node_list))
+        self.assertEqual(lo.edge_propor, 100.0)
+
+
+class TestCommunityEngines(unittest.TestCase):
+    """
+    Test the engines tsm.get_top_communities can use to detect
+    communities on a benchmark graph with a planted partition.
+    """
+
+    def setUp(self):
+        graph = tsm.nx.planted_partition_graph(4, 50, 0.2, 0.01, seed=3,
+                                               directed=True)
+        self.edges = [['n%d' % a, 'n%d' % b] for a, b in graph.edges()]
+        self.planted = {'n%d' % i: i // 50 for i in range(200)}
+
+    def test_modularity_matches_python_louvain(self):
+        edges = [e + [str(random.Random(i).randint(1, 5))]
+                 for i, e in enumerate(self.edges)] + [['n0', 'n0', '3']]
+        names, u, v, w = tsm._undirected_edges(edges, tsm._edge_weights(edges))
+        graph = tsm._networkx_graph(len(names), u, v, w)
+        rng = random.Random(0)
+        for labels in ([self.planted[n] for n in names],
+                       [rng.randint(0, 5) for n in names]):
+            self.assertAlmostEqual(
+                tsm._modularity(tsm.np.array(labels), u, v, w),
+                tsm.community.modularity(dict(enumerate(labels)), graph))
+
+    def test_engines_recover_planted_partition(self):
+        names, u, v, w = tsm._undirected_edges(self.edges, None)
+        planted_q = tsm._modularity(
+            tsm.np.array([self.planted[n] for n in names]), u, v, w)
+        for engine in tsm._COMMUNITY_ENGINES:
+            if engine == 'networkx' and not hasattr(
+                    tsm.nx.algorithms.community, 'louvain_communities'):
+                continue  # needs NetworkX 2.8 or later
+            lo = tsm.get_top_communities(self.edges, 1.0, engine=engine,
+                                         seed=1)
+            self.assertEqual(lo.n_communities, 4, engine)
+            self.assertGreaterEqual(lo.modularity, round(planted_q, 2) - 0.01,
+                                    engine)
+
+    def test_seed_is_reproducible(self):
+        for engine in ('louvain', 'array_louvain', 'label_propagation'):
+            first = tsm.get_top_communities(self.edges, engine=engine, seed=7)
+            second = tsm.get_top_communities(self.edges, engine=engine, seed=7)
+            self.assertEqual(first.node_list, second.node_list)
+
+    def test_custom_engine(self):
+        def one_community(n_nodes, u, v, w, seed):
+            return [5] * n_nodes
+        lo = tsm.get_top_communities(self.edges, engine=one_community)
+        self.assertEqual(lo.n_communities, 1)
+        self.assertEqual(lo.n_nodes, {'0': 200})
+        self.assertEqual(lo.modularity, 0.0)
+
+    def test_ensemble_keeps_best_run(self):
+        lo = tsm.get_top_communities(self.edges, 1.0, engine='array_louvain',
+                                     seed=2, n_runs=5, workers=1)
+        names, u, v, w = tsm._undirected_edges(self.edges, None)
+        runs = [tsm._modularity(tsm._renumber_labels(
+                    tsm._array_louvain_engine(len(names), u, v, w, s)),
+                    u, v, w) for s in range(5)]
+        self.assertGreaterEqual(lo.modularity, round(min(runs), 2))
+        self.assertEqual(set(lo.stability), set(self.planted))
+        self.assertTrue(all(0 <= i <= 1 for i in lo.stability.values()))
+
+    def test_ensemble_pool_matches_serial(self):
+        serial = tsm.get_top_communities(self.edges, engine='label_propagation',
+                                         seed=4, n_runs=3, workers=1)
+        pooled = tsm.get_top_communities(self.edges, engine='label_propagation',
+                                         seed=4, n_runs=3, workers=2)
+        self.assertEqual(vars(serial), vars(pooled))
+
+    def test_consensus_recovers_planted_partition(self):
+        lo = tsm.get_top_communities(self.edges, 1.0, engine='array_louvain',
+                                     seed=3, n_runs=4, consensus=True,
+                                     workers=1)
+        self.assertEqual(lo.n_communities, 4)
+        found = {}
+        for name, cmty, score in lo.node_list:
+            found.setdefault(self.planted[name], set()).add(cmty)
+        self.assertTrue(all(len(i) == 1 for i in found.values()))
+
+    def test_connected_components(self):
+        labels = tsm._connected_components(6, tsm.np.array([0, 2, 4]),
+                                           tsm.np.array([3, 5, 2]))
+        self.assertEqual(labels.tolist(), [0, 1, 2, 0, 2, 2])
+
+
+class TestProminenceMetrics(unittest.TestCase):
+    """
+    Test that the built-in prominence metrics of tsm.get_top_communities
+    match the NetworkX metrics they replace.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network()
+        self.run = functools.partial(tsm.get_top_communities, top_comm=3,
+                                     engine='array_louvain', seed=2)
+
+    def values(self, metric, edges, **kwargs):
+        return {n[0]: float(n[2]) for n in
+                self.run(edges, prominence_metric=metric, **kwargs).node_list}
+
+    def assertValuesEqual(self, metric, edges, nx_metric, **kwargs):
+        expected = self.values(nx_metric, edges)
+        actual = self.values(metric, edges, **kwargs)
+        self.assertEqual(expected.keys(), actual.keys())
+        for n in expected:
+            self.assertAlmostEqual(actual[n], expected[n])
+
+    def test_degrees_rank_as_before(self):
+        for metric in ('in_degree', 'out_degree'):
+            self.assertEqual(
+                self.run(self.edges, prominence_metric=metric).node_list,
+                self.run(self.edges, prominence_metric=lambda g:
+                         getattr(g, metric)()).node_list)
+
+    def test_weighted_metrics_match_networkx(self):
+        weighted = tsm._collapse_edges(self.edges)
+        pagerank = tsm.nx.algorithms.link_analysis.pagerank_alg._pagerank_python
+        self.assertValuesEqual('weighted_in_degree', weighted,
+                               lambda g: g.in_degree(weight='weight'))
+        self.assertValuesEqual('pagerank', weighted, pagerank)
+        self.assertValuesEqual('eigenvector', weighted,
+                               functools.partial(tsm.nx.eigenvector_centrality,
+                                                 weight='weight'))
+        # Unweighted edgelists give the same values as their collapsed form
+        names = sorted({n for e in self.edges for n in e})
+        weights = tsm.np.array([float(e[2]) for e in weighted])
+        for metric in tsm._PROMINENCE_METRICS:
+            self.assertEqual(
+                tsm._array_prominence(metric, names, self.edges, None,
+                                      random.Random(0), 1000),
+                tsm._array_prominence(metric, names, weighted, weights,
+                                      random.Random(0), 1000))
+
+    def test_betweenness(self):
+        self.assertValuesEqual('betweenness', self.edges,
+                               tsm.nx.betweenness_centrality)
+        sampled = self.values('betweenness', self.edges, betweenness_samples=10)
+        exact = self.values(tsm.nx.betweenness_centrality, self.edges)
+        top = max(exact, key=exact.get)
+        self.assertGreater(sampled[top], 0)
+
+    def test_digraph_not_built(self):
+        with mock.patch.object(tsm.nx, 'DiGraph') as digraph:
+            self.run(self.edges, prominence_metric='pagerank')
+        digraph.assert_not_called()
+
+
+class TestTrackCommunities(unittest.TestCase):
+    """
+    Test tsm.track_communities on daily batches of edges drawn from the
+    same planted partition.
+    """
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.batches = []
+        for day in range(5):
+            batch = []
+            for _ in range(600):
+                src = rng.randrange(120)
+                if rng.random() < 0.9:
+                    tgt = src // 30 * 30 + rng.randrange(30)
+                else:
+                    tgt = rng.randrange(120)
+                batch.append(['u%d' % src, 'u%d' % tgt])
+            self.batches.append(batch)
+
+    def test_lineages_follow_planted_communities(self):
+        tr = tsm.track_communities(iter(self.batches), 3, engine='array_louvain',
+                                   seed=1, nodes_filter=0.5)
+        self.assertEqual(len(tr.windows), 3)
+        self.assertEqual(len(tr.matches), 2)
+        self.assertEqual(len(tr.lineages), 4)
+        for lineage in tr.lineages.values():
+            self.assertEqual([i[0] for i in lineage], [0, 1, 2])
+            members = [set(n[0] for n in tr.windows[w].node_list if n[1] == c)
+                       for w, c in lineage]
+            self.assertEqual(members[0], members[1])
+            self.assertEqual(members[1], members[2])
+
+    def test_window_matches_cold_run(self):
+        tr = tsm.track_communities(self.batches, 3, engine='array_louvain',
+                                   seed=1, warm_start=False)
+        cold = tsm.get_top_communities(
+            tsm._collapse_edges(sum(self.batches[2:], [])),
+            engine='array_louvain', seed=1, randomize=False)
+        last = tr.windows[-1]
+        self.assertEqual(last.modularity, cold.modularity)
+        self.assertEqual(sorted(last.n_nodes.values()),
+                         sorted(cold.n_nodes.values()))
+
+    def test_warm_start(self):
+        lo = tsm.get_top_communities(self.batches[0], engine='array_louvain',
+                                     seed=1)
+        for engine in ('louvain', 'array_louvain', 'label_propagation'):
+            warm = tsm.get_top_communities(self.batches[1], engine=engine,
+                                           seed=1, init_partition=lo)
+            self.assertEqual(warm.n_communities, 4, engine)
+
+    def test_fewer_batches_than_window(self):
+        tr = tsm.track_communities(self.batches[:2], 3, engine='array_louvain',
+                                   seed=1)
+        self.assertEqual(len(tr.windows), 1)
+        self.assertEqual(tr.matches, [])
+        self.assertEqual(sorted(tr.lineages), list(range(len(tr.windows[0].n_nodes))))
+
+
+class TestBuildNodeIndex(unittest.TestCase):
+    """
+    Test tsm.build_node_index and that the functions accepting its output
+    in place of a node list give the same results.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=800)
+
+    def test_index_attributes(self):
+        node_index = tsm.build_node_index(
+            [['name', 'community', 'in_degree'], ['B', '3', '9'],
+             ['a', '1', '4'], ['c', '3', '2']], lowercase=True)
+        self.assertEqual(node_index.names, ['b', 'a', 'c'])
+        self.assertEqual(node_index.node_ids, {'b': 0, 'a': 1, 'c': 2})
+        self.assertEqual(node_index.community_ids, ['3', '1'])
+        self.assertEqual(node_index.communities.tolist(), [0, 1, 0])
+        self.assertEqual(node_index.scores, ['9', '4', '2'])
+
+    def test_index_from_edges(self):
+        node_index = tsm.build_node_index([['a', 'b'], ['b', 'c']],
+                                          from_edges=True)
+        self.assertEqual(node_index.names, ['a', 'b', 'c'])
+        self.assertEqual(node_index.communities.tolist(), [-1, -1, -1])
+
+    def test_index_accepted_in_place_of_node_list(self):
+        node_index = tsm.build_node_index(self.node_list)
+        self.assertEqual(vars(tsm.calc_ei(node_index, self.edges)),
+                         vars(tsm.calc_ei(self.node_list, self.edges)))
+        self.assertEqual(
+            tsm.get_intermediaries(node_index, self.edges, 0.3, 0.5),
+            tsm.get_intermediaries(self.node_list, self.edges, 0.3, 0.5))
+        self.assertEqual(
+            tsm.communities_as_nodes(node_index, self.edges),
+            tsm.communities_as_nodes(self.node_list, self.edges))
+        self.assertEqual(
+            vars(tsm.match_communities(node_index, node_index, 0.5)),
+            vars(tsm.match_communities(self.node_list, self.node_list, 0.5)))
+
+
+class TestEdgeStore(unittest.TestCase):
+    """
+    Test tsm.save_edge_store/tsm.load_edge_store and that edge-consuming
+    functions give the same results on an edge store as on the edgelist.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=800)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        store = tsm.save_edge_store(self.edges, self.path)
+        self.assertEqual(store.src.dtype, 'int32')
+        self.assertIsNone(store.weights)
+        self.assertEqual(tsm._load_edges(self.path), self.edges)
+        weighted = tsm._collapse_edges(self.edges)
+        store = tsm.save_edge_store(weighted, self.path)
+        self.assertEqual(tsm._load_edges(store), weighted)
+
+    def test_partly_weighted_rejected(self):
+        with self.assertRaises(ValueError):
+            tsm.save_edge_store([['a', 'b', '2'], ['b', 'c']], self.path)
+
+    def test_csr_index_lists_out_edges(self):
+        store = tsm.save_edge_store(self.edges, self.path)
+        node = store.names.index('user3')
+        out_edges = store.order[store.indptr[node]:store.indptr[node + 1]]
+        self.assertEqual([store.names[i] for i in store.tgt[out_edges]],
+                         [e[1] for e in self.edges if e[0] == 'user3'])
+
+    def test_functions_accept_store(self):
+        store = tsm.save_edge_store(self.edges, self.path)
+        for weight_edges in (True, False):
+            self.assertEqual(
+                vars(tsm.calc_ei(self.node_list, store,
+                                 weight_edges=weight_edges)),
+                vars(tsm.calc_ei(self.node_list, self.edges,
+                                 weight_edges=weight_edges)))
+        self.assertEqual(
+            tsm.get_intermediaries(self.node_list, self.path, 0.3, 0.5),
+            tsm.get_intermediaries(self.node_list, self.edges, 0.3, 0.5))
+        self.assertEqual(tsm.communities_as_nodes(self.node_list, store),
+                         tsm.communities_as_nodes(self.node_list, self.edges))
+
+    def test_t2e_writes_store(self):
+        tweets = [['a', '@b @c'], ['b', '@a'], ['a', 'hi @b']]
+        prefix = os.path.join(self.tmp.name, 'out')
+        edges = tsm.t2e(tweets, save_prefix=prefix, save_format='STORE')
+        self.assertEqual(tsm._load_edges(prefix + '_edgelist'), edges)
+        outfile = tsm.t2e(tweets, save_prefix=prefix, stream=True,
+                          weighted=True, save_format='STORE')
+        self.assertEqual(tsm._load_edges(outfile),
+                         tsm.t2e(tweets, weighted=True))
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Test that tsm.resultCache returns stored t2e and get_top_communities
+    results equal to recomputed ones, and that it is invalidated and
+    evicted correctly.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=800)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = tsm.resultCache(os.path.join(self.tmp.name, 'cache'))
+        self.tweets = os.path.join(self.tmp.name, 'tweets.csv')
+        tsm.save_csv(self.tweets, [['a', '@b @c'], ['b', 'RT @a: hi'],
+                                   ['a', 'hi @b']], verbose=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_t2e_hit(self):
+        for weighted in (False, True):
+            expected = tsm.t2e(self.tweets, weighted=weighted)
+            first = tsm.t2e(self.tweets, weighted=weighted, cache=self.cache)
+            second = tsm.t2e(self.tweets, weighted=weighted, cache=self.cache)
+            self.assertEqual(first, expected)
+            self.assertEqual(second, expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        tsm.t2e(self.tweets, extmode='MENTIONS_EXC_RT', cache=self.cache)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_get_top_communities_hit(self):
+        run = functools.partial(tsm.get_top_communities, self.edges, seed=3,
+                                engine='array_louvain', n_runs=2, workers=1)
+        expected = run()
+        run(cache=self.cache)
+        cached = run(cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(vars(cached), vars(expected))
+        run(cache=self.cache, seed=4)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_unseeded_runs_not_cached(self):
+        tsm.get_top_communities(self.edges, cache=self.cache)
+        self.assertEqual(os.listdir(self.cache.path), [])
+
+    def test_file_change_invalidates(self):
+        tsm.t2e(self.tweets, cache=self.cache)
+        tsm.save_csv(self.tweets, [['a', '@d']], verbose=False)
+        self.assertEqual(tsm.t2e(self.tweets, cache=self.cache), [['a', 'd']])
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_invalidate_and_clear(self):
+        tsm.t2e(self.tweets, cache=self.cache)
+        tsm.get_top_communities(self.edges, seed=1, cache=self.cache)
+        self.cache.invalidate(self.tweets)
+        tsm.t2e(self.tweets, cache=self.cache)
+        tsm.get_top_communities(self.edges, seed=1, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+        self.cache.clear()
+        tsm.get_top_communities(self.edges, seed=1, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_invalidate_edited_file(self):
+        tsm.t2e(self.tweets, cache=self.cache)
+        tsm.save_csv(self.tweets, [['a', '@d']], verbose=False)
+        tsm.t2e(self.tweets, cache=self.cache)
+        self.assertEqual(len(os.listdir(self.cache.path)), 3)
+        self.cache.invalidate(self.tweets)
+        self.assertEqual(os.listdir(self.cache.path), ['file_hashes.json'])
+
+    def test_least_recently_used_evicted(self):
+        self.cache._put('a', self.edges)
+        size = os.path.getsize(os.path.join(self.cache.path, 'a.npz'))
+        self.cache.max_bytes = 2 * size
+        self.cache._put('b', self.edges)
+        os.utime(os.path.join(self.cache.path, 'a.npz'), (0, 0))
+        self.cache._put('c', self.edges)
+        self.assertEqual(sorted(os.listdir(self.cache.path)),
+                         ['b.npz', 'c.npz'])
+        self.assertEqual(self.cache._get('c'), self.edges)
+
+
+class TestInputsUnchanged(unittest.TestCase):
+    """
+    Test that no function modifies the in-memory data passed to it, now
+    that tsm.load_data no longer copies it.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network(n_edges=800)
+        self.weighted = tsm._collapse_edges(self.edges)
+        self.tweets = [['user%d' % (i % 60),
+                        'RT @user%d: #tag http://t.co/x @user3' % (i % 7)]
+                       for i in range(200)]
+
+    def assert_unchanged(self, func, *args, **kwargs):
+        before = copy.deepcopy(args)
+        func(*args, **kwargs)
+        self.assertEqual(args, before, func.__name__)
+
+    def test_inputs_unchanged(self):
+        nodes, edges = self.node_list, self.edges
+        self.assert_unchanged(tsm.t2e, self.tweets)
+        self.assert_unchanged(tsm.t2e_multi, self.tweets)
+        self.assert_unchanged(tsm.get_top_communities, edges)
+        self.assert_unchanged(tsm.get_top_communities, self.weighted)
+        self.assert_unchanged(tsm.calc_ei, nodes, edges)
+        self.assert_unchanged(tsm.calc_ei, nodes, edges, weight_edges=False)
+        self.assert_unchanged(tsm.match_communities, nodes, nodes, 0.5)
+        self.assert_unchanged(tsm.get_intermediaries, nodes, edges, 0.3, 0.5)
+        self.assert_unchanged(tsm.get_intermediaries, nodes, self.weighted,
+                              all_nodes=True)
+        self.assert_unchanged(tsm.get_top_hashtags, self.tweets, nodes, 1)
+        self.assert_unchanged(tsm.get_top_links, self.tweets, nodes, 1)
+        self.assert_unchanged(tsm.communities_as_nodes, nodes, edges)
+        ei = tsm.calc_ei(nodes, edges)
+        before = copy.deepcopy(vars(ei))
+        tsm.shared_ties_grid(ei, calc_propor=True)
+        self.assertEqual(vars(ei), before)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test the phase records and status messages TSM reports through
+    tsm.set_phase_callback and the 'tsm' logger.
+    """
+
+    def setUp(self):
+        self.node_list, self.edges = make_partitioned_network()
+        self.records = []
+        tsm.set_phase_callback(self.records.append)
+
+    def tearDown(self):
+        tsm.set_phase_callback(None)
+
+    def test_silent_by_default(self):
+        tsm.set_phase_callback(None)
+        out = io.StringIO()
+        with mock.patch('sys.stdout', out), mock.patch('sys.stderr', out):
+            tsm.get_top_communities(self.edges, seed=1)
+            tsm.calc_ei(self.node_list, self.edges)
+            tsm.communities_as_nodes(self.node_list, self.edges)
+        self.assertEqual(out.getvalue(), '')
+
+    def test_phase_records(self):
+        tsm.get_top_communities(self.edges, seed=1)
+        phases = [r['phase'] for r in self.records
+                  if r['function'] == 'get_top_communities']
+        self.assertEqual(phases, ['load', 'graph_build', 'partition',
+                                  'prominence', 'modularity'])
+        for r in self.records:
+            self.assertEqual(r['event'], 'phase')
+            self.assertGreaterEqual(r['seconds'], 0)
+        self.assertEqual(self.records[0]['rows'], len(self.edges))
+
+    def test_progress_records(self):
+        tweets = [['a%d' % i, '@b%d hi' % i] for i in range(250)]
+        with mock.patch.object(tsm, '_progress',
+                               functools.partial(tsm._progress, every=100)):
+            tsm.t2e(tweets)
+        progress = [r['rows'] for r in self.records
+                    if r['event'] == 'progress']
+        self.assertEqual(progress, [100, 200])
+
+    def test_json_logging(self):
+        tsm.set_phase_callback(None)
+        with self.assertLogs('tsm', level='DEBUG') as logs:
+            tsm.calc_ei(self.node_list, self.edges)
+        records = [json.loads(i.split(':', 2)[2]) for i in logs.output
+                   if i.startswith('DEBUG')]
+        self.assertEqual([r['phase'] for r in records],
+                         ['index', 'count', 'summarize'])
+        self.assertIn('INFO:tsm:Calculating EI indices using *weighted* edges.',
+                      logs.output)
+
+
+@unittest.skipIf(bench_tsm is None, 'bench_tsm could not be imported')
+class TestBenchmarks(unittest.TestCase):
+    """
+    Test the synthetic data generators and runner in bench_tsm.
+    """
+
+    def setUp(self):
+        self.src, self.tgt, self.cmty = bench_tsm.synthetic_network(3000)
+
+    def test_network_is_sparse_long_tailed_and_planted(self):
+        self.assertEqual(len(self.src), len(self.tgt))
+        self.assertFalse((self.src == self.tgt).any())
+        in_degree = tsm.np.bincount(self.tgt)
+        self.assertGreater(in_degree.max(), 20 * tsm.np.median(in_degree))
+        internal = self.cmty[self.src] == self.cmty[self.tgt]
+        self.assertGreater(internal.mean(), 0.8)
+        again = bench_tsm.synthetic_network(3000)
+        self.assertEqual(self.tgt.tolist(), again[1].tolist())
+
+    def test_t2e_recovers_network_from_tweets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tweets.csv')
+            bench_tsm.synthetic_tweets(path, self.src, self.tgt, self.cmty,
+                                       chunk_size=1000)
+            edges = tsm.t2e(path)
+            rts = tsm.get_top_rts(path, min_rts=2)
+        self.assertEqual(edges, [['u%d' % s, 'u%d' % t] for s, t
+                                 in zip(self.src.tolist(), self.tgt.tolist())])
+        self.assertGreater(len(rts), 0)
+
+    def test_run_benchmarks_saves_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, 'results.json')
+            results = bench_tsm.run_benchmarks(
+                [2000], ['calc_ei', 'shared_ties_grid'],
+                engine='array_louvain', memory=False, out=out)
+            with open(out) as f:
+                self.assertEqual(json.load(f), results)
+        self.assertEqual([i['function'] for i in results['results']],
+                         ['calc_ei', 'shared_ties_grid'])
+        for i in results['results']:
+            self.assertGreaterEqual(i['seconds'], 0)
+            self.assertIsNone(i['peak_mb'])
+        table = bench_tsm.compare_results(results, results)
+        self.assertEqual([i[4] for i in table if i[2] > 0],
+                         [1.0] * len([i for i in table if i[2] > 0]))
+
 if __name__ == '__main__':
     unittest.main()